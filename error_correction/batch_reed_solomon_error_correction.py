@@ -0,0 +1,165 @@
+import math
+from functools import lru_cache
+from typing import List, Optional, Sequence, Union
+
+import numpy as np
+
+from error_correction.reed_solomon_error_correction import ReedSolomonError, ReedSolomonErrorCorrection
+
+
+def _build_galois_field_tables(prim: int = 0x11d):
+    """Returns the exponent (doubled in length, so sums of two logarithms need no modulo) and logarithm tables
+    of GF(2^8) with generator 2, the same parameters as the defaults of reedsolo"""
+    exp = np.zeros(512, dtype=np.uint8)
+    log = np.zeros(256, dtype=np.int64)
+    value = 1
+    for exponent in range(255):
+        exp[exponent] = value
+        log[value] = exponent
+        value <<= 1
+        if value & 0x100:
+            value ^= prim
+    exp[255:510] = exp[:255]
+    return exp, log
+
+
+_GF_EXP, _GF_LOG = _build_galois_field_tables()
+
+
+def _gf_multiply(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Element-wise (broadcasting) multiplication in GF(2^8)"""
+    product = _GF_EXP[_GF_LOG[a] + _GF_LOG[b]]
+    return np.where((a == 0) | (b == 0), 0, product).astype(np.uint8)
+
+
+class BatchReedSolomonErrorCorrection(ReedSolomonErrorCorrection):
+    """Reed solomon codes computed with NumPy for many (short) messages at once
+
+    The encoded data is identical to ReedSolomonErrorCorrection (reedsolo with its default parameters),
+    so both can be used to decode data encoded by the other one.
+
+    All chunks of all messages are left-padded with zeros to the same length, which does not change the
+    error correction bytes, and stacked into a 2D array. Encoding is then a polynomial division of all rows at once,
+    decoding calculates the syndromes of all rows at once. Only the chunks with a nonzero syndrome (i.e. with errors)
+    are corrected one by one with reedsolo. decode_batch returns the error instead of the data for each message
+    which cannot be corrected, so the other messages of the batch are not lost.
+    Only 8 bit symbols are batched, other symbol sizes (and decoding with erasures) use ReedSolomonErrorCorrection.
+    """
+
+    @staticmethod
+    def encode(data: bytes, redundant_bits: int, symbol_bits: int = 8) -> bytes:
+        if symbol_bits != 8:
+            return ReedSolomonErrorCorrection.encode(data, redundant_bits, symbol_bits)
+        return BatchReedSolomonErrorCorrection.encode_batch([data], redundant_bits)[0]
+
+    @staticmethod
+    def decode(data: bytes, redundant_bits: int, erasures: Optional[List[int]] = None, symbol_bits: int = 8) -> bytes:
+        if erasures or symbol_bits != 8:
+            return ReedSolomonErrorCorrection.decode(data, redundant_bits, erasures, symbol_bits)
+        decoded = BatchReedSolomonErrorCorrection.decode_batch([data], redundant_bits)[0]
+        if isinstance(decoded, ReedSolomonError):
+            raise decoded
+        return decoded
+
+    @staticmethod
+    def encode_batch(messages: Sequence[bytes], redundant_bits: int) -> List[bytes]:
+
+        if redundant_bits == 0:
+            return [bytes(message) for message in messages]
+
+        ecc_byte_count = ReedSolomonErrorCorrection._get_ecc_byte_count_per_chunk(redundant_bits)
+        data_chunk_size = ReedSolomonErrorCorrection.CHUNK_SIZE - ecc_byte_count
+        chunks = BatchReedSolomonErrorCorrection.__split_into_chunks(messages, data_chunk_size)
+        rows = BatchReedSolomonErrorCorrection.__stack_chunks(chunks, data_chunk_size)
+
+        # Polynomial division by the generator polynomial of all rows at once, the remainder is the ecc
+        generator = BatchReedSolomonErrorCorrection.__generator_polynomial(ecc_byte_count)
+        remainders = np.zeros((len(rows), ecc_byte_count), dtype=np.uint8)
+        first_column = BatchReedSolomonErrorCorrection.__first_used_column(chunks, data_chunk_size)
+        for column in range(first_column, data_chunk_size):
+            coefficients = rows[:, column] ^ remainders[:, 0]
+            remainders[:, :-1] = remainders[:, 1:]
+            remainders[:, -1] = 0
+            remainders ^= _gf_multiply(coefficients[:, np.newaxis], generator[np.newaxis, 1:])
+
+        encoded_chunks = [chunk + remainder.tobytes() for chunk, remainder in zip(chunks, remainders)]
+        return BatchReedSolomonErrorCorrection.__join_chunks(messages, encoded_chunks, data_chunk_size)
+
+    @staticmethod
+    def decode_batch(messages: Sequence[bytes], redundant_bits: int) -> List[Union[bytes, ReedSolomonError]]:
+        """Returns the decoded data of each message, or the ReedSolomonError if it could not be corrected"""
+
+        if redundant_bits == 0:
+            return [bytes(message) for message in messages]
+
+        ecc_byte_count = ReedSolomonErrorCorrection._get_ecc_byte_count_per_chunk(redundant_bits)
+        chunk_size = ReedSolomonErrorCorrection.CHUNK_SIZE
+        chunks = BatchReedSolomonErrorCorrection.__split_into_chunks(messages, chunk_size)
+        rows = BatchReedSolomonErrorCorrection.__stack_chunks(chunks, chunk_size)
+
+        # The syndromes are the values of the received polynomial at alpha^0 ... alpha^(ecc_byte_count - 1)
+        roots = _GF_EXP[np.arange(ecc_byte_count)]
+        syndromes = np.zeros((len(rows), ecc_byte_count), dtype=np.uint8)
+        for column in range(BatchReedSolomonErrorCorrection.__first_used_column(chunks, chunk_size), chunk_size):
+            syndromes = _gf_multiply(syndromes, roots[np.newaxis, :]) ^ rows[:, column, np.newaxis]
+
+        has_errors = syndromes.any(axis=1)
+        codec = ReedSolomonErrorCorrection._get_codec(ecc_byte_count)
+        decoded_chunks = [
+            BatchReedSolomonErrorCorrection.__correct_chunk(codec, chunk) if chunk_has_errors
+            else chunk[:-ecc_byte_count]
+            for chunk, chunk_has_errors in zip(chunks, has_errors)
+        ]
+        return BatchReedSolomonErrorCorrection.__join_chunks(messages, decoded_chunks, chunk_size)
+
+    @staticmethod
+    def __correct_chunk(codec, chunk: bytes) -> Union[bytes, ReedSolomonError]:
+        try:
+            return bytes(codec.decode(chunk)[0])
+        except ReedSolomonError as error:
+            return error
+
+    @staticmethod
+    @lru_cache(maxsize=ReedSolomonErrorCorrection.CODEC_CACHE_SIZE)
+    def __generator_polynomial(ecc_byte_count: int) -> np.ndarray:
+        """The product of (x - alpha^i) for i in 0 ... ecc_byte_count - 1, highest degree first,
+        cached per ecc_byte_count and therefore read-only"""
+        generator = np.ones(1, dtype=np.uint8)
+        for exponent in range(ecc_byte_count):
+            shifted = np.append(generator, 0)
+            multiplied = np.insert(_gf_multiply(generator, _GF_EXP[exponent]), 0, 0)
+            generator = shifted ^ multiplied
+        generator.flags.writeable = False
+        return generator
+
+    @staticmethod
+    def __split_into_chunks(messages: Sequence[bytes], chunk_size: int) -> List[bytes]:
+        return [bytes(message[start:start + chunk_size])
+                for message in messages for start in range(0, len(message), chunk_size)]
+
+    @staticmethod
+    def __stack_chunks(chunks: List[bytes], chunk_size: int) -> np.ndarray:
+        """Returns the chunks as rows of a 2D array, shorter chunks are left-padded with zeros"""
+        rows = np.zeros((len(chunks), chunk_size), dtype=np.uint8)
+        for row, chunk in zip(rows, chunks):
+            row[chunk_size - len(chunk):] = np.frombuffer(chunk, dtype=np.uint8)
+        return rows
+
+    @staticmethod
+    def __first_used_column(chunks: List[bytes], chunk_size: int) -> int:
+        """The columns before only contain padding zeros, which do not change the remainder or the syndromes"""
+        return chunk_size - max(map(len, chunks), default=0)
+
+    @staticmethod
+    def __join_chunks(messages: Sequence[bytes], chunks: List[Union[bytes, ReedSolomonError]],
+                      chunk_size: int) -> List[Union[bytes, ReedSolomonError]]:
+        """The inverse of __split_into_chunks, the chunks are joined back into one result per message,
+        which is the first error if one of its chunks could not be corrected"""
+        results, chunk_index = [], 0
+        for message in messages:
+            chunk_count = math.ceil(len(message) / chunk_size)
+            message_chunks = chunks[chunk_index:chunk_index + chunk_count]
+            errors = [chunk for chunk in message_chunks if isinstance(chunk, ReedSolomonError)]
+            results.append(errors[0] if errors else b"".join(message_chunks))
+            chunk_index += chunk_count
+        return results
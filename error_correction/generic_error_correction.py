@@ -1,4 +1,5 @@
 from abc import ABC, abstractmethod
+from typing import List, Optional
 
 from error_correction.error_correction_type import ErrorCorrectionType
 
@@ -10,10 +11,18 @@ class GenericErrorCorrection(ABC):
 
     @staticmethod
     @abstractmethod
-    def encode(data: bytes, redundant_bits: int) -> bytes:
+    def encode(data: bytes, redundant_bits: int, symbol_bits: int = 8) -> bytes:
+        """symbol_bits is the size of the symbols of the code, codes which only work on bytes ignore it"""
         pass
 
     @staticmethod
     @abstractmethod
-    def decode(data: bytes, redundant_bits: int) -> bytes:
+    def decode(data: bytes, redundant_bits: int, erasures: Optional[List[int]] = None, symbol_bits: int = 8) -> bytes:
+        """Erasures are positions of bytes in data which are likely wrong, codes which cannot use them ignore them"""
+        pass
+
+    @staticmethod
+    @abstractmethod
+    def encoded_size(data_size: int, redundant_bits: int, symbol_bits: int = 8) -> int:
+        """Returns the number of bytes encode returns for data_size bytes, without encoding anything"""
         pass
@@ -1,274 +1,168 @@
+import math
+from typing import List, Optional
+
 import numpy as np
 
 from error_correction.error_correction_type import ErrorCorrectionType
 from error_correction.generic_error_correction import GenericErrorCorrection
+from error_correction.secded_code import SecdedCode
 
 
-class HammingErrorCorrection(GenericErrorCorrection):
-
-    def __init__(self):
-        super().__init__(ErrorCorrectionType.HAMMING)
-
-    @staticmethod
-    def encode(data: bytes, redundant_bits: int) -> bytes:
-
-        redundant_bits = 4
-
-        hamming_code = []
-
-        data_as_bits = HammingErrorCorrection.__return_as_bits(data[::-1])
-
-        number_of_data_and_redundant_bits = 8 + redundant_bits
-
-        while len(data_as_bits) > 0:
-            next_bits = data_as_bits[-8:]
-
-            hamming_code_with_placeholders = \
-                HammingErrorCorrection.__add_placeholder_redundant_bits(next_bits, number_of_data_and_redundant_bits)
-
-            hamming_code_calculated = \
-                HammingErrorCorrection.__calculate_values_for_redundant_bits(redundant_bits,
-                                                                             number_of_data_and_redundant_bits,
-                                                                             hamming_code_with_placeholders)
-
-            hamming_code.extend(hamming_code_calculated)
-
-            data_as_bits = data_as_bits[:-8]
-
-        return b''.join(HammingErrorCorrection.__convert_bits_to_bytes(hamming_code))
-
-    @staticmethod
-    def decode(decoded_data: bytes, redundant_bits: int) -> bytes:
-
-        redundant_bits = 4
-
-        corrected_data = []
-
-        hamming_code_as_bits = HammingErrorCorrection.__return_as_bits(decoded_data)
-
-        hamming_code_as_bits = HammingErrorCorrection.__add_lost_bits(hamming_code_as_bits)
-
-        number_of_data_and_redundant_bits = 8 + redundant_bits
-
-        while len(hamming_code_as_bits) > 0:
-            next_hamming_bits = hamming_code_as_bits[:number_of_data_and_redundant_bits]
-
-            number_of_iterations, error_syndrome = 0, []
-
-            while number_of_iterations < redundant_bits:
-                position_of_next_redundant_bit = 2 ** number_of_iterations
-
-                sum_of_bit_values = HammingErrorCorrection.__calculate_sum_of_bit_values(
-                    number_of_data_and_redundant_bits,
-                    position_of_next_redundant_bit,
-                    next_hamming_bits)
-
-                error_syndrome.extend([sum_of_bit_values % 2])
-
-                number_of_iterations += 1
-
-            # Check if a bit is flipped
-            sum_of_parity_bit_values, number_of_iterations, position_of_flipped_bit = 0, 0, 0
-
-            for value in error_syndrome:
-                sum_of_parity_bit_values += value
-                if value == 1:
-                    position_of_flipped_bit += 2 ** number_of_iterations
-                number_of_iterations += 1
-
-            position_of_flipped_bit -= 1  # Subtract one to get the correct position in the array
-
-            if position_of_flipped_bit < 0:
-                position_of_flipped_bit = 0
-
-            # Correct the flipped bit if there is one
-            if sum_of_parity_bit_values != 0:
-                if position_of_flipped_bit >= 12:
-                    print("More than one flipped bit (error) found! Could not correct any bits")
-                else:
-                    if next_hamming_bits[position_of_flipped_bit] == 0:
-                        next_hamming_bits[position_of_flipped_bit] = 1
-                    else:
-                        next_hamming_bits[position_of_flipped_bit] = 0
-
-            corrected_data.extend(next_hamming_bits)
-
-            hamming_code_as_bits = hamming_code_as_bits[number_of_data_and_redundant_bits:]
+def _get_bit(words: np.ndarray, position: int, codeword_bits: int) -> np.ndarray:
+    """Returns the bit at the given (1-indexed) position of each word, position 1 is the most significant bit"""
+    return (words >> (codeword_bits - position)) & 1
 
-            if HammingErrorCorrection.__ignore_remaining_bits(hamming_code_as_bits, number_of_data_and_redundant_bits):
-                break
 
-        corrected_data_as_byte_string = b''.join(HammingErrorCorrection.__convert_bits_to_bytes(corrected_data))
+def _get_syndromes(words: np.ndarray, codeword_bits: int) -> np.ndarray:
+    """The syndrome is the XOR of all positions with a 1 bit, for a valid codeword it is 0, for a codeword
+    with a single flipped bit it is the position of this bit."""
+    syndromes = np.zeros_like(words)
+    for position in range(1, codeword_bits + 1):
+        syndromes ^= _get_bit(words, position, codeword_bits) * position
+    return syndromes
 
-        corrected_decoded_data =\
-            HammingErrorCorrection.__correct_errors(corrected_data_as_byte_string, redundant_bits)
 
-        return corrected_decoded_data
-
-    @staticmethod
-    def __correct_errors(data: bytes, redundant_bits: int) -> bytes:
-
-        decoded_hamming_code = []
-
-        data_as_bits = HammingErrorCorrection.__return_as_bits(data)
-
-        data_as_bits = HammingErrorCorrection.__add_lost_bits(data_as_bits)
-
-        number_of_data_and_redundant_bits = 8 + redundant_bits
+class HammingErrorCorrection(GenericErrorCorrection):
+    """Hamming codes, the code is chosen by the number of redundant bits per byte of data:
+        * 0 (default): Hamming(12,8), as written by earlier versions
+        * 1 to 3: extended Hamming (72,64), 1 redundant bit per byte, corrects 1 and detects 2 flipped bits per 8 bytes
+        * 4 to 7: Hamming(12,8), 4 redundant bits per byte, corrects 1 flipped bit per byte
+        * 8 or more: extended Hamming (8,4), 8 redundant bits per byte, corrects 1 and detects 2 flipped bits per nibble
+    The redundant bits are stored in the message header, so the same code is chosen automatically when decoding.
+    See SecdedCode for the extended Hamming codes.
 
-        while len(data_as_bits) > 0:
-            next_hamming_bits = data_as_bits[:number_of_data_and_redundant_bits]
+    Hamming(12,8) encodes each byte as 12 bits, 8 data bits and 4 parity bits.
 
-            cleaned_hamming_bits = HammingErrorCorrection.__remove_all_redundant_bits(next_hamming_bits, redundant_bits)
+    The parity bits are at the positions which are powers of two (1, 2, 4 and 8) in the 12 bits, the data bits
+    (most significant bit first) fill the remaining positions. A parity bit covers all positions which have the bit
+    of its own position set, e.g. the parity bit at position 2 covers positions 2, 3, 6, 7, 10 and 11.
+    https://users.cis.fiu.edu/~downeyt/cop3402/hamming.html
 
-            decoded_hamming_code.extend(cleaned_hamming_bits)
+    The codewords are concatenated, if there is an odd number of bytes the last byte is padded with zeros.
+    Instead of calculating the parity bits bit by bit, all 256 codewords and the corrected byte for each of the
+    4096 possible 12 bit words are calculated once, encoding and decoding are then lookups in these tables.
+    """
 
-            data_as_bits = data_as_bits[number_of_data_and_redundant_bits:]
+    CODEWORD_BITS = 12
+    PARITY_POSITIONS = [1, 2, 4, 8]
+    DATA_POSITIONS = [3, 5, 6, 7, 9, 10, 11, 12]
 
-            if HammingErrorCorrection.__ignore_remaining_bits(data_as_bits, number_of_data_and_redundant_bits):
-                break
+    SECDED_72_64 = SecdedCode(data_bits=64, parity_bits=7)
+    SECDED_8_4 = SecdedCode(data_bits=4, parity_bits=3)
 
-        return b''.join(HammingErrorCorrection.__convert_bits_to_bytes(decoded_hamming_code))
+    def __init__(self):
+        super().__init__(ErrorCorrectionType.HAMMING)
 
     @staticmethod
-    def __add_placeholder_redundant_bits(data_as_bits: list, number_of_data_and_redundant_bits: int) -> list:
-
-        j, k, hamming_code_with_placeholders = 0, 0, []
-
-        for i in range(0, number_of_data_and_redundant_bits):
-            position_of_next_redundant_bit = 2 ** j
-
-            if position_of_next_redundant_bit == i + 1:
-                hamming_code_with_placeholders.append(0)
-                j += 1
-            else:
-                hamming_code_with_placeholders.append(int(data_as_bits[k]))
-                k += 1
-
-            i += 1
-
-        return hamming_code_with_placeholders
+    def get_code(redundant_bits: int) -> Optional[SecdedCode]:
+        """Returns the extended Hamming code used for redundant_bits, or None if Hamming(12,8) is used"""
+        if 1 <= redundant_bits <= 3:
+            return HammingErrorCorrection.SECDED_72_64
+        if redundant_bits >= 8:
+            return HammingErrorCorrection.SECDED_8_4
+        return None
 
     @staticmethod
-    def __calculate_sum_of_bit_values(number_of_data_and_redundant_bits: int, position_of_next_redundant_bit: int,
-                                      hamming_code: list) -> int:
-
-        sum_of_bit_values = 0
-        j = position_of_next_redundant_bit - 1
+    def encode(data: bytes, redundant_bits: int, symbol_bits: int = 8) -> bytes:
 
-        # Check all relevant bits in the array for their value
-        # https://users.cis.fiu.edu/~downeyt/cop3402/hamming.html
-        while j < number_of_data_and_redundant_bits:
-            for i in range(position_of_next_redundant_bit):
-                sum_of_bit_values += hamming_code[j]
-                j += 1
-                if j >= number_of_data_and_redundant_bits:
-                    break
+        code = HammingErrorCorrection.get_code(redundant_bits)
+        if code is not None:
+            return code.encode(data)
 
-            j += position_of_next_redundant_bit
+        codewords = HammingErrorCorrection._CODEWORDS[np.frombuffer(data, dtype=np.uint8)]
 
-        return sum_of_bit_values
+        return HammingErrorCorrection.__join_codewords(codewords)
 
     @staticmethod
-    def __calculate_values_for_redundant_bits(redundant_bits: int, number_of_data_and_redundant_bits: int,
-                                              hamming_code: list) -> list:
-
-        number_of_iterations = 0
-
-        while number_of_iterations < redundant_bits:
-            position_of_next_redundant_bit = 2 ** number_of_iterations
-
-            sum_of_bit_values = HammingErrorCorrection.__calculate_sum_of_bit_values(number_of_data_and_redundant_bits,
-                                                                                     position_of_next_redundant_bit,
-                                                                                     hamming_code)
-
-            # Check if all relevant bits have an even number of 1's
-            # If not, update redundant bit value for even parity
-            if sum_of_bit_values % 2 != 0:
-                hamming_code[position_of_next_redundant_bit - 1] = 1
-
-            number_of_iterations += 1
-
-        return hamming_code
+    def decode(
+            decoded_data: bytes,
+            redundant_bits: int,
+            erasures: Optional[List[int]] = None,
+            symbol_bits: int = 8,
+    ) -> bytes:
+
+        code = HammingErrorCorrection.get_code(redundant_bits)
+        if code is not None:
+            decoded_data, uncorrectable_count = code.decode(decoded_data)
+            if uncorrectable_count > 0:
+                print(f"Two flipped bits (errors) detected in {uncorrectable_count} codewords! "
+                      f"Could not correct any bits in these codewords")
+            return decoded_data
+
+        words = HammingErrorCorrection.__split_codewords(decoded_data)
+
+        uncorrectable_count = np.count_nonzero(HammingErrorCorrection._UNCORRECTABLE[words])
+        if uncorrectable_count > 0:
+            print(f"More than one flipped bit (error) found in {uncorrectable_count} codewords! "
+                  f"Could not correct any bits in these codewords")
+
+        return HammingErrorCorrection._CORRECTED_BYTES[words].tobytes()
 
     @staticmethod
-    def __get_bytes(bits: iter) -> bytes:
-
-        done = False
-        while not done:
-            byte = 0
-            for _ in range(0, 8):
-                try:
-                    bit = next(bits)
-                except StopIteration:
-                    bit = 0
-                    done = True
-                byte = (byte << 1) | bit
-            yield byte
-
-    @staticmethod
-    def __convert_bits_to_bytes(hamming_code: list) -> list:
-
-        byte_array, number_of_iterations = [], 0
+    def encoded_size(data_size: int, redundant_bits: int, symbol_bits: int = 8) -> int:
 
-        for b in HammingErrorCorrection.__get_bytes(iter(hamming_code)):
-            number_of_iterations += 1
-            byte_array.append(bytes([b]))
+        code = HammingErrorCorrection.get_code(redundant_bits)
+        if code is not None:
+            return code.encoded_size(data_size)
 
-        number_of_bytes = len(hamming_code) / 8
-
-        # Remove possible empty byte that can occur
-        if number_of_bytes + 1 == number_of_iterations:
-            byte_array = byte_array[:-1]
-
-        return byte_array
+        # Every byte becomes 12 bits, the last byte is padded with zeros if required
+        return math.ceil(data_size * 12 / 8)
 
     @staticmethod
-    def __remove_all_redundant_bits(list_of_hamming_bits: list, redundant_bits: int) -> list:
-
-        number_of_iterations = 0
-
-        while number_of_iterations < redundant_bits:
-            position_of_next_redundant_bit = 2 ** number_of_iterations - 1 - number_of_iterations
-
-            if position_of_next_redundant_bit < len(list_of_hamming_bits):
-                del list_of_hamming_bits[position_of_next_redundant_bit]
-            else:
-                break
-
-            number_of_iterations += 1
-
-        return list_of_hamming_bits
+    def _build_tables():
+        """Returns the codewords for all bytes, and the corrected byte / uncorrectable flag for all 12 bit words"""
+        codeword_bits = HammingErrorCorrection.CODEWORD_BITS
+
+        # Place the data bits, then set each parity bit to the corresponding bit of the syndrome to make it 0
+        data_bytes = np.arange(256, dtype=np.uint16)
+        codewords = np.zeros_like(data_bytes)
+        for data_bit, position in enumerate(HammingErrorCorrection.DATA_POSITIONS):
+            codewords |= ((data_bytes >> (7 - data_bit)) & 1) << (codeword_bits - position)
+        syndromes = _get_syndromes(codewords, codeword_bits)
+        for parity_bit, position in enumerate(HammingErrorCorrection.PARITY_POSITIONS):
+            codewords |= ((syndromes >> parity_bit) & 1) << (codeword_bits - position)
+
+        # Flip the bit at the position given by the syndrome, syndromes beyond the codeword cannot be corrected
+        words = np.arange(2**codeword_bits, dtype=np.uint16)
+        syndromes = _get_syndromes(words, codeword_bits)
+        uncorrectable = syndromes > codeword_bits
+        correctable = (syndromes > 0) & ~uncorrectable
+        corrected_words = words.copy()
+        corrected_words[correctable] ^= 1 << (codeword_bits - syndromes[correctable])
+        corrected_bytes = np.zeros(len(words), dtype=np.uint8)
+        for data_bit, position in enumerate(HammingErrorCorrection.DATA_POSITIONS):
+            corrected_bytes |= (_get_bit(corrected_words, position, codeword_bits) << (7 - data_bit)).astype(np.uint8)
+
+        return codewords, corrected_bytes, uncorrectable
 
     @staticmethod
-    def __ignore_remaining_bits(decoded_hamming_code: list, number_of_data_and_redundant_bits: int) -> bool:
-
-        if len(decoded_hamming_code) <= number_of_data_and_redundant_bits:
-
-            bit_sum = 0
+    def __join_codewords(codewords: np.ndarray) -> bytes:
+        """Concatenate the 12 bit codewords, two codewords make up three bytes"""
+        padded_codewords = np.zeros(len(codewords) + len(codewords) % 2, dtype=np.uint16)
+        padded_codewords[:len(codewords)] = codewords
+        first, second = padded_codewords[0::2], padded_codewords[1::2]
 
-            for bit in decoded_hamming_code:
-                bit_sum += bit
+        joined = np.empty((len(first), 3), dtype=np.uint8)
+        joined[:, 0] = first >> 4
+        joined[:, 1] = ((first & 0xF) << 4) | (second >> 8)
+        joined[:, 2] = second & 0xFF
 
-            if bit_sum == 0:
-                return True
-
-        return False
+        return joined.tobytes()[:math.ceil(len(codewords) * 12 / 8)]
 
     @staticmethod
-    def __return_as_bits(data: bytes) -> list:
-
-        data_as_bits = []
+    def __split_codewords(data: bytes) -> np.ndarray:
+        """The inverse of __join_codewords, remaining bits which do not make up an entire codeword are ignored"""
+        codeword_count = len(data) * 8 // 12
+        padded_data = np.zeros(math.ceil(len(data) / 3) * 3, dtype=np.uint16)
+        padded_data[:len(data)] = np.frombuffer(data, dtype=np.uint8)
+        triples = padded_data.reshape(-1, 3)
 
-        for value in data:
-            data_as_bits.extend([int(i) for i in str(np.binary_repr(value, 8))])
+        words = np.empty((len(triples), 2), dtype=np.uint16)
+        words[:, 0] = (triples[:, 0] << 4) | (triples[:, 1] >> 4)
+        words[:, 1] = ((triples[:, 1] & 0xF) << 8) | triples[:, 2]
 
-        return data_as_bits
-
-    @staticmethod
-    def __add_lost_bits(data: list) -> list:
+        return words.ravel()[:codeword_count]
 
-        while len(data) % 12 != 0:
-            data.extend([0])
 
-        return data
+HammingErrorCorrection._CODEWORDS, HammingErrorCorrection._CORRECTED_BYTES, HammingErrorCorrection._UNCORRECTABLE = \
+    HammingErrorCorrection._build_tables()
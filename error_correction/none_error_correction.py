@@ -1,3 +1,5 @@
+from typing import List, Optional
+
 from reedsolo import RSCodec
 
 from error_correction.error_correction_type import ErrorCorrectionType
@@ -13,11 +15,16 @@ class NoneErrorCorrection(GenericErrorCorrection):
         super().__init__(ErrorCorrectionType.NONE)
 
     @staticmethod
-    def encode(data: bytes, redundant_bits: int) -> bytes:
+    def encode(data: bytes, redundant_bits: int, symbol_bits: int = 8) -> bytes:
 
         return data
 
     @staticmethod
-    def decode(data: bytes, redundant_bits: int) -> bytes:
+    def decode(data: bytes, redundant_bits: int, erasures: Optional[List[int]] = None, symbol_bits: int = 8) -> bytes:
 
         return data
+
+    @staticmethod
+    def encoded_size(data_size: int, redundant_bits: int, symbol_bits: int = 8) -> int:
+
+        return data_size
@@ -1,4 +1,20 @@
-from reedsolo import RSCodec
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Callable, List, Optional, Tuple, Union
+
+import numpy as np
+import reedsolo
+
+try:
+    # Optional C implementation of reedsolo, with the same interface and output, but only for GF(2^8)
+    import creedsolo as reedsolo_implementation
+except ImportError:
+    reedsolo_implementation = reedsolo
+RSCodec = reedsolo_implementation.RSCodec
+# creedsolo raises its own error class, errors of reedsolo (used for larger symbols) are converted to it
+ReedSolomonError = reedsolo_implementation.ReedSolomonError
 
 from error_correction.error_correction_type import ErrorCorrectionType
 from error_correction.generic_error_correction import GenericErrorCorrection
@@ -12,14 +28,54 @@ class ReedSolomonErrorCorrection(GenericErrorCorrection):
     use the reedsolo package.
 
     https://pypi.org/project/reedsolo/
+
+    Creating an RSCodec builds the Galois field tables and the generator polynomial, therefore the codecs are cached
+    for the entire process (at most CODEC_CACHE_SIZE different ones).
+
+    Each chunk of CHUNK_SIZE bytes is encoded independently, so data with at least PARALLEL_MIN_CHUNKS chunks is split
+    at chunk boundaries and encoded/decoded in a process pool. The result is the same as encoding it at once.
+    Codewords of larger symbols take far longer each, so for them PARALLEL_MIN_WIDE_CHUNKS chunks are enough.
+    If installed, the faster creedsolo package is used instead of reedsolo for 8 bit symbols.
+
+    Erasures (positions of bytes which are likely wrong) can be given when decoding, a codeword can correct twice
+    as many erasures as errors at unknown positions. Codewords with more erasures than ecc symbols (e.g. on a loud
+    file, where many correct bytes are marked as erasures) are decoded without them, if a codeword cannot be decoded
+    with its erasures otherwise, it is decoded again without them.
+
+    With symbol_bits of 12 or 16, the code works on symbols of GF(2^12) or GF(2^16) instead of bytes, a codeword
+    can then have up to 4095 or 65535 symbols, so long messages are split into fewer, longer codewords.
+    As a fixed codeword size would add far too many ecc symbols to short messages, the data is split into as few
+    codewords of equal size as possible, with the same share of ecc symbols as a full codeword
+    (see _get_codeword_layout). The data is terminated by a 0x80 byte and padded with zeros to fill the codewords.
+    Encoding and decoding take time proportional to the ecc symbols of a codeword for every symbol, which grow with
+    the codeword size: once the data fills entire codewords, 12 bit symbols are about 16 times and 16 bit symbols
+    about 256 times slower than bytes with the same redundant bits (e.g. about 24 kB/s for bytes and 1 kB/s for
+    12 bit symbols with redundant_bits=8 and the pure python reedsolo). Larger symbols are meant for short messages
+    which have to survive long bursts of errors, not for filling large files.
     """
 
+    CHUNK_SIZE = 255
+    SYMBOL_BITS = (8, 12, 16)
+    CODEC_CACHE_SIZE = 32
+    PARALLEL_MIN_CHUNKS = 64
+    PARALLEL_MIN_WIDE_CHUNKS = 2
+    PARALLEL_MAX_WORKERS = os.cpu_count() or 1
+
     def __init__(self):
         super().__init__(ErrorCorrectionType.REED_SOLOMON)
 
     @staticmethod
-    def _get_ecc_byte_count_per_chunk(redundant_bits):
-        reed_solomon_chunk_size = 255
+    def _get_chunk_size(symbol_bits: int = 8) -> int:
+        """The maximum number of symbols of a codeword (including the ecc symbols), 255 for bytes"""
+        if symbol_bits not in ReedSolomonErrorCorrection.SYMBOL_BITS:
+            raise ValueError(f"ERROR: Unsupported symbol size: {symbol_bits} bits, "
+                             f"must be one of {ReedSolomonErrorCorrection.SYMBOL_BITS}.")
+        return 2**symbol_bits - 1
+
+    @staticmethod
+    def _get_ecc_byte_count_per_chunk(redundant_bits, symbol_bits: int = 8):
+        """The number of ecc symbols of a codeword of the maximum size (which are bytes for 8 bit symbols)"""
+        reed_solomon_chunk_size = ReedSolomonErrorCorrection._get_chunk_size(symbol_bits)
         if not (0 <= redundant_bits < reed_solomon_chunk_size * 8):
             raise ValueError(f"ERROR: Too many redundant bits: {redundant_bits},"
                              f" must be less than {reed_solomon_chunk_size * 8}.")
@@ -31,29 +87,248 @@ class ReedSolomonErrorCorrection(GenericErrorCorrection):
         return ecc_bits
 
     @staticmethod
-    def encode(data: bytes, redundant_bits: int) -> bytes:
+    def _get_codeword_layout(symbol_count: int, redundant_bits: int, symbol_bits: int) -> Tuple[int, int, int]:
+        """Returns the encoded symbol count, codeword size and ecc symbols per codeword for symbol_count data symbols
+        The codeword size and ecc symbols only depend on the encoded symbol count, so they can be calculated from the
+        encoded data alone when decoding. The encoded symbol count is the smallest one with enough data symbols.
+        The codeword size and codeword count stay the same for ranges of encoded symbol counts, within such a range
+        the smallest valid encoded symbol count is calculated directly, so only a few ranges are checked."""
+        max_chunk_size = ReedSolomonErrorCorrection._get_chunk_size(symbol_bits)
+        max_ecc_count = ReedSolomonErrorCorrection._get_ecc_byte_count_per_chunk(redundant_bits, symbol_bits)
+
+        # A codeword holds at most max_data_count data symbols, so there are at least min_chunk_count codewords
+        max_data_count = max_chunk_size - max_ecc_count
+        min_chunk_count = math.ceil(symbol_count / max_data_count)
+        encoded_count = max(
+            2,
+            symbol_count + math.ceil(symbol_count * max_ecc_count / max_chunk_size),
+            (min_chunk_count - 1) * max_chunk_size + 1,
+        )
+        while True:
+            # A codeword of chunk_size symbols holds floor(chunk_size * max_data_count / max_chunk_size) data symbols
+            # (unless it has fewer than 2), so all smaller codeword sizes for this chunk count are skipped
+            chunk_count = math.ceil(encoded_count / max_chunk_size)
+            min_data_count = math.ceil(symbol_count / chunk_count)
+            if min_data_count > 1:
+                min_chunk_size = (min_data_count * max_chunk_size + max_data_count - 1) // max_data_count
+                if min_chunk_size > max_chunk_size:
+                    encoded_count = chunk_count * max_chunk_size + 1
+                    continue
+                encoded_count = max(encoded_count, chunk_count * (min_chunk_size - 1) + 1)
+
+            chunk_size, ecc_count = ReedSolomonErrorCorrection._get_codeword_size(
+                encoded_count, max_chunk_size, max_ecc_count)
+            chunk_count = math.ceil(encoded_count / chunk_size)
+            # Each codeword, including the last (shorter) one, needs at least one data symbol and all codewords
+            # together need at least symbol_count data symbols
+            encoded_count = max(
+                encoded_count,
+                (chunk_count - 1) * chunk_size + ecc_count + 1,
+                symbol_count + chunk_count * ecc_count,
+            )
+            if encoded_count <= chunk_count * chunk_size:
+                return encoded_count, chunk_size, ecc_count
+            # Continue with the next range of encoded symbol counts
+            encoded_count = chunk_count * chunk_size + 1
+
+    @staticmethod
+    def _get_codeword_size(encoded_count: int, max_chunk_size: int, max_ecc_count: int) -> Tuple[int, int]:
+        """Returns the codeword size and ecc symbols per codeword used for encoded_count symbols"""
+        chunk_count = math.ceil(encoded_count / max_chunk_size)
+        chunk_size = math.ceil(encoded_count / chunk_count)
+        ecc_count = min(chunk_size - 1, max(1, math.ceil(chunk_size * max_ecc_count / max_chunk_size)))
+        return chunk_size, ecc_count
+
+    @staticmethod
+    def _get_codec(ecc_byte_count_per_chunk: int, chunk_size: int = CHUNK_SIZE, c_exp: int = 8) -> RSCodec:
+        """Returns a (cached) codec, the codecs restore their own tables on each call, so they can be shared
+        For fields other than GF(2^8), reedsolo chooses the prime polynomial itself.
+        reedsolo only switches between bytes and larger symbols when its tables are initialized, which is done again
+        if the codec uses the other one than the last initialized tables."""
+        codec = ReedSolomonErrorCorrection._create_codec(ecc_byte_count_per_chunk, chunk_size, c_exp)
+        implementation = ReedSolomonErrorCorrection._get_implementation(c_exp)
+        uses_bytes = getattr(implementation, "_bytearray", bytearray) is bytearray
+        if uses_bytes != (c_exp <= 8):
+            implementation.init_tables(codec.prim, codec.generator, codec.c_exp)
+        return codec
+
+    @staticmethod
+    @lru_cache(maxsize=CODEC_CACHE_SIZE)
+    def _create_codec(ecc_byte_count_per_chunk: int, chunk_size: int, c_exp: int) -> RSCodec:
+        implementation = ReedSolomonErrorCorrection._get_implementation(c_exp)
+        return implementation.RSCodec(ecc_byte_count_per_chunk, nsize=chunk_size, c_exp=c_exp)
+
+    @staticmethod
+    def _get_implementation(c_exp: int):
+        """creedsolo only supports GF(2^8), larger symbols always use reedsolo"""
+        return reedsolo_implementation if c_exp <= 8 else reedsolo
+
+    @staticmethod
+    def encode(data: bytes, redundant_bits: int, symbol_bits: int = 8) -> bytes:
 
         if redundant_bits == 0:
             return data
 
-        ecc_byte_count_per_chunk = ReedSolomonErrorCorrection._get_ecc_byte_count_per_chunk(redundant_bits)
+        if symbol_bits == 8:
+            ecc_byte_count_per_chunk = ReedSolomonErrorCorrection._get_ecc_byte_count_per_chunk(redundant_bits)
+            return ReedSolomonErrorCorrection.__map_chunks(
+                _encode_chunks, data, ReedSolomonErrorCorrection.CHUNK_SIZE - ecc_byte_count_per_chunk,
+                ecc_byte_count_per_chunk, ReedSolomonErrorCorrection.CHUNK_SIZE, 8)
 
-        rsc = RSCodec(ecc_byte_count_per_chunk)
-        encoded_data = rsc.encode(data)
+        symbols = _bytes_to_symbols(data + b"\x80", symbol_bits)
+        encoded_count, chunk_size, ecc_count = ReedSolomonErrorCorrection._get_codeword_layout(
+            len(symbols), redundant_bits, symbol_bits)
+        data_symbols = np.zeros(encoded_count - math.ceil(encoded_count / chunk_size) * ecc_count, dtype=np.int64)
+        data_symbols[:len(symbols)] = symbols
 
-        return bytes(encoded_data)
+        encoded_symbols = ReedSolomonErrorCorrection.__map_chunks(
+            _encode_chunks, data_symbols, chunk_size - ecc_count, ecc_count, chunk_size, symbol_bits)
+        return _symbols_to_bytes(encoded_symbols, symbol_bits)
 
     @staticmethod
-    def decode(data: bytes, redundant_bits: int) -> bytes:
+    def encoded_size(data_size: int, redundant_bits: int, symbol_bits: int = 8) -> int:
+
+        if redundant_bits == 0:
+            return data_size
+
+        if symbol_bits == 8:
+            ecc_byte_count_per_chunk = ReedSolomonErrorCorrection._get_ecc_byte_count_per_chunk(redundant_bits)
+
+            # Each chunk of up to (255 - ecc_byte_count_per_chunk) bytes gets ecc_byte_count_per_chunk bytes appended
+            chunk_count = math.ceil(data_size / (ReedSolomonErrorCorrection.CHUNK_SIZE - ecc_byte_count_per_chunk))
+
+            return data_size + chunk_count * ecc_byte_count_per_chunk
+
+        # The data with the terminating byte, padded to whole symbols
+        symbol_count = math.ceil((data_size + 1) * 8 / symbol_bits)
+        encoded_count, _, _ = ReedSolomonErrorCorrection._get_codeword_layout(symbol_count, redundant_bits, symbol_bits)
+
+        return math.ceil(encoded_count * symbol_bits / 8)
+
+    @staticmethod
+    def decode(data: bytes, redundant_bits: int, erasures: Optional[List[int]] = None, symbol_bits: int = 8) -> bytes:
 
         if redundant_bits == 0:
             return data
 
-        ecc_byte_count_per_chunk = ReedSolomonErrorCorrection._get_ecc_byte_count_per_chunk(redundant_bits)
+        if symbol_bits == 8:
+            ecc_byte_count_per_chunk = ReedSolomonErrorCorrection._get_ecc_byte_count_per_chunk(redundant_bits)
+            return ReedSolomonErrorCorrection.__map_chunks(
+                _decode_chunks, data, ReedSolomonErrorCorrection.CHUNK_SIZE, ecc_byte_count_per_chunk,
+                ReedSolomonErrorCorrection.CHUNK_SIZE, 8, erasures or [])
+
+        symbols = _bytes_to_symbols(data, symbol_bits, pad=False)
+        chunk_size, ecc_count = ReedSolomonErrorCorrection._get_codeword_size(
+            len(symbols),
+            ReedSolomonErrorCorrection._get_chunk_size(symbol_bits),
+            ReedSolomonErrorCorrection._get_ecc_byte_count_per_chunk(redundant_bits, symbol_bits),
+        )
+
+        # A symbol is an erasure if any of its bits is part of an erased byte
+        erasures = np.asarray(erasures or [], dtype=np.int64)
+        erased_symbols = np.unique(np.concatenate([erasures * 8 // symbol_bits, (erasures * 8 + 7) // symbol_bits]))
+
+        decoded_symbols = ReedSolomonErrorCorrection.__map_chunks(
+            _decode_chunks, symbols, chunk_size, ecc_count, chunk_size, symbol_bits,
+            erased_symbols[erased_symbols < len(symbols)].tolist())
+
+        decoded_data = _symbols_to_bytes(decoded_symbols, symbol_bits).rstrip(b"\x00")
+        if not decoded_data.endswith(b"\x80"):
+            raise ReedSolomonError("The decoded data is not terminated correctly")
+        return decoded_data[:-1]
+
+    @staticmethod
+    def __map_chunks(function: Callable[..., Union[bytes, np.ndarray]], data: Union[bytes, np.ndarray],
+                     split_size: int, ecc_byte_count_per_chunk: int, chunk_size: int, symbol_bits: int,
+                     erasures: Optional[List[int]] = None) -> Union[bytes, np.ndarray]:
+        """Apply function to the data, if there are enough chunks split into parts of whole chunks in a process pool
+        split_size is the size of a chunk in data, i.e. the data symbols of a codeword when encoding and the entire
+        codeword when decoding. For 8 bit symbols data are bytes, otherwise an array of symbols.
+        If erasures are given, the erasures within each part (relative to the part) are passed to function as well."""
+        chunk_count = math.ceil(len(data) / split_size)
+        max_workers = ReedSolomonErrorCorrection.PARALLEL_MAX_WORKERS
+        min_chunks = ReedSolomonErrorCorrection.PARALLEL_MIN_CHUNKS if symbol_bits == 8 \
+            else ReedSolomonErrorCorrection.PARALLEL_MIN_WIDE_CHUNKS
+        if chunk_count < min_chunks or max_workers <= 1:
+            return function(data, ecc_byte_count_per_chunk, chunk_size, symbol_bits,
+                            *([erasures] if erasures is not None else []))
 
-        rsc = RSCodec(ecc_byte_count_per_chunk)
+        # Several parts per worker, so that a slow part does not keep the other workers waiting
+        part_size = math.ceil(chunk_count / (max_workers * 4)) * split_size
+        part_starts = range(0, len(data), part_size)
+        arguments = [
+            [data[start:start + part_size] for start in part_starts],
+            [ecc_byte_count_per_chunk] * len(part_starts),
+            [chunk_size] * len(part_starts),
+            [symbol_bits] * len(part_starts),
+        ]
+        if erasures is not None:
+            arguments.append(_split_positions(erasures, part_starts, part_size))
+        with ProcessPoolExecutor(max_workers=min(max_workers, len(part_starts))) as executor:
+            parts = list(executor.map(function, *arguments))
+        return b"".join(parts) if symbol_bits == 8 else np.concatenate(parts)
 
-        decoded_msg = rsc.decode(data)[0]
 
+def _split_positions(positions: List[int], starts: range, size: int) -> List[List[int]]:
+    """Returns for each part [start, start + size) the positions within it, relative to start"""
+    positions = np.sort(np.asarray(positions, dtype=np.int64))
+    bounds = np.searchsorted(positions, [*starts, starts.stop])
+    return [(positions[bounds[index]:bounds[index + 1]] - start).tolist() for index, start in enumerate(starts)]
+
+
+def _bytes_to_symbols(data: bytes, symbol_bits: int, pad: bool = True) -> np.ndarray:
+    """Split the bits of data into symbols of symbol_bits, the last symbol is padded with zeros
+    If pad is not set, remaining bits which do not make up an entire symbol are ignored instead."""
+    bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8))
+    symbol_count = math.ceil(len(bits) / symbol_bits) if pad else len(bits) // symbol_bits
+    symbol_bit_values = np.zeros(symbol_count * symbol_bits, dtype=np.int64)
+    symbol_bit_values[:min(len(bits), len(symbol_bit_values))] = bits[:len(symbol_bit_values)]
+    return symbol_bit_values.reshape(-1, symbol_bits) @ (1 << np.arange(symbol_bits - 1, -1, -1))
+
+
+def _symbols_to_bytes(symbols: np.ndarray, symbol_bits: int) -> bytes:
+    """The inverse of _bytes_to_symbols, the last byte is padded with zeros"""
+    bits = (np.asarray(symbols, dtype=np.int64)[:, np.newaxis] >> np.arange(symbol_bits - 1, -1, -1)) & 1
+    return np.packbits(bits.astype(np.uint8)).tobytes()
+
+
+def _encode_chunks(data: Union[bytes, np.ndarray], ecc_byte_count_per_chunk: int, chunk_size: int,
+                   symbol_bits: int) -> Union[bytes, np.ndarray]:
+    codec = ReedSolomonErrorCorrection._get_codec(ecc_byte_count_per_chunk, chunk_size, symbol_bits)
+    if symbol_bits == 8:
+        return bytes(codec.encode(data))
+    return np.asarray(codec.encode(data.tolist()), dtype=np.int64)
+
+
+def _decode_chunks(data: Union[bytes, np.ndarray], ecc_byte_count_per_chunk: int, chunk_size: int, symbol_bits: int,
+                   erasures: Optional[List[int]] = None) -> Union[bytes, np.ndarray]:
+    codec = ReedSolomonErrorCorrection._get_codec(ecc_byte_count_per_chunk, chunk_size, symbol_bits)
+
+    def decode_chunks(chunks: Union[bytes, np.ndarray], chunk_erasures: Optional[List[int]] = None):
+        try:
+            decoded = codec.decode(chunks if symbol_bits == 8 else chunks.tolist(), erase_pos=chunk_erasures or None)[0]
+        except reedsolo.ReedSolomonError as error:
+            if isinstance(error, ReedSolomonError):
+                raise
+            raise ReedSolomonError(*error.args) from error
         # important to return bytes, as rsc returns a bytearray, which causes errors in various encryptors
-        return bytes(decoded_msg)
+        return bytes(decoded) if symbol_bits == 8 else np.asarray(decoded, dtype=np.int64)
+
+    if not erasures:
+        return decode_chunks(data)
+
+    chunk_starts = range(0, len(data), chunk_size)
+    decoded_chunks = []
+    for start, chunk_erasures in zip(chunk_starts, _split_positions(erasures, chunk_starts, chunk_size)):
+        chunk = data[start:start + chunk_size]
+        # A codeword cannot correct more erasures than it has ecc symbols, so it is decoded without them right away
+        if len(chunk_erasures) > ecc_byte_count_per_chunk:
+            decoded_chunks.append(decode_chunks(chunk))
+            continue
+        try:
+            decoded_chunks.append(decode_chunks(chunk, chunk_erasures))
+        except ReedSolomonError:
+            if not chunk_erasures:
+                raise
+            decoded_chunks.append(decode_chunks(chunk))
+    return b"".join(decoded_chunks) if symbol_bits == 8 else np.concatenate(decoded_chunks)
@@ -0,0 +1,116 @@
+import math
+from typing import Tuple
+
+import numpy as np
+
+
+class SecdedCode:
+    """Extended Hamming code (single error correction, double error detection) with data_bits per codeword
+
+    The Hamming positions are numbered from 1, the parity bits are at the powers of two and the data bits fill the
+    remaining positions. An additional overall parity bit over the entire codeword detects double errors.
+    If data_bits is smaller than the full Hamming code for parity_bits allows, the code is shortened
+    (e.g. (72,64) is the (128,120) code with the last 56 data bits being always 0).
+
+    Codewords are stored systematically: first the data bits, then the Hamming parity bits, then the overall parity.
+    If the data does not fill the last codeword, the missing data bits are treated as 0 and not stored,
+    the last codeword is shortened instead of padded.
+    """
+
+    def __init__(self, data_bits: int, parity_bits: int):
+        assert data_bits <= 2**parity_bits - parity_bits - 1, \
+            f"{parity_bits} parity bits cannot protect {data_bits} bits"
+        # The encoded data has to end on a byte boundary, otherwise padding could not be told apart from a codeword
+        assert (8 % data_bits == 0 and (parity_bits + 1) % data_bits == 0) or (parity_bits + 1) % 8 == 0, \
+            "Only codes which always encode to whole bytes are supported"
+
+        self.data_bits = data_bits
+        self.parity_bits = parity_bits
+        self.codeword_bits = data_bits + parity_bits + 1
+
+        positions = np.arange(1, 2**parity_bits)
+        data_positions = positions[(positions & (positions - 1)) != 0][:data_bits]
+        parity_positions = 1 << np.arange(parity_bits)
+
+        # Parity bit j covers each data bit whose position has bit j set
+        self.parity_matrix = ((data_positions[:, np.newaxis] >> np.arange(parity_bits)) & 1).astype(np.uint8)
+
+        # The syndrome is the position of the flipped bit, map it back to the index of the data bit (-1: parity bit)
+        self.syndrome_to_data_index = np.full(2**parity_bits, -1, dtype=np.int64)
+        self.syndrome_to_data_index[data_positions] = np.arange(data_bits)
+        # Syndrome 0 with a wrong overall parity means the overall parity bit itself was flipped
+        self.valid_syndromes = np.zeros(2**parity_bits, dtype=bool)
+        self.valid_syndromes[0] = True
+        self.valid_syndromes[data_positions] = True
+        self.valid_syndromes[parity_positions] = True
+
+    def __repr__(self):
+        return f"SecdedCode({self.codeword_bits},{self.data_bits})"
+
+    def encoded_size(self, data_size: int) -> int:
+        codeword_count = math.ceil(data_size * 8 / self.data_bits)
+        return math.ceil((data_size * 8 + codeword_count * (self.parity_bits + 1)) / 8)
+
+    def encode(self, data: bytes) -> bytes:
+        data_bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8))
+        data_words, last_data_bits = self.__split_into_words(data_bits)
+
+        parity = self.__get_parity(data_words)
+        overall_parity = (np.count_nonzero(data_words, axis=1) + np.count_nonzero(parity, axis=1)) % 2
+        codewords = np.column_stack((data_words, parity, overall_parity)).astype(np.uint8)
+
+        return np.packbits(self.__drop_missing_data_bits(codewords, last_data_bits)).tobytes()
+
+    def decode(self, data: bytes) -> Tuple[bytes, int]:
+        """Returns the corrected data and the number of codewords with uncorrectable (double) errors"""
+        bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8))
+
+        # A shortened last codeword contains all parity bits but only some of the data bits
+        full_codeword_count, last_codeword_bits = divmod(len(bits), self.codeword_bits)
+        last_data_bits = max(0, last_codeword_bits - self.parity_bits - 1)
+        data_bit_count = full_codeword_count * self.data_bits + last_data_bits
+        codewords = np.zeros((full_codeword_count + (last_data_bits > 0), self.codeword_bits), dtype=np.uint8)
+        full_codewords_bits = full_codeword_count * self.codeword_bits
+        codewords.reshape(-1)[:full_codewords_bits] = bits[:full_codewords_bits]
+        if last_data_bits > 0:
+            last_codeword = bits[full_codeword_count * self.codeword_bits:][:last_data_bits + self.parity_bits + 1]
+            codewords[-1, :last_data_bits] = last_codeword[:last_data_bits]
+            codewords[-1, self.data_bits:] = last_codeword[last_data_bits:]
+
+        data_words = codewords[:, :self.data_bits]
+        syndrome_bits = self.__get_parity(data_words) ^ codewords[:, self.data_bits:-1]
+        syndromes = syndrome_bits.astype(np.int64) @ (1 << np.arange(self.parity_bits))
+        overall_parity_errors = np.count_nonzero(codewords, axis=1) % 2 == 1
+
+        # Odd number of flipped bits with a syndrome pointing into the codeword: a single correctable error
+        # Even number of flipped bits (but nonzero syndrome) or a syndrome pointing outside: uncorrectable
+        correctable = overall_parity_errors & self.valid_syndromes[syndromes]
+        data_indices = self.syndrome_to_data_index[syndromes]
+        if last_data_bits > 0:
+            correctable[-1] &= data_indices[-1] < last_data_bits
+        uncorrectable = (syndromes != 0) & ~correctable
+
+        to_flip = np.flatnonzero(correctable & (data_indices >= 0))
+        data_words[to_flip, data_indices[to_flip]] ^= 1
+
+        data_bits = data_words.reshape(-1)[:data_bit_count]
+        return np.packbits(data_bits).tobytes(), int(np.count_nonzero(uncorrectable))
+
+    def __get_parity(self, data_words: np.ndarray) -> np.ndarray:
+        # Sums are at most data_bits, which fits into 16 bits for all supported codes
+        return (data_words.astype(np.uint16) @ self.parity_matrix % 2).astype(np.uint8)
+
+    def __split_into_words(self, data_bits: np.ndarray) -> Tuple[np.ndarray, int]:
+        """Split the data bits into words of data_bits, returns the words and the number of data bits in the last word
+        The last word is padded with zeros."""
+        word_count = math.ceil(len(data_bits) / self.data_bits)
+        words = np.zeros((word_count, self.data_bits), dtype=np.uint8)
+        words.reshape(-1)[:len(data_bits)] = data_bits
+        return words, len(data_bits) - (word_count - 1) * self.data_bits if word_count > 0 else 0
+
+    def __drop_missing_data_bits(self, codewords: np.ndarray, last_data_bits: int) -> np.ndarray:
+        bits = codewords.reshape(-1)
+        if last_data_bits in (0, self.data_bits):
+            return bits
+        padding_start = (len(codewords) - 1) * self.codeword_bits + last_data_bits
+        return np.delete(bits, np.s_[padding_start:padding_start + self.data_bits - last_data_bits])
@@ -0,0 +1,218 @@
+#!/usr/bin/python3
+
+import argparse
+import contextlib
+import csv
+import io
+import json
+import math
+import random
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, Sequence
+
+from error_correction.batch_reed_solomon_error_correction import BatchReedSolomonErrorCorrection
+from error_correction.generic_error_correction import GenericErrorCorrection
+from error_correction.hamming_error_correction import HammingErrorCorrection
+from error_correction.none_error_correction import NoneErrorCorrection
+from error_correction.reed_solomon_error_correction import ReedSolomonErrorCorrection
+
+
+CODECS: Dict[str, GenericErrorCorrection] = {
+    'none': NoneErrorCorrection(),
+    'hamming': HammingErrorCorrection(),
+    'reed_solomon': ReedSolomonErrorCorrection(),
+    'batch_reed_solomon': BatchReedSolomonErrorCorrection(),
+}
+
+BENCHMARK_REPORTS_DIRECTORY_NAME = 'benchmark_reports'
+BENCHMARK_REPORT_FILE_STRING = 'error_correction_benchmark'
+
+CSV_FIELDS = [
+    'codec', 'redundant_bits', 'data_size', 'encoded_size', 'encode_mb_per_s', 'decode_mb_per_s',
+    'encode_peak_memory', 'decode_peak_memory', 'error_model', 'error_rate', 'burst_length', 'trials',
+    'recovered_trials', 'residual_bit_error_rate',
+]
+
+
+def flip_bits(data: bytes, rate: float, rng: random.Random) -> bytes:
+    """Flips rate of all bits (at least one bit for any rate above 0) at random positions"""
+    corrupted = bytearray(data)
+    bit_count = len(data) * 8
+    for bit in rng.sample(range(bit_count), min(bit_count, math.ceil(bit_count * rate))):
+        corrupted[bit // 8] ^= 1 << (7 - bit % 8)
+    return bytes(corrupted)
+
+
+def flip_bursts(data: bytes, rate: float, burst_length: int, rng: random.Random) -> bytes:
+    """Flips bursts of burst_length consecutive bits, with as many bursts as needed to flip about rate of all bits
+    (at least one burst for any rate above 0)"""
+    corrupted = bytearray(data)
+    bit_count = len(data) * 8
+    burst_count = math.ceil(bit_count * rate / burst_length)
+    for _ in range(burst_count):
+        start = rng.randrange(max(1, bit_count - burst_length + 1))
+        for bit in range(start, min(start + burst_length, bit_count)):
+            corrupted[bit // 8] ^= 1 << (7 - bit % 8)
+    return bytes(corrupted)
+
+
+def count_bit_errors(expected: bytes, actual: bytes) -> int:
+    """Differing bits, missing or additional bytes count as 8 wrong bits each"""
+    common_bits = sum(bin(a ^ b).count('1') for a, b in zip(expected, actual))
+    return common_bits + abs(len(expected) - len(actual)) * 8
+
+
+def measure(function: Callable[[], bytes], repeats: int):
+    """Returns the result of the function, the best time of all repeats and the peak memory of one call in bytes"""
+    best_time = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        best_time = min(best_time, time.perf_counter() - start)
+
+    # tracemalloc slows the function down, so the memory is measured in a separate call
+    tracemalloc.start()
+    try:
+        function()
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, best_time, peak_memory
+
+
+def try_decode(codec: GenericErrorCorrection, data: bytes, redundant_bits: int) -> bytes:
+    """Decodes data which may contain more errors than the codec can correct, failures return no data"""
+    # Hamming codes print a message for every block with too many errors
+    with contextlib.redirect_stdout(io.StringIO()):
+        try:
+            return codec.decode(data, redundant_bits)
+        except Exception:
+            return b''
+
+
+def benchmark_codec(
+        name: str,
+        redundant_bits: int,
+        data_size: int,
+        error_rates: Sequence[float],
+        burst_lengths: Sequence[int],
+        trials: int,
+        repeats: int,
+        seed: int,
+) -> List[dict]:
+    """Returns one row per error model and rate, the throughput and memory columns are the same in all rows"""
+    codec = CODECS[name]
+    rng = random.Random(seed)
+    data = bytes(rng.getrandbits(8) for _ in range(data_size))
+
+    encoded, encode_time, encode_memory = measure(lambda: codec.encode(data, redundant_bits), repeats)
+    decoded, decode_time, decode_memory = measure(lambda: codec.decode(encoded, redundant_bits), repeats)
+    assert decoded == data, f"{name} with {redundant_bits} redundant bits does not decode its own encoded data"
+
+    performance = {
+        'codec': name,
+        'redundant_bits': redundant_bits,
+        'data_size': data_size,
+        'encoded_size': len(encoded),
+        'encode_mb_per_s': data_size / max(encode_time, 1e-9) / 1e6,
+        'decode_mb_per_s': data_size / max(decode_time, 1e-9) / 1e6,
+        'encode_peak_memory': encode_memory,
+        'decode_peak_memory': decode_memory,
+    }
+
+    error_models = [('bit_flip', 1, lambda rate: flip_bits(encoded, rate, rng))]
+    error_models += [
+        ('burst', burst_length, lambda rate, length=burst_length: flip_bursts(encoded, rate, length, rng))
+        for burst_length in burst_lengths
+    ]
+
+    rows = []
+    for error_model, burst_length, corrupt in error_models:
+        for error_rate in error_rates:
+            recovered_trials, bit_errors = 0, 0
+            for _ in range(trials):
+                decoded = try_decode(codec, corrupt(error_rate), redundant_bits)
+                recovered_trials += decoded == data
+                bit_errors += count_bit_errors(data, decoded)
+            rows.append({
+                **performance,
+                'error_model': error_model,
+                'error_rate': error_rate,
+                'burst_length': burst_length,
+                'trials': trials,
+                'recovered_trials': recovered_trials,
+                'residual_bit_error_rate': bit_errors / (trials * data_size * 8) if data_size else 0.0,
+            })
+    return rows
+
+
+def run_benchmark(
+        codecs: Sequence[str],
+        redundant_bits: Sequence[int],
+        data_size: int,
+        error_rates: Sequence[float],
+        burst_lengths: Sequence[int],
+        trials: int,
+        repeats: int,
+        seed: int = 0,
+) -> List[dict]:
+    rows = []
+    for name in codecs:
+        for bits in redundant_bits:
+            rows += benchmark_codec(name, bits, data_size, error_rates, burst_lengths, trials, repeats, seed)
+    return rows
+
+
+def write_results(rows: List[dict], output_directory: Path) -> List[Path]:
+    """Writes the rows as CSV and JSON files with the same (timestamped) name, returns both paths"""
+    output_directory.mkdir(parents=True, exist_ok=True)
+    file_name = f"{BENCHMARK_REPORT_FILE_STRING}_{time.strftime('%Y%m%d_%H%M%S')}"
+
+    csv_path = output_directory.joinpath(f"{file_name}.csv")
+    with open(csv_path, 'w', newline='') as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+    json_path = output_directory.joinpath(f"{file_name}.json")
+    with open(json_path, 'w') as json_file:
+        json.dump(rows, json_file, indent=2)
+
+    return [csv_path, json_path]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the throughput, memory usage and correction capability '
+                                                 'of the error correction codecs.')
+    parser.add_argument('-c', '--codecs', nargs='+', choices=list(CODECS), default=list(CODECS),
+                        help='codecs to benchmark')
+    parser.add_argument('-r', '--redundant_bits', type=int, nargs='+', default=[1, 8],
+                        help='numbers of redundant bits per byte to benchmark')
+    parser.add_argument('-s', '--data_size', type=int, default=10_000, help='payload size in bytes')
+    parser.add_argument('-e', '--error_rates', type=float, nargs='+', default=[0.0001, 0.001, 0.01],
+                        help='fractions of flipped bits in the encoded data')
+    parser.add_argument('-b', '--burst_lengths', type=int, nargs='*', default=[8, 64],
+                        help='lengths of the injected bursts of flipped bits')
+    parser.add_argument('-t', '--trials', type=int, default=3, help='corrupted copies decoded per error rate')
+    parser.add_argument('--repeats', type=int, default=3, help='timed repetitions, the best time is reported')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', type=Path, default=Path(BENCHMARK_REPORTS_DIRECTORY_NAME),
+                        help='directory for the CSV and JSON reports')
+    args = parser.parse_args()
+
+    rows = run_benchmark(args.codecs, args.redundant_bits, args.data_size, args.error_rates, args.burst_lengths,
+                         args.trials, args.repeats, args.seed)
+
+    for row in rows:
+        print(f"{row['codec']:>18} r={row['redundant_bits']:<3} encode {row['encode_mb_per_s']:9.4g} MB/s  "
+              f"decode {row['decode_mb_per_s']:9.4g} MB/s  {row['error_model']:>8}({row['burst_length']:>3}) "
+              f"rate {row['error_rate']:<7} recovered {row['recovered_trials']}/{row['trials']}")
+
+    for path in write_results(rows, args.output):
+        print(f"Results written to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+from typing import Callable, Union
+
+from security.credentials.generic_credential_provider import GenericCredentialProvider
+
+
+class CallbackCredentialProvider(GenericCredentialProvider):
+
+    # The callback gets the prompt and returns the password as str (UTF-8 encoded) or bytes
+
+    def __init__(self, callback: Callable[[str], Union[str, bytes]]):
+        super().__init__()
+
+        self.callback = callback
+
+    def get_password(self, prompt: str) -> bytes:
+        password = self.callback(prompt)
+
+        if isinstance(password, str):
+            password = bytes(password, 'utf-8')
+
+        return password
@@ -0,0 +1,21 @@
+import os
+
+from security.credentials.generic_credential_provider import GenericCredentialProvider
+
+
+class EnvironmentCredentialProvider(GenericCredentialProvider):
+
+    DEFAULT_VARIABLE = 'STEGOWAV_PASSWORD'
+
+    def __init__(self, variable: str = DEFAULT_VARIABLE):
+        super().__init__()
+
+        self.variable = variable
+
+    def get_password(self, prompt: str) -> bytes:
+        password = os.environ.get(self.variable)
+
+        if password is None:
+            raise ValueError(f'Environment variable {self.variable} with the password is not set')
+
+        return bytes(password, 'utf-8')
@@ -0,0 +1,38 @@
+import os
+from typing import Optional
+
+from security.credentials.generic_credential_provider import GenericCredentialProvider
+
+
+class FileDescriptorCredentialProvider(GenericCredentialProvider):
+    """Reads the password from an open file descriptor (e.g. a pipe) until end of file
+
+    A file descriptor can only be read once, so the password is kept and returned for every following request.
+    A single trailing newline is removed. The file descriptor is not closed.
+    """
+
+    READ_SIZE = 4096
+
+    def __init__(self, file_descriptor: int):
+        super().__init__()
+
+        self.file_descriptor = file_descriptor
+        self.__password: Optional[bytes] = None
+
+    def get_password(self, prompt: str) -> bytes:
+        if self.__password is None:
+            chunks = [os.read(self.file_descriptor, FileDescriptorCredentialProvider.READ_SIZE)]
+            while chunks[-1]:
+                chunks.append(os.read(self.file_descriptor, FileDescriptorCredentialProvider.READ_SIZE))
+            self.__password = strip_newline(b"".join(chunks))
+
+        return self.__password
+
+
+def strip_newline(password: bytes) -> bytes:
+    """Removes a single trailing newline (as written by echo or most editors)"""
+    if password.endswith(b"\r\n"):
+        return password[:-2]
+    if password.endswith(b"\n"):
+        return password[:-1]
+    return password
@@ -0,0 +1,13 @@
+from abc import ABC, abstractmethod
+
+
+class GenericCredentialProvider(ABC):
+    """Supplies passwords (for the password hash or the RSA private key) instead of asking on the terminal"""
+
+    def __init__(self):
+        pass
+
+    @abstractmethod
+    def get_password(self, prompt: str) -> bytes:
+        """Returns the password, prompt describes which password is needed (only shown by interactive providers)"""
+        pass
@@ -0,0 +1,13 @@
+from getpass import getpass
+
+from security.credentials.generic_credential_provider import GenericCredentialProvider
+
+
+class InteractiveCredentialProvider(GenericCredentialProvider):
+
+    # Asks on the terminal, the default if no other provider is given
+
+    def get_password(self, prompt: str) -> bytes:
+        password = getpass(prompt)
+
+        return bytes(password, 'utf-8')
@@ -0,0 +1,18 @@
+from pathlib import Path
+from typing import Union
+
+from security.credentials.file_descriptor_credential_provider import strip_newline
+from security.credentials.generic_credential_provider import GenericCredentialProvider
+
+
+class KeyFileCredentialProvider(GenericCredentialProvider):
+
+    # The file contains only the password, a single trailing newline is removed
+
+    def __init__(self, path: Union[str, Path]):
+        super().__init__()
+
+        self.path = Path(path)
+
+    def get_password(self, prompt: str) -> bytes:
+        return strip_newline(self.path.read_bytes())
@@ -1,13 +1,18 @@
 from typing import Optional
 
+from security.credentials.generic_credential_provider import GenericCredentialProvider
+from security.encryptors.aead_encryptor import AeadEncryptor
 from security.encryptors.aes_encryptor import AesEncryptor
 from security.enums.encryption_type import EncryptionType
 from security.encryptors.fernet_encryptor import FernetEncryptor
 from security.encryptors.generic_encryptor import GenericEncryptor
 from security.encryptors.none_encryptor import NoneEncryptor
 from security.encryptors.rsa_encryptor import RsaEncryptor
+from security.encryptors.rsa_hybrid_encryptor import RsaHybridEncryptor
+from security.encryptors.size_only_encryptor import SizeOnlyEncryptor
 from security.enums.hash_type import HashType
 from security.hash_provider import HashProvider
+from security.hashing.kdf_parameters import KdfParameters
 
 
 class EncryptionProvider:
@@ -23,10 +28,17 @@ class EncryptionProvider:
             is_test: Optional[bool] = False,
             salt: Optional[bytes] = None,
             nonce: Optional[bytes] = None,
+            credential_provider: Optional[GenericCredentialProvider] = None,
+            kdf_parameters: Optional[KdfParameters] = None,
+            allow_expensive_kdf: bool = False,
     ) -> GenericEncryptor:
-        """Return encryptor with given type, nonce will only be used if AES"""
+        """Return encryptor with given type, nonce will only be used if AES or AEAD
+        Passwords are asked from the credential provider, or the user if there is none.
+        kdf_parameters are the cost parameters of the password hash, None uses the defaults of the hash.
+        Parameters above the limits of the hash raise a ValueError, unless allow_expensive_kdf is set."""
 
-        hash_algo = HashProvider.get_hash(hash_type, is_test, salt)
+        hash_algo = HashProvider.get_hash(
+            hash_type, is_test, salt, credential_provider, kdf_parameters, allow_expensive_kdf)
 
         if not encryption_type or encryption_type == EncryptionType.NONE:
             return NoneEncryptor()
@@ -37,7 +49,43 @@ class EncryptionProvider:
         if encryption_type == EncryptionType.AES:
             return AesEncryptor(hash_algo, nonce)
 
+        if encryption_type == EncryptionType.AEAD:
+            return AeadEncryptor(hash_algo, decryption, nonce)
+
         if encryption_type == EncryptionType.RSA:
-            return RsaEncryptor(decryption, is_test)
+            return RsaEncryptor(decryption, is_test, credential_provider)
+
+        if encryption_type == EncryptionType.RSA_HYBRID:
+            return RsaHybridEncryptor(decryption, is_test, credential_provider)
+
+        raise ValueError('Could not get Encryptor')
+
+    @staticmethod
+    def get_size_only_encryptor(
+            encryption_type: EncryptionType,
+            rsa_key_size: int = RsaEncryptor.KEY_SIZE,
+    ) -> GenericEncryptor:
+        """Return an encryptor which only calculates the encrypted sizes of the given type (e.g. for the capacity),
+        no password is asked and no keys are created, RSA sizes are calculated for keys of rsa_key_size bits"""
+
+        if not encryption_type or encryption_type == EncryptionType.NONE:
+            return NoneEncryptor()
+
+        if encryption_type == EncryptionType.FERNET:
+            return SizeOnlyEncryptor(encryption_type, FernetEncryptor.encrypted_size)
+
+        if encryption_type == EncryptionType.AES:
+            return SizeOnlyEncryptor(encryption_type, AesEncryptor.encrypted_size)
+
+        if encryption_type == EncryptionType.AEAD:
+            return SizeOnlyEncryptor(encryption_type, AeadEncryptor.encrypted_size)
+
+        if encryption_type in (EncryptionType.RSA, EncryptionType.RSA_HYBRID):
+            rsa_class = RsaEncryptor if encryption_type == EncryptionType.RSA else RsaHybridEncryptor
+            return SizeOnlyEncryptor(
+                encryption_type,
+                lambda data_size: rsa_class.get_encrypted_size(data_size, rsa_key_size),
+                rsa_class.get_max_data_size(rsa_key_size),
+            )
 
         raise ValueError('Could not get Encryptor')
@@ -0,0 +1,129 @@
+import math
+import os
+import struct
+from typing import Iterable, Iterator, Optional
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import ChaCha20Poly1305
+
+from security.encryptors.generic_encryptor import GenericEncryptor
+from security.enums.encryption_type import EncryptionType
+from security.hashing.generic_hash import GenericHash
+from security.hashing.none_hash import NoneHash
+
+
+class AeadEncryptor(GenericEncryptor):
+    """ChaCha20-Poly1305 over fixed-size frames, each frame is authenticated separately
+
+    The data is split into frames of FRAME_SIZE bytes (the last one may be shorter or empty), every frame is
+    encrypted to the same number of bytes plus a TAG_LENGTH byte tag. The output is raw binary, the only overhead is
+    one tag per frame. The nonce of each frame is the nonce prefix, the frame index and a flag for the last frame
+    (the STREAM construction), so frames cannot be reordered, dropped or truncated unnoticed.
+    The key only depends on the password and salt, so every encryption draws a new random nonce (available as nonce
+    afterwards), otherwise two messages encrypted by the same encryptor would use the same key and nonces.
+    As every frame is authenticated on its own, a wrong password is detected on the first frame, and data can be
+    encrypted and decrypted incrementally with encrypt_stream and decrypt_stream.
+    """
+
+    # https://cryptography.io/en/latest/hazmat/primitives/aead/ (ChaCha20Poly1305)
+    FRAME_SIZE = 4096
+    TAG_LENGTH = 16
+
+    # Stored in the 16 byte nonce field of the header, only the first NONCE_PREFIX_LENGTH bytes are used
+    NONCE_LENGTH = 16
+    NONCE_PREFIX_LENGTH = 7
+
+    def __init__(self, hash_algo: GenericHash, decryption: bool, nonce: Optional[bytes] = None):
+        super().__init__(EncryptionType.AEAD)
+
+        if type(hash_algo) == NoneHash:
+            raise ValueError('AEAD encryption requires a hash (PBKDF2/SCRYPT)')
+
+        self.__hash_algo = hash_algo
+
+        if nonce is None:
+            nonce = os.urandom(AeadEncryptor.NONCE_LENGTH)
+
+        if decryption:
+            key = self.__hash_algo.get_key_with_existing_credentials()
+        else:
+            key = self.__hash_algo.get_key()
+
+        self.__nonce = nonce
+
+        self.__cipher = ChaCha20Poly1305(key)
+
+    @property
+    def hash_type(self):
+        return self.__hash_algo.hash_type
+
+    @property
+    def salt(self):
+        if hasattr(self.__hash_algo, "salt"):
+            return self.__hash_algo.salt
+        return None
+
+    @property
+    def kdf_parameters(self):
+        if hasattr(self.__hash_algo, "kdf_parameters"):
+            return self.__hash_algo.kdf_parameters
+        return None
+
+    @property
+    def nonce(self):
+        return self.__nonce
+
+    def encrypt(self, data: bytes) -> bytes:
+        return b"".join(self.encrypt_stream([data]))
+
+    def decrypt(self, data: bytes) -> bytes:
+        return b"".join(self.decrypt_stream([data]))
+
+    def encrypt_stream(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """Encrypts chunks of any size with a new nonce, yields one encrypted frame at a time"""
+        nonce = os.urandom(AeadEncryptor.NONCE_LENGTH)
+        self.__nonce = nonce
+
+        for index, frame, is_last in self.__split_into_frames(chunks, AeadEncryptor.FRAME_SIZE):
+            yield self.__cipher.encrypt(self.__frame_nonce(nonce, index, is_last), frame, None)
+
+    def decrypt_stream(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """Decrypts chunks of any size, yields one decrypted frame at a time
+
+        Raises a ValueError as soon as a frame cannot be authenticated, i.e. on the first frame for a wrong password.
+        """
+        nonce = self.__nonce
+        encrypted_frame_size = AeadEncryptor.FRAME_SIZE + AeadEncryptor.TAG_LENGTH
+        for index, frame, is_last in self.__split_into_frames(chunks, encrypted_frame_size):
+            try:
+                yield self.__cipher.decrypt(self.__frame_nonce(nonce, index, is_last), frame, None)
+            except InvalidTag:
+                raise ValueError(f'Frame {index} could not be authenticated, '
+                                 f'the password is wrong or the data is corrupted or truncated') from None
+
+    @staticmethod
+    def encrypted_size(data_size: int) -> int:
+        frame_count = max(1, math.ceil(data_size / AeadEncryptor.FRAME_SIZE))
+
+        return data_size + frame_count * AeadEncryptor.TAG_LENGTH
+
+    @staticmethod
+    def __frame_nonce(nonce: bytes, index: int, is_last: bool) -> bytes:
+        return nonce[:AeadEncryptor.NONCE_PREFIX_LENGTH] + struct.pack(">IB", index, is_last)
+
+    @staticmethod
+    def __split_into_frames(chunks: Iterable[bytes], frame_size: int):
+        """Yields (index, frame, is_last) for frames of frame_size bytes, the last frame may be shorter or empty
+
+        A frame is only yielded once the next one has started (or the chunks ended), so the last frame is known.
+        """
+        buffer = bytearray()
+        index = 0
+        for chunk in chunks:
+            buffer += chunk
+            # Keep at least one byte, the buffered frame might be the last one otherwise
+            while len(buffer) > frame_size:
+                yield index, bytes(buffer[:frame_size]), False
+                del buffer[:frame_size]
+                index += 1
+        yield index, bytes(buffer), True
@@ -41,6 +41,12 @@ class AesEncryptor(GenericEncryptor):
             return self.__hash_algo.salt
         return None
 
+    @property
+    def kdf_parameters(self):
+        if hasattr(self.__hash_algo, "kdf_parameters"):
+            return self.__hash_algo.kdf_parameters
+        return None
+
     @property
     def nonce(self):
         return self.__nonce
@@ -62,3 +68,8 @@ class AesEncryptor(GenericEncryptor):
         decrypted_data = decryptor.update(data) + decryptor.finalize()
 
         return decrypted_data
+
+    @staticmethod
+    def encrypted_size(data_size: int) -> int:
+        # CTR mode is a stream cipher, no padding is added
+        return data_size
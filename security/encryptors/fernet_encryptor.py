@@ -1,4 +1,5 @@
 import base64
+import math
 
 from cryptography.fernet import Fernet
 
@@ -39,6 +40,12 @@ class FernetEncryptor(GenericEncryptor):
             return self.__hash_algo.salt
         return None
 
+    @property
+    def kdf_parameters(self):
+        if hasattr(self.__hash_algo, "kdf_parameters"):
+            return self.__hash_algo.kdf_parameters
+        return None
+
     def encrypt(self, data: bytes) -> bytes:
         encrypted_data = self.__fernet.encrypt(data)
 
@@ -48,3 +55,11 @@ class FernetEncryptor(GenericEncryptor):
         decrypted_data = self.__fernet.decrypt(data)
 
         return decrypted_data
+
+    @staticmethod
+    def encrypted_size(data_size: int) -> int:
+        # https://github.com/fernet/spec/blob/master/Spec.md
+        # version (1) + timestamp (8) + iv (16) + ciphertext (PKCS7 padded to 16) + hmac (32), then base64 encoded
+        token_size = 1 + 8 + 16 + (data_size // 16 + 1) * 16 + 32
+
+        return 4 * math.ceil(token_size / 3)
@@ -1,4 +1,5 @@
 from abc import ABC, abstractmethod
+from typing import Optional
 
 from security.enums.encryption_type import EncryptionType
 
@@ -15,3 +16,13 @@ class GenericEncryptor(ABC):
     @abstractmethod
     def decrypt(self, data: bytes) -> bytes:
         pass
+
+    @abstractmethod
+    def encrypted_size(self, data_size: int) -> int:
+        """Returns the number of bytes encrypt returns for data_size bytes, without encrypting anything"""
+        pass
+
+    @property
+    def max_data_size(self) -> Optional[int]:
+        """Maximum number of bytes which can be encrypted, None if there is no limit"""
+        return None
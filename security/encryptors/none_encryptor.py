@@ -14,3 +14,7 @@ class NoneEncryptor(GenericEncryptor):
 
     def decrypt(self, data: bytes) -> bytes:
         return data
+
+    @staticmethod
+    def encrypted_size(data_size: int) -> int:
+        return data_size
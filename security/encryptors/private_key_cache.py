@@ -0,0 +1,60 @@
+import hashlib
+import hmac
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Optional, Tuple
+
+
+class PrivateKeyCache:
+    """A size-bounded in-memory LRU cache of loaded private keys
+
+    Keys are looked up by (PEM digest, password digest), so a changed key file is loaded again. Like in the
+    DerivedKeyCache, the password itself is not stored, only an HMAC of it with a random per-process secret.
+    """
+
+    MAX_SIZE = 8
+
+    def __init__(self, max_size: int = MAX_SIZE):
+        self.max_size = max_size
+        self.__secret = os.urandom(32)
+        self.__keys: "OrderedDict[Tuple[bytes, bytes], Any]" = OrderedDict()
+        self.__lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.__keys)
+
+    def get_or_load(
+            self,
+            private_pem: bytes,
+            password: Optional[bytes],
+            load: Callable[[bytes, Optional[bytes]], Any],
+    ):
+        """Returns the cached key or loads it with load(private_pem, password) and stores it"""
+        pem_digest = hashlib.sha256(private_pem).digest()
+        password_digest = hmac.new(self.__secret, password or b"", hashlib.sha256).digest()
+        cache_key = (pem_digest, password_digest)
+
+        with self.__lock:
+            if cache_key in self.__keys:
+                self.__keys.move_to_end(cache_key)
+                self.hits += 1
+                return self.__keys[cache_key]
+
+        # Load outside of the lock, so other threads are not blocked by the key derivation of the PEM password
+        private_key = load(private_pem, password)
+
+        with self.__lock:
+            self.misses += 1
+            if self.max_size > 0:
+                self.__keys[cache_key] = private_key
+                while len(self.__keys) > self.max_size:
+                    self.__keys.popitem(last=False)
+        return private_key
+
+    def clear(self):
+        """Removes all cached keys"""
+        with self.__lock:
+            self.__keys.clear()
@@ -1,33 +1,54 @@
-from getpass import getpass
+from typing import Optional
 
 from cryptography.hazmat.primitives import hashes, serialization
 from cryptography.hazmat.primitives.asymmetric import padding, rsa
 
+from security.credentials.generic_credential_provider import GenericCredentialProvider
+from security.credentials.interactive_credential_provider import InteractiveCredentialProvider
 from security.encryptors.generic_encryptor import GenericEncryptor
+from security.encryptors.private_key_cache import PrivateKeyCache
 from security.enums.encryption_type import EncryptionType
 
 
 class RsaEncryptor(GenericEncryptor):
 
     # https://cryptography.io/en/latest/hazmat/primitives/asymmetric/rsa/
+    ENCRYPTION_TYPE = EncryptionType.RSA
 
-    def __init__(self, decryption: bool, is_test: bool = False):
-        super().__init__(EncryptionType.RSA)
+    PRIVATE_KEY_FILE = 'private_key.pem'
+
+    # Size of the created keys in bits
+    KEY_SIZE = 2048
+
+    # Loading a password protected private key runs a key derivation, so loaded keys are kept for following files
+    PRIVATE_KEY_CACHE = PrivateKeyCache()
+
+    def __init__(
+            self,
+            decryption: bool,
+            is_test: bool = False,
+            credential_provider: Optional[GenericCredentialProvider] = None,
+    ):
+        super().__init__(self.ENCRYPTION_TYPE)
+
+        if credential_provider is None:
+            credential_provider = InteractiveCredentialProvider()
 
         if decryption:
 
-            private_key_password = getpass(
+            private_key_password = credential_provider.get_password(
                 'Please enter a password for the private key (leave empty if there is none): ')
 
             self.__private_key = self.__load_private_key(private_key_password)
             self.__public_key = self.__private_key.public_key()
 
         else:
-            self.__private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+            self.__private_key = rsa.generate_private_key(public_exponent=65537, key_size=RsaEncryptor.KEY_SIZE)
             self.__public_key = self.__private_key.public_key()
 
             if not is_test:
-                private_key_password = getpass('Please enter a password for the private key (empty = no encryption): ')
+                private_key_password = credential_provider.get_password(
+                    'Please enter a password for the private key (empty = no encryption): ')
                 self.__save_keys(private_key_password)
 
     def encrypt(self, data: bytes) -> bytes:
@@ -54,10 +75,36 @@ class RsaEncryptor(GenericEncryptor):
 
         return encrypted_data
 
-    def __save_keys(self, password: str):
+    def encrypted_size(self, data_size: int) -> int:
+        return self.get_encrypted_size(data_size, self.key_size)
+
+    @property
+    def key_size(self) -> int:
+        """Size of the RSA key in bits"""
+        return self.__public_key.key_size
+
+    @property
+    def max_data_size(self) -> Optional[int]:
+        return self.get_max_data_size(self.key_size)
+
+    @staticmethod
+    def get_encrypted_size(data_size: int, key_size: int) -> int:
+        """The encrypted size for a key of key_size bits, available without a key"""
+        max_data_size = RsaEncryptor.get_max_data_size(key_size)
+        if data_size > max_data_size:
+            raise ValueError(f"RSA can encrypt at most {max_data_size} bytes, not {data_size}")
+
+        return key_size // 8
+
+    @staticmethod
+    def get_max_data_size(key_size: int) -> Optional[int]:
+        # OAEP padding with SHA256: key size in bytes - 2 * hash size - 2
+        return key_size // 8 - 2 * hashes.SHA256.digest_size - 2
+
+    def __save_keys(self, password: bytes):
 
         if password:
-            encryption = serialization.BestAvailableEncryption(password.encode('UTF-8'))
+            encryption = serialization.BestAvailableEncryption(password)
         else:
             encryption = serialization.NoEncryption()
 
@@ -82,18 +129,24 @@ class RsaEncryptor(GenericEncryptor):
             f.write(data)
 
     @staticmethod
-    def __load_private_key(password_input):
+    def __load_private_key(password_input: bytes):
         if password_input:
-            password = password_input.encode('UTF-8')
+            password = password_input
         else:
             password = None
 
-        with open("private_key.pem", "rb") as key_file:
+        with open(RsaEncryptor.PRIVATE_KEY_FILE, "rb") as key_file:
+            private_pem = key_file.read()
 
-            private_key = serialization.load_pem_private_key(
-                key_file.read(),
-                password = password,
-            )
+        return RsaEncryptor.PRIVATE_KEY_CACHE.get_or_load(private_pem, password, RsaEncryptor.__deserialize_private_key)
+
+    @staticmethod
+    def __deserialize_private_key(private_pem: bytes, password: Optional[bytes]):
+
+        private_key = serialization.load_pem_private_key(
+            private_pem,
+            password = password,
+        )
 
-            return private_key
+        return private_key
 
@@ -0,0 +1,51 @@
+import os
+from typing import Optional
+
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+from security.encryptors.rsa_encryptor import RsaEncryptor
+from security.enums.encryption_type import EncryptionType
+
+
+class RsaHybridEncryptor(RsaEncryptor):
+    """RSA which only encrypts a random AES key, the data itself is encrypted with AES-GCM
+
+    The keys are created, saved and loaded just like for RsaEncryptor. The encrypted data is
+    the RSA encrypted AES key, followed by the nonce and the AES-GCM ciphertext including its tag.
+    The encrypted key is authenticated as associated data, so the data size is not limited by the RSA key size.
+    """
+    ENCRYPTION_TYPE = EncryptionType.RSA_HYBRID
+
+    # https://cryptography.io/en/latest/hazmat/primitives/aead/#cryptography.hazmat.primitives.ciphers.aead.AESGCM
+    KEY_LENGTH = 32
+    NONCE_LENGTH = 12
+    TAG_LENGTH = 16
+
+    def encrypt(self, data: bytes) -> bytes:
+        key = AESGCM.generate_key(bit_length=RsaHybridEncryptor.KEY_LENGTH * 8)
+        nonce = os.urandom(RsaHybridEncryptor.NONCE_LENGTH)
+
+        encrypted_key = super().encrypt(key)
+        encrypted_data = AESGCM(key).encrypt(nonce, data, encrypted_key)
+
+        return encrypted_key + nonce + encrypted_data
+
+    def decrypt(self, data: bytes) -> bytes:
+        # The RSA encrypted key is always as large as the RSA key
+        encrypted_key_size = self.key_size // 8
+        encrypted_key = data[:encrypted_key_size]
+        nonce = data[encrypted_key_size:encrypted_key_size + RsaHybridEncryptor.NONCE_LENGTH]
+
+        key = super().decrypt(encrypted_key)
+        decrypted_data = AESGCM(key).decrypt(
+            nonce, data[encrypted_key_size + RsaHybridEncryptor.NONCE_LENGTH:], encrypted_key)
+
+        return decrypted_data
+
+    @staticmethod
+    def get_encrypted_size(data_size: int, key_size: int) -> int:
+        return key_size // 8 + RsaHybridEncryptor.NONCE_LENGTH + data_size + RsaHybridEncryptor.TAG_LENGTH
+
+    @staticmethod
+    def get_max_data_size(key_size: int) -> Optional[int]:
+        return None
@@ -0,0 +1,36 @@
+from typing import Callable, Optional
+
+from security.encryptors.generic_encryptor import GenericEncryptor
+from security.enums.encryption_type import EncryptionType
+
+
+class SizeOnlyEncryptor(GenericEncryptor):
+    """Only calculates the sizes of an encryption type, e.g. for the capacity of a file
+
+    No password is asked and no keys are created or loaded, therefore nothing can be encrypted or decrypted.
+    Use EncryptionProvider.get_size_only_encryptor to create it.
+    """
+
+    def __init__(
+            self,
+            encryption_type: EncryptionType,
+            encrypted_size: Callable[[int], int],
+            max_data_size: Optional[int] = None,
+    ):
+        super().__init__(encryption_type)
+
+        self.__encrypted_size = encrypted_size
+        self.__max_data_size = max_data_size
+
+    def encrypt(self, data: bytes) -> bytes:
+        raise ValueError(f'{self.encryption_type.name} encryptor only calculates sizes, it cannot encrypt')
+
+    def decrypt(self, data: bytes) -> bytes:
+        raise ValueError(f'{self.encryption_type.name} encryptor only calculates sizes, it cannot decrypt')
+
+    def encrypted_size(self, data_size: int) -> int:
+        return self.__encrypted_size(data_size)
+
+    @property
+    def max_data_size(self) -> Optional[int]:
+        return self.__max_data_size
@@ -7,3 +7,5 @@ class EncryptionType(Enum):
     FERNET = 1
     AES = 2
     RSA = 3
+    RSA_HYBRID = 4
+    AEAD = 5
@@ -1,7 +1,9 @@
 from typing import Optional
 
+from security.credentials.generic_credential_provider import GenericCredentialProvider
 from security.enums.hash_type import HashType
 from security.hashing.generic_hash import GenericHash
+from security.hashing.kdf_parameters import KdfParameters
 from security.hashing.none_hash import NoneHash
 from security.hashing.pbkdf2_hash import Pbkdf2Hash
 from security.hashing.scrypt_hash import ScryptHash
@@ -13,14 +15,23 @@ class HashProvider:
         pass
 
     @staticmethod
-    def get_hash(hash_type: HashType, is_test: Optional[bool] = False, salt: Optional[bytes] = None) -> GenericHash:
+    def get_hash(
+            hash_type: HashType,
+            is_test: Optional[bool] = False,
+            salt: Optional[bytes] = None,
+            credential_provider: Optional[GenericCredentialProvider] = None,
+            kdf_parameters: Optional[KdfParameters] = None,
+            allow_expensive_kdf: bool = False,
+    ) -> GenericHash:
+        """kdf_parameters are only used by salted hashes, None uses the defaults of the hash
+        Parameters above the limits of the hash raise a ValueError, unless allow_expensive_kdf is set"""
         if not hash_type or hash_type == HashType.NONE:
-            return NoneHash()
+            return NoneHash(credential_provider)
 
         if hash_type == HashType.PBKDF2:
-            return Pbkdf2Hash(is_test, salt)
+            return Pbkdf2Hash(is_test, salt, credential_provider, kdf_parameters, allow_expensive_kdf)
 
         if hash_type == HashType.SCRYPT:
-            return ScryptHash(is_test, salt)
+            return ScryptHash(is_test, salt, credential_provider, kdf_parameters, allow_expensive_kdf)
 
         raise ValueError(f'Could not get Hash from hash_type={hash_type}')
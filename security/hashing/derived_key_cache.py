@@ -0,0 +1,72 @@
+import hashlib
+import hmac
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable, Tuple
+
+
+class DerivedKeyCache:
+    """A size-bounded in-memory LRU cache of derived keys
+
+    Keys are looked up by (hash type, kdf parameters, salt, password digest). The password itself is not stored,
+    only an HMAC of it with a random per-process secret, so the cache entries cannot be used to brute-force the
+    password faster than the key derivation function itself.
+    The derived keys are stored in bytearrays which are overwritten with zeros when they are evicted or cleared.
+    """
+
+    MAX_SIZE = 32
+
+    def __init__(self, max_size: int = MAX_SIZE):
+        self.max_size = max_size
+        self.__secret = os.urandom(32)
+        self.__keys: "OrderedDict[Tuple, bytearray]" = OrderedDict()
+        self.__lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.__keys)
+
+    def get_or_derive(
+            self,
+            hash_type: Hashable,
+            parameters: Tuple,
+            salt: bytes,
+            password: bytes,
+            derive: Callable[[bytes], bytes],
+    ) -> bytes:
+        """Returns the cached key or derives it with derive(password) and stores it"""
+        password_digest = hmac.new(self.__secret, password, hashlib.sha256).digest()
+        cache_key = (hash_type, parameters, bytes(salt), password_digest)
+
+        with self.__lock:
+            if cache_key in self.__keys:
+                self.__keys.move_to_end(cache_key)
+                self.hits += 1
+                return bytes(self.__keys[cache_key])
+
+        # Derive outside of the lock, so other threads are not blocked by a slow key derivation
+        key = derive(password)
+
+        with self.__lock:
+            self.misses += 1
+            if self.max_size > 0:
+                if cache_key in self.__keys:
+                    self.__zeroize(self.__keys.pop(cache_key))
+                self.__keys[cache_key] = bytearray(key)
+                while len(self.__keys) > self.max_size:
+                    _, evicted_key = self.__keys.popitem(last=False)
+                    self.__zeroize(evicted_key)
+        return key
+
+    def clear(self):
+        """Removes and zeroizes all cached keys"""
+        with self.__lock:
+            for key in self.__keys.values():
+                self.__zeroize(key)
+            self.__keys.clear()
+
+    @staticmethod
+    def __zeroize(key: bytearray):
+        key[:] = bytes(len(key))
@@ -1,13 +1,16 @@
 from abc import ABC, abstractmethod
+from typing import Optional
 
+from security.credentials.generic_credential_provider import GenericCredentialProvider
 from security.enums.hash_type import HashType
 
 
 class GenericHash(ABC):
     HASH_TYPE = HashType.NONE
 
-    def __init__(self):
-        pass
+    def __init__(self, credential_provider: Optional[GenericCredentialProvider] = None):
+        # None: ask the user for the password
+        self._credential_provider = credential_provider
 
     @property
     def hash_type(self):
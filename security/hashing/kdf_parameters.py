@@ -0,0 +1,12 @@
+from typing import NamedTuple
+
+
+class KdfParameters(NamedTuple):
+    """The cost parameters of a key derivation function, as stored in the message header
+
+    For PBKDF2 the work factor is the number of iterations and the other values are 0,
+    for scrypt it is the cost parameter n, with the block size r and the parallelization p.
+    """
+    work_factor: int
+    block_size: int = 0
+    parallelization: int = 0
@@ -1,3 +1,6 @@
+from typing import Optional
+
+from security.credentials.generic_credential_provider import GenericCredentialProvider
 from security.enums.hash_type import HashType
 from security.hashing.generic_hash import GenericHash
 from security.utils.hash_utils import HashUtils
@@ -8,15 +11,15 @@ class NoneHash(GenericHash):
     # No hashing at all
     HASH_TYPE = HashType.NONE
 
-    def __init__(self):
-        super().__init__()
+    def __init__(self, credential_provider: Optional[GenericCredentialProvider] = None):
+        super().__init__(credential_provider)
 
     def get_key(self) -> bytes:
-        password_bytes = HashUtils.get_password_from_user()
+        password_bytes = HashUtils.get_password_from_user(self._credential_provider)
 
         return password_bytes
 
     def get_key_with_existing_credentials(self) -> bytes:
-        password_bytes = HashUtils.get_password_from_user()
+        password_bytes = HashUtils.get_password_from_user(self._credential_provider)
 
         return password_bytes
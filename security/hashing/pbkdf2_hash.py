@@ -2,6 +2,7 @@ from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 
 from security.enums.hash_type import HashType
+from security.hashing.kdf_parameters import KdfParameters
 from security.hashing.salted_hash import SaltedHash
 
 
@@ -14,12 +15,29 @@ class Pbkdf2Hash(SaltedHash):
     HASH_LENGTH = 32
     HASH_ITERATIONS = 100000
 
+    # Upper limit for iterations read from a file, 100 times the default
+    MAX_ITERATIONS = 10_000_000
+
     def _get_kdf_instance(self):
         kdf = PBKDF2HMAC(
             algorithm=hashes.SHA256(),
             length=Pbkdf2Hash.HASH_LENGTH,
             salt=self._salt,
-            iterations=Pbkdf2Hash.HASH_ITERATIONS,
+            iterations=self._kdf_parameters.work_factor,
         )
 
         return kdf
+
+    def _get_key_length(self):
+        return Pbkdf2Hash.HASH_LENGTH
+
+    def _get_default_kdf_parameters(self):
+        return KdfParameters(Pbkdf2Hash.HASH_ITERATIONS)
+
+    def _check_kdf_parameters(self, kdf_parameters, allow_expensive_kdf):
+        if kdf_parameters.work_factor < 1:
+            raise ValueError(f'PBKDF2 requires at least 1 iteration, not {kdf_parameters.work_factor}')
+
+        if kdf_parameters.work_factor > Pbkdf2Hash.MAX_ITERATIONS and not allow_expensive_kdf:
+            raise ValueError(f'{kdf_parameters.work_factor} PBKDF2 iterations exceed the limit of '
+                             f'{Pbkdf2Hash.MAX_ITERATIONS}, allow expensive key derivations for trusted files only')
@@ -2,7 +2,10 @@ import os
 from abc import abstractmethod
 from typing import Optional
 
+from security.credentials.generic_credential_provider import GenericCredentialProvider
+from security.hashing.derived_key_cache import DerivedKeyCache
 from security.hashing.generic_hash import GenericHash
+from security.hashing.kdf_parameters import KdfParameters
 from security.utils.hash_utils import HashUtils
 
 
@@ -11,15 +14,38 @@ class SaltedHash(GenericHash):
 
     If initialized with said salt, it will use it for all operations. Otherwise, the salt
     will be generated randomly with os.urandom when encrypting. Or it will be asked from
-    stdin when decrypting.
+    stdin when decrypting. The password is asked from the credential provider, or the user if there is none.
+
+    The cost parameters of the key derivation function default to the class constants of each hash, other values
+    (e.g. from KdfCalibration or a message header) can be given as kdf_parameters. As they may come from an untrusted
+    file, they are checked before deriving and a ValueError is raised for values which are invalid or more expensive
+    than the limits of each hash, unless allow_expensive_kdf is set (for trusted files only).
+
+    Derived keys are cached (shared by all salted hashes in the process), so encoding or decoding many files with
+    the same password and salt only runs the expensive key derivation once.
     """
     SALT_LENGTH = 16
 
-    def __init__(self, is_test: Optional[bool] = False, salt: Optional[bytes] = None):
-        super().__init__()
+    KEY_CACHE = DerivedKeyCache()
+
+    def __init__(
+            self,
+            is_test: Optional[bool] = False,
+            salt: Optional[bytes] = None,
+            credential_provider: Optional[GenericCredentialProvider] = None,
+            kdf_parameters: Optional[KdfParameters] = None,
+            allow_expensive_kdf: bool = False,
+    ):
+        super().__init__(credential_provider)
 
         self._is_test = is_test
 
+        self._kdf_parameters = kdf_parameters
+        if self._kdf_parameters is None:
+            self._kdf_parameters = self._get_default_kdf_parameters()
+        else:
+            self._check_kdf_parameters(self._kdf_parameters, allow_expensive_kdf)
+
         self._salt = salt
         if self._salt is None:
             self._salt = os.urandom(SaltedHash.SALT_LENGTH)
@@ -31,9 +57,13 @@ class SaltedHash(GenericHash):
     def salt(self):
         return self._salt
 
+    @property
+    def kdf_parameters(self) -> KdfParameters:
+        return self._kdf_parameters
+
     def get_key(self) -> bytes:
 
-        password_bytes = HashUtils.get_password(self._is_test)
+        password_bytes = HashUtils.get_password(self._is_test, self._credential_provider)
 
         key = self._derive_key(password_bytes)
 
@@ -41,22 +71,35 @@ class SaltedHash(GenericHash):
 
     def get_key_with_existing_credentials(self) -> bytes:
 
-        password_bytes = HashUtils.get_password_from_user()
+        password_bytes = HashUtils.get_password_from_user(self._credential_provider)
 
         key = self._derive_key(password_bytes)
 
         return key
 
     def _derive_key(self, password_bytes: bytes) -> bytes:
-        kdf = self._get_kdf_instance()
-        key = kdf.derive(password_bytes)
-
-        kdf = self._get_kdf_instance()
-        kdf.verify(password_bytes, key)
-
-        return key
+        return SaltedHash.KEY_CACHE.get_or_derive(
+            self.hash_type,
+            (self._get_key_length(), *self._kdf_parameters),
+            self._salt,
+            password_bytes,
+            lambda password: self._get_kdf_instance().derive(password),
+        )
 
     @abstractmethod
     def _get_kdf_instance(self):
         """Returns key derivation function which differs for each hash function"""
         pass
+
+    @abstractmethod
+    def _get_key_length(self) -> int:
+        pass
+
+    @abstractmethod
+    def _get_default_kdf_parameters(self) -> KdfParameters:
+        pass
+
+    @abstractmethod
+    def _check_kdf_parameters(self, kdf_parameters: KdfParameters, allow_expensive_kdf: bool):
+        """Raises a ValueError if the parameters are invalid or (unless allowed) more expensive than the limits"""
+        pass
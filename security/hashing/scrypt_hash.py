@@ -1,6 +1,7 @@
 from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
 
 from security.enums.hash_type import HashType
+from security.hashing.kdf_parameters import KdfParameters
 from security.hashing.salted_hash import SaltedHash
 
 
@@ -15,12 +16,40 @@ class ScryptHash(SaltedHash):
     BLOCK_SIZE = 8
     PARALLELIZATION = 1
 
+    # Upper limits for parameters read from a file, scrypt needs 128 * r * n bytes of memory and its time grows with
+    # n * r * p, the limits allow 64 times the memory of the defaults
+    MAX_MEMORY = 2 ** 30
+    MAX_PARALLELIZATION = 16
+
     def _get_kdf_instance(self):
         kdf = Scrypt(
             salt=self._salt,
             length=ScryptHash.HASH_LENGTH,
-            n=ScryptHash.COST_PARAMETER,
-            r=ScryptHash.BLOCK_SIZE,
-            p=ScryptHash.PARALLELIZATION,
+            n=self._kdf_parameters.work_factor,
+            r=self._kdf_parameters.block_size,
+            p=self._kdf_parameters.parallelization,
         )
         return kdf
+
+    def _get_key_length(self):
+        return ScryptHash.HASH_LENGTH
+
+    def _get_default_kdf_parameters(self):
+        return KdfParameters(ScryptHash.COST_PARAMETER, ScryptHash.BLOCK_SIZE, ScryptHash.PARALLELIZATION)
+
+    def _check_kdf_parameters(self, kdf_parameters, allow_expensive_kdf):
+        n, r, p = kdf_parameters
+        if n < 2 or n & (n - 1) != 0:
+            raise ValueError(f'The scrypt cost parameter n has to be a power of two larger than 1, not {n}')
+        if r < 1 or p < 1:
+            raise ValueError(f'The scrypt block size r and parallelization p have to be at least 1, not {r} and {p}')
+
+        if allow_expensive_kdf:
+            return
+
+        if 128 * r * n > ScryptHash.MAX_MEMORY:
+            raise ValueError(f'scrypt with n={n} and r={r} needs {128 * r * n} bytes of memory, more than the limit '
+                             f'of {ScryptHash.MAX_MEMORY}, allow expensive key derivations for trusted files only')
+        if p > ScryptHash.MAX_PARALLELIZATION:
+            raise ValueError(f'The scrypt parallelization p={p} exceeds the limit of {ScryptHash.MAX_PARALLELIZATION}, '
+                             f'allow expensive key derivations for trusted files only')
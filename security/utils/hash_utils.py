@@ -1,26 +1,33 @@
 import random
 import string
-from getpass import getpass
 from typing import Optional
 
+from security.credentials.generic_credential_provider import GenericCredentialProvider
+from security.credentials.interactive_credential_provider import InteractiveCredentialProvider
+
 
 class HashUtils:
 
     @staticmethod
-    def get_password(is_test: Optional[bool] = False) -> bytes:
+    def get_password(
+            is_test: Optional[bool] = False,
+            credential_provider: Optional[GenericCredentialProvider] = None,
+    ) -> bytes:
         if is_test:
             password_bytes = bytes(HashUtils.get_random_string(20), 'utf-8')
         else:
-            password_bytes = HashUtils.get_password_from_user()
+            password_bytes = HashUtils.get_password_from_user(credential_provider)
 
         return password_bytes
 
     @staticmethod
-    def get_password_from_user() -> bytes:
+    def get_password_from_user(credential_provider: Optional[GenericCredentialProvider] = None) -> bytes:
+        """Asks the credential provider for the password, or the user if there is none"""
 
-        password = getpass('Please enter the password you want to use: ')
+        if credential_provider is None:
+            credential_provider = InteractiveCredentialProvider()
 
-        password_bytes = bytes(password, 'utf-8')
+        password_bytes = credential_provider.get_password('Please enter the password you want to use: ')
 
         return password_bytes
 
@@ -0,0 +1,94 @@
+#!/usr/bin/python3
+
+import argparse
+import math
+import os
+import time
+
+from security.enums.hash_type import HashType
+from security.hash_provider import HashProvider
+from security.hashing.kdf_parameters import KdfParameters
+from security.hashing.pbkdf2_hash import Pbkdf2Hash
+from security.hashing.salted_hash import SaltedHash
+from security.hashing.scrypt_hash import ScryptHash
+
+
+class KdfCalibration:
+    """Chooses the cost parameters of a password hash for a target key derivation time on the local machine
+
+    The derivation time of PBKDF2 grows linearly with the iterations and the one of scrypt with the cost parameter n,
+    so a cheap derivation is measured and scaled to the target time. The parameters are stored in the header of
+    every message, so files encoded with other parameters can still be decoded.
+    """
+
+    PBKDF2_MEASUREMENT_ITERATIONS = 20_000
+    PBKDF2_MIN_ITERATIONS = 10_000
+    PBKDF2_ITERATIONS_STEP = 1_000
+
+    SCRYPT_MEASUREMENT_COST = 2 ** 12
+    SCRYPT_MIN_COST = 2 ** 10
+
+    MEASUREMENT_REPEATS = 3
+
+    @staticmethod
+    def calibrate(hash_type: HashType, target_seconds: float) -> KdfParameters:
+        """Returns the most expensive parameters whose derivation takes at most target_seconds (but at least the
+        minimum and at most the limits of the hash), the block size and parallelization of scrypt are kept at their
+        defaults"""
+
+        if hash_type == HashType.PBKDF2:
+            measurement_parameters = KdfParameters(KdfCalibration.PBKDF2_MEASUREMENT_ITERATIONS)
+            scale = target_seconds / KdfCalibration.measure(hash_type, measurement_parameters)
+
+            step = KdfCalibration.PBKDF2_ITERATIONS_STEP
+            iterations = int(KdfCalibration.PBKDF2_MEASUREMENT_ITERATIONS * scale) // step * step
+            iterations = min(iterations, Pbkdf2Hash.MAX_ITERATIONS)
+            return KdfParameters(max(KdfCalibration.PBKDF2_MIN_ITERATIONS, iterations))
+
+        if hash_type == HashType.SCRYPT:
+            block_size, parallelization = ScryptHash.BLOCK_SIZE, ScryptHash.PARALLELIZATION
+            measurement_parameters = KdfParameters(KdfCalibration.SCRYPT_MEASUREMENT_COST, block_size, parallelization)
+            scale = target_seconds / KdfCalibration.measure(hash_type, measurement_parameters)
+
+            # n has to be a power of two
+            # scrypt needs 128 * r * n bytes of memory
+            max_cost = ScryptHash.MAX_MEMORY // (128 * block_size)
+            cost = min(KdfCalibration.SCRYPT_MEASUREMENT_COST * scale, max_cost)
+            cost = 2 ** int(math.log2(max(cost, KdfCalibration.SCRYPT_MIN_COST)))
+            return KdfParameters(cost, block_size, parallelization)
+
+        raise ValueError(f'Only salted hashes can be calibrated, not {hash_type}')
+
+    @staticmethod
+    def measure(hash_type: HashType, kdf_parameters: KdfParameters) -> float:
+        """Returns the fastest of several derivations in seconds (bypassing the derived key cache)"""
+
+        salt = os.urandom(SaltedHash.SALT_LENGTH)
+        hash_algo = HashProvider.get_hash(hash_type, is_test=True, salt=salt, kdf_parameters=kdf_parameters)
+
+        best_time = float('inf')
+        for _ in range(KdfCalibration.MEASUREMENT_REPEATS):
+            start = time.perf_counter()
+            hash_algo._get_kdf_instance().derive(b"calibration")
+            best_time = min(best_time, time.perf_counter() - start)
+
+        return best_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Choose key derivation parameters for a target derivation time.')
+    parser.add_argument('-t', '--target_time', type=float, default=0.5, help='target derivation time in seconds')
+    possible_hash_values = ', '.join(f"{ht.value}: {ht.name}" for ht in HashType if ht != HashType.NONE)
+    parser.add_argument('-a', '--hash_type', type=int, nargs='+',
+                        default=[HashType.PBKDF2.value, HashType.SCRYPT.value],
+                        help=f'hash types as numbers to calibrate ({possible_hash_values})')
+    args = parser.parse_args()
+
+    for hash_type in map(HashType, args.hash_type):
+        kdf_parameters = KdfCalibration.calibrate(hash_type, args.target_time)
+        derivation_time = KdfCalibration.measure(hash_type, kdf_parameters)
+        print(f"{hash_type.name}: {kdf_parameters} ({derivation_time:.3f} s)")
+
+
+if __name__ == "__main__":
+    main()
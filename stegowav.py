@@ -8,11 +8,20 @@ from error_correction.error_correction_provider import ErrorCorrectionProvider
 from error_correction.error_correction_type import ErrorCorrectionType
 from matplotlib import pyplot as plt
 
+from security.credentials.environment_credential_provider import EnvironmentCredentialProvider
+from security.credentials.file_descriptor_credential_provider import FileDescriptorCredentialProvider
+from security.credentials.key_file_credential_provider import KeyFileCredentialProvider
 from security.encryption_provider import EncryptionProvider
 from security.enums.encryption_type import EncryptionType
 from security.enums.hash_type import HashType
+from security.utils.kdf_calibration import KdfCalibration
+from wav_steganography.verification_type import VerificationType
 from wav_steganography.wav_file import WAVFile
 
+# Encoding and decoding with larger symbols takes about 10 seconds for messages of this size (see
+# ReedSolomonErrorCorrection), longer messages are refused
+MAX_WIDE_SYMBOL_MESSAGE_SIZE = 4096
+
 
 def parse_arguments() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Encode message into a WAV file.")
@@ -24,6 +33,9 @@ def parse_arguments() -> argparse.Namespace:
     parser.add_argument("--overwrite", action="store_true",
                         help="if the file specified as output should be overwritten")
 
+    parser.add_argument("--in_place", action="store_true",
+                        help="encode into the input file, only writing back the modified samples")
+
     possible_encryption_values = ', '.join(f"{enc.value}: {enc.name}" for enc in EncryptionType)
     parser.add_argument("-t", "--encryption_type", type=int, default=EncryptionType.NONE,
                         help=f"encryption type as number to use ({possible_encryption_values}). "
@@ -33,12 +45,37 @@ def parse_arguments() -> argparse.Namespace:
     parser.add_argument("-a", "--hash_type", type=int, default=HashType.PBKDF2,
                         help=f"hash type as number to use ({possible_hash_values})")
 
+    parser.add_argument("--kdf_time", type=float, metavar="SECONDS",
+                        help="choose the password hash cost for this derivation time on this machine when encoding "
+                             "(stored in the header, default: fixed cost)")
+    parser.add_argument("--allow_expensive_kdf", action="store_true",
+                        help="decode files whose password hash cost exceeds the limits (only for trusted files)")
+
+    password_group = parser.add_mutually_exclusive_group()
+    password_group.add_argument("--password_env", type=str, metavar="VARIABLE",
+                                help="read the password from this environment variable instead of asking for it")
+    password_group.add_argument("--password_file", type=str, metavar="PATH",
+                                help="read the password from this file instead of asking for it")
+    password_group.add_argument("--password_fd", type=int, metavar="FD",
+                                help="read the password from this open file descriptor (e.g. a pipe)")
+
     error_correction_type_values = ', '.join(f"{ect.value}: {ect.name}" for ect in ErrorCorrectionType)
     parser.add_argument("-c", "--error_correction_type", type = int, default = 2,
                         help = f"error correction type as number to use ({error_correction_type_values})")
 
     parser.add_argument("-r", "--redundant_bits", type=int, default=0,
-                        help="number of redundant bits for error correction")
+                        help="number of redundant bits for error correction "
+                             "(hamming: 1-3: (72,64), 0 or 4-7: (12,8), 8+: (8,4) code)")
+
+    parser.add_argument("-i", "--interleave_depth", type=int, default=1,
+                        help="interleave the error corrected bytes with this depth to spread bursts of errors "
+                             "(e.g. 255 for reed solomon, 1: no interleaving)")
+
+    parser.add_argument("--symbol_bits", type=int, default=8,
+                        help="symbol size in bits for reed solomon (8, 12 or 16), "
+                             "larger symbols allow fewer, longer codewords, but are much slower "
+                             f"(about 16 or 256 times for long messages, so at most "
+                             f"{MAX_WIDE_SYMBOL_MESSAGE_SIZE} bytes can be encoded with them)")
 
     parser.add_argument("-l", "--lsb", type=int, default=2,
                         help="number of least significant bits to use while encoding")
@@ -46,8 +83,21 @@ def parse_arguments() -> argparse.Namespace:
     parser.add_argument("--use_nth_byte", type=int, default=1,
                         help="use only every nth byte (e.g. if 4: 1 byte will be used for data, 3 will be skipped)")
 
+    verification_type_values = ', '.join(f"{vt.value}: {vt.name}" for vt in VerificationType)
+    parser.add_argument("-v", "--verify", type=int, default=VerificationType.FULL.value,
+                        help=f"how to verify the encoded message ({verification_type_values})")
+
     parser.add_argument("-f", "--fill", action="store_true", help="fill entire file by repeating data")
 
+    parser.add_argument("-m", "--majority_vote", action="store_true",
+                        help="when decoding a filled file, decide each bit by majority vote over all copies")
+
+    parser.add_argument("--mmap", action="store_true",
+                        help="memory map the input file instead of reading it into memory (for very large files)")
+
+    parser.add_argument("--capacity", action="store_true",
+                        help="show how many bytes can be encoded with the given encoding parameters")
+
     parser.add_argument("--profile", action="store_true", help="profile code (show which parts are taking long)")
 
     parser.add_argument("-s", "--spectrogram", action="store_true", help="display a spectrogram of the given file")
@@ -55,7 +105,11 @@ def parse_arguments() -> argparse.Namespace:
     parser.add_argument("-p", "--play", action="store_true",
                         help="play the file (if -e provided, it will play after encoding, to hear the noise)")
 
-    return parser.parse_args()
+    args = parser.parse_args()
+    if args.encode and args.symbol_bits > 8 and len(args.encode.encode("UTF-8")) > MAX_WIDE_SYMBOL_MESSAGE_SIZE:
+        parser.error(f"messages longer than {MAX_WIDE_SYMBOL_MESSAGE_SIZE} bytes cannot be encoded with "
+                     f"--symbol_bits {args.symbol_bits}, as it would take very long, use 8 bit symbols instead")
+    return args
 
 
 def handle_args(args):
@@ -79,11 +133,39 @@ def handle_args(args):
     if args.input in audio_file_keywords:
         args.input = audio_file_keywords[args.input]
 
-    wav_file = WAVFile(args.input)
-
-    encryptor = EncryptionProvider.get_encryptor(encryption_type, hash_type, decryption=args.decode)
+    # Lazy, as e.g. the capacity can be calculated from the header alone. Encoding in place memory maps the file, so
+    # only the encoded samples are read
+    wav_file = WAVFile(args.input, mmap=args.mmap or args.in_place, lazy=True)
+
+    credential_provider = None
+    if args.password_env:
+        credential_provider = EnvironmentCredentialProvider(args.password_env)
+    elif args.password_file:
+        credential_provider = KeyFileCredentialProvider(args.password_file)
+    elif args.password_fd is not None:
+        credential_provider = FileDescriptorCredentialProvider(args.password_fd)
+
+    kdf_parameters = None
+    if args.kdf_time and args.encode and hash_type != HashType.NONE:
+        kdf_parameters = KdfCalibration.calibrate(hash_type, args.kdf_time)
+        print(f"Calibrated {hash_type.name} parameters: {kdf_parameters}")
+
+    # When only decoding, the encryptor is created from the message header (which contains the salt, nonce and the
+    # key derivation parameters)
+    encryptor = None
+    if args.encode:
+        encryptor = EncryptionProvider.get_encryptor(
+            encryption_type, hash_type, decryption=args.decode, credential_provider=credential_provider,
+            kdf_parameters=kdf_parameters)
     error_correction = ErrorCorrectionProvider.get_error_correction(error_correction_type=error_correction_type)
 
+    if args.capacity:
+        # Only the encrypted sizes are needed, so no password is asked and no keys are created
+        size_encryptor = encryptor or EncryptionProvider.get_size_only_encryptor(encryption_type)
+        capacity = wav_file.capacity(
+            args.lsb, args.use_nth_byte, args.redundant_bits, size_encryptor, error_correction, args.symbol_bits)
+        print(f"Capacity: {capacity:,d} bytes")
+
     post_encoding_spectrum_ax, diff_ax = None, None
     if args.encode:
         if args.spectrogram:
@@ -102,10 +184,20 @@ def handle_args(args):
             encryptor=encryptor,
             error_correction=error_correction,
             repeat_data=args.fill,
+            in_place=args.in_place,
+            verify=VerificationType(args.verify),
+            interleave_depth=args.interleave_depth,
+            symbol_bits=args.symbol_bits,
         )
 
     if args.decode:
-        decoded_message = wav_file.decode(encryptor=encryptor)
+        decoded_message = wav_file.decode(
+            encryptor=encryptor,
+            error_correction=error_correction,
+            majority_vote=args.majority_vote,
+            credential_provider=credential_provider,
+            allow_expensive_kdf=args.allow_expensive_kdf,
+        )
 
         decoded_string = decoded_message.decode("UTF-8")
 
@@ -0,0 +1,287 @@
+import csv
+import importlib.util
+import itertools
+import json
+import math
+import random
+import sys
+import types
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+import reedsolo
+from reedsolo import RSCodec
+
+from error_correction import reed_solomon_error_correction
+from error_correction.batch_reed_solomon_error_correction import BatchReedSolomonErrorCorrection
+from error_correction.hamming_error_correction import HammingErrorCorrection
+from error_correction.reed_solomon_error_correction import ReedSolomonError, ReedSolomonErrorCorrection
+from evaluation.error_correction_benchmark import run_benchmark, write_results
+
+
+def test_hamming_known_codewords():
+    # 0x00 only has zero bits, 0xFF sets all data bits and parity bits 1 and 2 (1110 1110 1111)
+    assert HammingErrorCorrection.encode(b"\x00", 0) == b"\x00\x00"
+    assert HammingErrorCorrection.encode(b"\xff\xff", 0) == bytes([0xEE, 0xFE, 0xEF])
+
+
+def test_hamming_encoding_decoding():
+    random.seed(0)
+    for length in range(0, 50):
+        data = bytes(random.choices(range(256), k=length)) + b"\x00" * (length % 3)
+        encoded = HammingErrorCorrection.encode(data, 0)
+        assert len(encoded) == HammingErrorCorrection.encoded_size(len(data), 0)
+        assert HammingErrorCorrection.decode(encoded, 0) == data
+
+
+def test_hamming_corrects_single_flipped_bit_per_codeword():
+    random.seed(1)
+    data = bytes(random.choices(range(256), k=100))
+    encoded = bytearray(HammingErrorCorrection.encode(data, 0))
+    for codeword in range(len(data)):
+        bit = codeword * 12 + random.randrange(12)
+        encoded[bit // 8] ^= 1 << (7 - bit % 8)
+    assert HammingErrorCorrection.decode(bytes(encoded), 0) == data
+
+
+def test_hamming_codes_chosen_by_redundant_bits():
+    random.seed(2)
+    data = bytes(random.choices(range(256), k=101))
+    for redundant_bits, expected_size in [(0, 152), (1, 101 + 13), (4, 152), (8, 202)]:
+        encoded = HammingErrorCorrection.encode(data, redundant_bits)
+        assert len(encoded) == expected_size == HammingErrorCorrection.encoded_size(len(data), redundant_bits)
+        assert HammingErrorCorrection.decode(encoded, redundant_bits) == data
+
+
+def test_secded_codes_correct_single_and_detect_double_flipped_bits():
+    random.seed(3)
+    data = bytes(random.choices(range(256), k=37))
+    for code in [HammingErrorCorrection.SECDED_72_64, HammingErrorCorrection.SECDED_8_4]:
+        encoded = code.encode(data)
+        corrupted = bytearray(encoded)
+        for codeword_start in range(0, len(encoded) * 8, code.codeword_bits):
+            bit = random.randrange(codeword_start, min(codeword_start + code.codeword_bits, len(encoded) * 8))
+            corrupted[bit // 8] ^= 1 << (7 - bit % 8)
+        assert code.decode(bytes(corrupted)) == (data, 0)
+
+        corrupted = bytearray(encoded)
+        corrupted[0] ^= 0b11000000
+        assert code.decode(bytes(corrupted))[1] == 1
+
+
+def test_reed_solomon_codecs_are_cached():
+    data = bytes(range(200))
+    ReedSolomonErrorCorrection._create_codec.cache_clear()
+    for _ in range(10):
+        encoded = ReedSolomonErrorCorrection.encode(data, 8)
+        assert ReedSolomonErrorCorrection.decode(encoded, 8) == data
+    cache_info = ReedSolomonErrorCorrection._create_codec.cache_info()
+    assert cache_info.misses == 1 and cache_info.hits == 19
+
+
+def test_reed_solomon_parallel_encoding_decoding_matches_serial(monkeypatch):
+    random.seed(4)
+    data = bytes(random.choices(range(256), k=3000))
+    serial_encoded = ReedSolomonErrorCorrection.encode(data, 16)
+
+    monkeypatch.setattr(ReedSolomonErrorCorrection, "PARALLEL_MIN_CHUNKS", 2)
+    monkeypatch.setattr(ReedSolomonErrorCorrection, "PARALLEL_MAX_WORKERS", 2)
+    encoded = ReedSolomonErrorCorrection.encode(data, 16)
+    assert encoded == serial_encoded
+
+    corrupted = bytearray(encoded)
+    for position in range(0, len(corrupted), 50):
+        corrupted[position] ^= 0xFF
+    assert ReedSolomonErrorCorrection.decode(bytes(corrupted), 16) == data
+
+
+def test_reed_solomon_larger_symbols_are_parallel_with_few_codewords(monkeypatch):
+    random.seed(9)
+    # Two codewords of 12 bit symbols, far fewer than PARALLEL_MIN_CHUNKS
+    data = bytes(random.choices(range(256), k=7000))
+    serial_encoded = ReedSolomonErrorCorrection.encode(data, 1, symbol_bits=12)
+
+    pools = []
+
+    class RecordingProcessPoolExecutor(ProcessPoolExecutor):
+        def __init__(self, *args, **kwargs):
+            pools.append(kwargs)
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(reed_solomon_error_correction, "ProcessPoolExecutor", RecordingProcessPoolExecutor)
+    monkeypatch.setattr(ReedSolomonErrorCorrection, "PARALLEL_MAX_WORKERS", 2)
+    encoded = ReedSolomonErrorCorrection.encode(data, 1, symbol_bits=12)
+    assert encoded == serial_encoded
+    assert ReedSolomonErrorCorrection.decode(encoded, 1, symbol_bits=12) == data
+    assert pools == [{"max_workers": 2}] * 2
+
+
+def test_batch_reed_solomon_matches_reed_solomon():
+    random.seed(5)
+    messages = [bytes(random.choices(range(256), k=random.randint(0, 600))) for _ in range(50)]
+    for redundant_bits in [0, 1, 8, 40]:
+        encoded = BatchReedSolomonErrorCorrection.encode_batch(messages, redundant_bits)
+        assert encoded == [ReedSolomonErrorCorrection.encode(message, redundant_bits) for message in messages]
+        assert BatchReedSolomonErrorCorrection.decode_batch(encoded, redundant_bits) == messages
+
+    encoded = BatchReedSolomonErrorCorrection.encode_batch(messages, 16)
+    corrupted = [bytes(byte ^ 0xFF if index % 40 == 0 else byte for index, byte in enumerate(data))
+                 for data in encoded]
+    assert BatchReedSolomonErrorCorrection.decode_batch(corrupted, 16) == messages
+
+
+def test_batch_reed_solomon_returns_errors_per_message():
+    random.seed(7)
+    messages = [bytes(random.choices(range(256), k=300)) for _ in range(3)]
+    encoded = BatchReedSolomonErrorCorrection.encode_batch(messages, 8)
+    # Far more flipped bytes in the second message than can be corrected
+    encoded[1] = bytes(byte ^ 0xFF if index % 2 == 0 else byte for index, byte in enumerate(encoded[1]))
+
+    decoded = BatchReedSolomonErrorCorrection.decode_batch(encoded, 8)
+    assert decoded[0] == messages[0] and decoded[2] == messages[2]
+    assert isinstance(decoded[1], ReedSolomonError)
+    with pytest.raises(ReedSolomonError):
+        BatchReedSolomonErrorCorrection.decode(encoded[1], 8)
+
+
+def test_reed_solomon_decoding_with_erasures(monkeypatch):
+    random.seed(6)
+    data = bytes(random.choices(range(256), k=2000))
+    encoded = ReedSolomonErrorCorrection.encode(data, 16)
+    ecc_byte_count = ReedSolomonErrorCorrection._get_ecc_byte_count_per_chunk(16)
+
+    # More errors than correctable without knowing their positions, in the first and the last codeword
+    erasures = list(range(10, 10 + ecc_byte_count - 10)) + list(range(len(encoded) - 100, len(encoded) - 1))
+    corrupted = bytearray(encoded)
+    for position in erasures:
+        corrupted[position] ^= 0xFF
+    assert ReedSolomonErrorCorrection.decode(bytes(corrupted), 16, erasures) == data
+
+    monkeypatch.setattr(ReedSolomonErrorCorrection, "PARALLEL_MIN_CHUNKS", 2)
+    monkeypatch.setattr(ReedSolomonErrorCorrection, "PARALLEL_MAX_WORKERS", 2)
+    assert ReedSolomonErrorCorrection.decode(bytes(corrupted), 16, erasures) == data
+
+    # Too many correct bytes marked as erasures, decoded without them
+    assert ReedSolomonErrorCorrection.decode(encoded, 16, list(range(0, 255))) == data
+
+    # More erasures than ecc bytes cannot be corrected, such codewords are only decoded once, without the erasures
+    monkeypatch.setattr(ReedSolomonErrorCorrection, "PARALLEL_MIN_CHUNKS", 64)
+    erase_positions = []
+    codec_decode = RSCodec.decode
+
+    def decode(codec, data, *args, erase_pos=None, **kwargs):
+        erase_positions.append(erase_pos)
+        return codec_decode(codec, data, *args, erase_pos=erase_pos, **kwargs)
+
+    monkeypatch.setattr(RSCodec, "decode", decode)
+    assert ReedSolomonErrorCorrection.decode(encoded, 16, list(range(0, ecc_byte_count + 1))) == data
+    assert erase_positions == [None] * math.ceil(len(encoded) / ReedSolomonErrorCorrection.CHUNK_SIZE)
+
+
+def test_reed_solomon_with_larger_symbols():
+    random.seed(7)
+    for symbol_bits in [12, 16]:
+        for length in [0, 1, 2, 3, 700]:
+            data = bytes(random.choices(range(256), k=length))
+            encoded = ReedSolomonErrorCorrection.encode(data, 8, symbol_bits=symbol_bits)
+            assert len(encoded) == ReedSolomonErrorCorrection.encoded_size(length, 8, symbol_bits=symbol_bits)
+            assert ReedSolomonErrorCorrection.decode(encoded, 8, symbol_bits=symbol_bits) == data
+
+    # 700 bytes fit into a single codeword of 12 bit symbols, which corrects up to a quarter of its symbols
+    corrupted = bytearray(ReedSolomonErrorCorrection.encode(data, 8, symbol_bits=12))
+    for position in range(0, len(corrupted), 16):
+        corrupted[position] ^= 0xFF
+    assert ReedSolomonErrorCorrection.decode(bytes(corrupted), 8, symbol_bits=12) == data
+
+
+def load_reed_solomon_module(monkeypatch, creedsolo):
+    """Loads a separate copy of the module, with the given creedsolo module (None if it is not installed)"""
+    monkeypatch.setitem(sys.modules, "creedsolo", creedsolo)
+    spec = importlib.util.spec_from_file_location("reed_solomon_copy", reed_solomon_error_correction.__file__)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_reed_solomon_without_creedsolo(monkeypatch):
+    module = load_reed_solomon_module(monkeypatch, None)
+    assert module.reedsolo_implementation is reedsolo
+    assert module.ReedSolomonError is reedsolo.ReedSolomonError
+
+
+def test_reed_solomon_with_creedsolo(monkeypatch):
+    creedsolo = types.ModuleType("creedsolo")
+
+    class CReedSolomonError(Exception):
+        pass
+
+    class CRSCodec(reedsolo.RSCodec):
+        def decode(self, *args, **kwargs):
+            try:
+                return super().decode(*args, **kwargs)
+            except reedsolo.ReedSolomonError as error:
+                raise CReedSolomonError(*error.args)
+
+    creedsolo.RSCodec, creedsolo.ReedSolomonError, creedsolo.init_tables = CRSCodec, CReedSolomonError, None
+    module = load_reed_solomon_module(monkeypatch, creedsolo)
+    correction = module.ReedSolomonErrorCorrection
+    assert module.ReedSolomonError is CReedSolomonError
+
+    # creedsolo only supports bytes, larger symbols use reedsolo, but both raise the error of creedsolo
+    assert type(correction._get_codec(10)) is CRSCodec
+    assert type(correction._get_codec(10, 4095, 12)) is reedsolo.RSCodec
+    random.seed(8)
+    data = bytes(random.choices(range(256), k=300))
+    # The error of creedsolo is caught to retry a codeword without its (wrong) erasures
+    ecc_byte_count = correction._get_ecc_byte_count_per_chunk(8)
+    corrupted = bytearray(correction.encode(data, 8))
+    for position in range(100, 100 + ecc_byte_count // 2):
+        corrupted[position] ^= 0xFF
+    assert correction.decode(bytes(corrupted), 8, erasures=list(range(ecc_byte_count // 2 + 1))) == data
+    for symbol_bits in [8, 12]:
+        encoded = correction.encode(data, 8, symbol_bits=symbol_bits)
+        assert correction.decode(encoded, 8, symbol_bits=symbol_bits) == data
+        corrupted = bytes(byte ^ 0xFF if index % 2 == 0 else byte for index, byte in enumerate(encoded))
+        with pytest.raises(CReedSolomonError):
+            correction.decode(corrupted, 8, symbol_bits=symbol_bits)
+
+
+def test_reed_solomon_codeword_layout():
+    def smallest_layout(symbol_count, redundant_bits, symbol_bits):
+        # Tries every encoded symbol count, the layout has to be the smallest valid one
+        max_chunk_size = ReedSolomonErrorCorrection._get_chunk_size(symbol_bits)
+        max_ecc_count = ReedSolomonErrorCorrection._get_ecc_byte_count_per_chunk(redundant_bits, symbol_bits)
+        for encoded_count in itertools.count(max(2, symbol_count + 1)):
+            chunk_size, ecc_count = ReedSolomonErrorCorrection._get_codeword_size(
+                encoded_count, max_chunk_size, max_ecc_count)
+            chunk_count = math.ceil(encoded_count / chunk_size)
+            if (encoded_count - (chunk_count - 1) * chunk_size > ecc_count
+                    and encoded_count - chunk_count * ecc_count >= symbol_count):
+                return encoded_count, chunk_size, ecc_count
+
+    for symbol_bits, redundant_bits in ((12, 1), (12, 8), (12, 300), (16, 8)):
+        for symbol_count in [1, 2, 3, 10, 500, 5000]:
+            assert ReedSolomonErrorCorrection._get_codeword_layout(symbol_count, redundant_bits, symbol_bits) \
+                == smallest_layout(symbol_count, redundant_bits, symbol_bits)
+
+    # Large data fills all codewords of the maximum size, the layout is found without trying every size
+    encoded_count, chunk_size, ecc_count = ReedSolomonErrorCorrection._get_codeword_layout(10 ** 7, 8, 12)
+    assert (chunk_size, ecc_count) == (4095, ReedSolomonErrorCorrection._get_ecc_byte_count_per_chunk(8, 12))
+    assert encoded_count - math.ceil(encoded_count / chunk_size) * ecc_count >= 10 ** 7
+
+
+def test_error_correction_benchmark_writes_reports(tmp_path):
+    rows = run_benchmark(["none", "hamming", "reed_solomon"], [8], data_size=200, error_rates=[0.001],
+                         burst_lengths=[8], trials=1, repeats=1)
+    assert len(rows) == 3 * 2
+    assert all(row["encode_mb_per_s"] > 0 and row["decode_mb_per_s"] > 0 for row in rows)
+    assert all(row["encode_peak_memory"] > 0 for row in rows if row["codec"] != "none")
+    # Without error correction every injected error stays, Reed Solomon with 8 redundant bits corrects all of them
+    assert all(row["recovered_trials"] == 0 for row in rows if row["codec"] == "none")
+    assert all(row["recovered_trials"] == 1 for row in rows if row["codec"] == "reed_solomon")
+
+    csv_path, json_path = write_results(rows, tmp_path)
+    with open(csv_path, newline='') as csv_file:
+        assert len(list(csv.DictReader(csv_file))) == len(rows)
+    with open(json_path) as json_file:
+        assert json.load(json_file) == rows
@@ -0,0 +1,258 @@
+import os
+
+import pytest
+
+from security.credentials.callback_credential_provider import CallbackCredentialProvider
+from security.credentials.environment_credential_provider import EnvironmentCredentialProvider
+from security.credentials.file_descriptor_credential_provider import FileDescriptorCredentialProvider
+from security.credentials.key_file_credential_provider import KeyFileCredentialProvider
+from security.encryption_provider import EncryptionProvider
+from security.hash_provider import HashProvider
+from security.encryptors.aead_encryptor import AeadEncryptor
+from security.encryptors.private_key_cache import PrivateKeyCache
+from security.encryptors.rsa_encryptor import RsaEncryptor
+from security.enums.encryption_type import EncryptionType
+from security.enums.hash_type import HashType
+from security.hashing.derived_key_cache import DerivedKeyCache
+from security.hashing.kdf_parameters import KdfParameters
+from security.hashing.pbkdf2_hash import Pbkdf2Hash
+from security.hashing.salted_hash import SaltedHash
+from security.hashing.scrypt_hash import ScryptHash
+from security.utils.kdf_calibration import KdfCalibration
+
+
+def test_derived_keys_are_cached_per_salt_and_password():
+    salt = os.urandom(SaltedHash.SALT_LENGTH)
+    hits, misses = SaltedHash.KEY_CACHE.hits, SaltedHash.KEY_CACHE.misses
+
+    key = Pbkdf2Hash(salt=salt)._derive_key(b"password")
+    assert Pbkdf2Hash(salt=salt)._derive_key(b"password") == key
+    assert SaltedHash.KEY_CACHE.hits == hits + 1 and SaltedHash.KEY_CACHE.misses == misses + 1
+
+    # The key is the same one the key derivation function returns without the cache
+    assert key == Pbkdf2Hash(salt=salt)._get_kdf_instance().derive(b"password")
+
+    assert Pbkdf2Hash(salt=salt)._derive_key(b"other password") != key
+    assert Pbkdf2Hash(salt=os.urandom(SaltedHash.SALT_LENGTH))._derive_key(b"password") != key
+    assert ScryptHash(salt=salt)._derive_key(b"password") != key
+    assert SaltedHash.KEY_CACHE.misses == misses + 4
+
+
+def test_derived_key_cache_zeroizes_evicted_keys():
+    cache = DerivedKeyCache(max_size=2)
+    derive_count = 0
+
+    def derive(password):
+        nonlocal derive_count
+        derive_count += 1
+        return password * 2
+
+    salt = bytes(SaltedHash.SALT_LENGTH)
+    assert cache.get_or_derive("hash", (1,), salt, b"first", derive) == b"firstfirst"
+    stored_keys = list(cache._DerivedKeyCache__keys.values())
+
+    cache.get_or_derive("hash", (1,), salt, b"second", derive)
+    cache.get_or_derive("hash", (1,), salt, b"third", derive)
+    assert len(cache) == 2
+    assert stored_keys[0] == bytes(10), "The evicted key has to be overwritten with zeros"
+
+    assert cache.get_or_derive("hash", (1,), salt, b"third", derive) == b"thirdthird"
+    assert derive_count == 3
+
+    stored_keys = list(cache._DerivedKeyCache__keys.values())
+    cache.clear()
+    assert len(cache) == 0
+    assert all(key == bytes(len(key)) for key in stored_keys)
+
+
+def test_private_key_cache_does_not_store_passwords():
+    cache = PrivateKeyCache(max_size=2)
+    loaded = []
+
+    def load(private_pem, password):
+        loaded.append((private_pem, password))
+        return object()
+
+    key = cache.get_or_load(b"pem", b"password", load)
+    assert cache.get_or_load(b"pem", b"password", load) is key
+    assert cache.get_or_load(b"pem", b"other password", load) is not key
+    assert cache.get_or_load(b"changed pem", b"password", load) is not key
+    assert len(cache) == 2 and len(loaded) == 3 and cache.hits == 1
+
+    cache_keys = list(cache._PrivateKeyCache__keys)
+    assert all(b"password" not in part and b"pem" not in part for cache_key in cache_keys for part in cache_key)
+
+
+def test_credential_providers(monkeypatch, tmp_path):
+    monkeypatch.setenv("TEST_STEGOWAV_PASSWORD", "environment pässword")
+    assert EnvironmentCredentialProvider("TEST_STEGOWAV_PASSWORD").get_password("") == "environment pässword".encode()
+
+    key_file = tmp_path / "password.txt"
+    key_file.write_bytes(b"file password\n")
+    assert KeyFileCredentialProvider(key_file).get_password("") == b"file password"
+
+    read_fd, write_fd = os.pipe()
+    os.write(write_fd, b"pipe password\n")
+    os.close(write_fd)
+    provider = FileDescriptorCredentialProvider(read_fd)
+    assert provider.get_password("") == b"pipe password"
+    assert provider.get_password("") == b"pipe password", "The password has to be kept after reading the pipe"
+    os.close(read_fd)
+
+    prompts = []
+    provider = CallbackCredentialProvider(lambda prompt: prompts.append(prompt) or "callback password")
+    assert provider.get_password("Password?") == b"callback password"
+    assert prompts == ["Password?"]
+
+
+def test_encryptors_with_credential_provider(monkeypatch, tmp_path):
+    monkeypatch.setenv("TEST_STEGOWAV_PASSWORD", "password")
+    credential_provider = EnvironmentCredentialProvider("TEST_STEGOWAV_PASSWORD")
+    data = b"My secret message"
+
+    for encryption_type in (EncryptionType.FERNET, EncryptionType.AES):
+        encryptor = EncryptionProvider.get_encryptor(
+            encryption_type, HashType.PBKDF2, credential_provider=credential_provider)
+        decryptor = EncryptionProvider.get_encryptor(
+            encryption_type, HashType.PBKDF2, decryption=True, salt=encryptor.salt,
+            nonce=getattr(encryptor, "nonce", None), credential_provider=credential_provider)
+        assert decryptor.decrypt(encryptor.encrypt(data)) == data
+
+    # The RSA keys are written to and read from the working directory, protected by the provided password
+    monkeypatch.chdir(tmp_path)
+    encryptor = EncryptionProvider.get_encryptor(EncryptionType.RSA, credential_provider=credential_provider)
+    decryptor = EncryptionProvider.get_encryptor(
+        EncryptionType.RSA, decryption=True, credential_provider=credential_provider)
+    assert decryptor.decrypt(encryptor.encrypt(data)) == data
+
+
+def test_rsa_hybrid_encryption(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    credential_provider = CallbackCredentialProvider(lambda prompt: "password")
+    encryptor = EncryptionProvider.get_encryptor(EncryptionType.RSA_HYBRID, credential_provider=credential_provider)
+    assert encryptor.encryption_type == EncryptionType.RSA_HYBRID
+    assert encryptor.max_data_size is None
+
+    hits, misses = RsaEncryptor.PRIVATE_KEY_CACHE.hits, RsaEncryptor.PRIVATE_KEY_CACHE.misses
+    decryptors = [
+        EncryptionProvider.get_encryptor(EncryptionType.RSA_HYBRID, decryption=True,
+                                         credential_provider=credential_provider)
+        for _ in range(2)
+    ]
+    assert RsaEncryptor.PRIVATE_KEY_CACHE.hits == hits + 1 and RsaEncryptor.PRIVATE_KEY_CACHE.misses == misses + 1
+
+    data = os.urandom(100_000)
+    encrypted_data = encryptor.encrypt(data)
+    assert len(encrypted_data) == encryptor.encrypted_size(len(data))
+    assert all(decryptor.decrypt(encrypted_data) == data for decryptor in decryptors)
+
+
+def test_size_only_encryptors_match_encryptors(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    credential_provider = CallbackCredentialProvider(lambda prompt: "password")
+    for encryption_type in EncryptionType:
+        size_only_encryptor = EncryptionProvider.get_size_only_encryptor(encryption_type)
+        assert not any(tmp_path.iterdir()), "No keys may be created to calculate sizes"
+
+        encryptor = EncryptionProvider.get_encryptor(encryption_type, is_test=True,
+                                                     credential_provider=credential_provider)
+        assert size_only_encryptor.encryption_type == encryptor.encryption_type
+        assert size_only_encryptor.max_data_size == encryptor.max_data_size
+        for data_size in (0, 1, 100, 190):
+            assert size_only_encryptor.encrypted_size(data_size) == len(encryptor.encrypt(os.urandom(data_size)))
+
+
+def test_aead_encryption_in_frames():
+    credential_provider = CallbackCredentialProvider(lambda prompt: "password")
+    encryptor = EncryptionProvider.get_encryptor(EncryptionType.AEAD, credential_provider=credential_provider)
+
+    def get_decryptor():
+        return EncryptionProvider.get_encryptor(
+            EncryptionType.AEAD, decryption=True, salt=encryptor.salt, nonce=encryptor.nonce,
+            credential_provider=credential_provider)
+
+    frame_size = AeadEncryptor.FRAME_SIZE
+    for data_size in (0, 1, frame_size - 1, frame_size, frame_size + 1, 3 * frame_size + 100):
+        data = os.urandom(data_size)
+        encrypted_data = encryptor.encrypt(data)
+        assert len(encrypted_data) == encryptor.encrypted_size(data_size)
+        assert get_decryptor().decrypt(encrypted_data) == data
+
+        # Streaming with arbitrary chunk sizes in both directions
+        chunks = [data[start:start + 1000] for start in range(0, data_size, 1000)]
+        encrypted_data = b"".join(encryptor.encrypt_stream(chunks))
+        encrypted_chunks = [encrypted_data[start:start + 777] for start in range(0, len(encrypted_data), 777)]
+        assert b"".join(get_decryptor().decrypt_stream(encrypted_chunks)) == data
+
+
+def test_aead_encryption_uses_new_nonce_for_every_message():
+    encryptor = EncryptionProvider.get_encryptor(
+        EncryptionType.AEAD, credential_provider=CallbackCredentialProvider(lambda prompt: "password"))
+    data = bytes(100)
+
+    first_encrypted_data, first_nonce = encryptor.encrypt(data), encryptor.nonce
+    second_encrypted_data, second_nonce = encryptor.encrypt(data), encryptor.nonce
+    assert first_nonce[:AeadEncryptor.NONCE_PREFIX_LENGTH] != second_nonce[:AeadEncryptor.NONCE_PREFIX_LENGTH]
+    assert first_encrypted_data != second_encrypted_data
+
+
+def test_aead_encryption_detects_wrong_password_and_truncation():
+    encryptor = EncryptionProvider.get_encryptor(
+        EncryptionType.AEAD, credential_provider=CallbackCredentialProvider(lambda prompt: "password"))
+    encrypted_data = encryptor.encrypt(os.urandom(10 * AeadEncryptor.FRAME_SIZE))
+
+    wrong_decryptor = EncryptionProvider.get_encryptor(
+        EncryptionType.AEAD, decryption=True, salt=encryptor.salt, nonce=encryptor.nonce,
+        credential_provider=CallbackCredentialProvider(lambda prompt: "wrong password"))
+    frames = wrong_decryptor.decrypt_stream([encrypted_data])
+    with pytest.raises(ValueError, match="Frame 0"):
+        next(frames)
+
+    # Dropping the last frame is detected, as the frame before was not encrypted as the last one
+    encrypted_frame_size = AeadEncryptor.FRAME_SIZE + AeadEncryptor.TAG_LENGTH
+    with pytest.raises(ValueError, match="Frame 8"):
+        encryptor.decrypt(encrypted_data[:9 * encrypted_frame_size])
+
+
+def test_kdf_parameters_change_the_key():
+    salt = os.urandom(SaltedHash.SALT_LENGTH)
+    assert Pbkdf2Hash(salt=salt).kdf_parameters == KdfParameters(Pbkdf2Hash.HASH_ITERATIONS)
+
+    default_key = Pbkdf2Hash(salt=salt)._derive_key(b"password")
+    cheap_key = Pbkdf2Hash(salt=salt, kdf_parameters=KdfParameters(1000))._derive_key(b"password")
+    assert cheap_key != default_key
+    cheap_hash = Pbkdf2Hash(salt=salt, kdf_parameters=KdfParameters(1000))
+    assert cheap_key == cheap_hash._get_kdf_instance().derive(b"password")
+
+    scrypt_key = ScryptHash(salt=salt, kdf_parameters=KdfParameters(2 ** 10, 8, 1))._derive_key(b"password")
+    assert scrypt_key != ScryptHash(salt=salt)._derive_key(b"password")
+
+
+def test_kdf_parameters_are_limited():
+    salt = os.urandom(SaltedHash.SALT_LENGTH)
+    for hash_type, kdf_parameters in ((HashType.PBKDF2, KdfParameters(0)),
+                                      (HashType.SCRYPT, KdfParameters(3 * 2 ** 10, 8, 1)),
+                                      (HashType.SCRYPT, KdfParameters(2 ** 10, 0, 1))):
+        with pytest.raises(ValueError):
+            HashProvider.get_hash(hash_type, salt=salt, kdf_parameters=kdf_parameters, allow_expensive_kdf=True)
+
+    for hash_type, kdf_parameters in ((HashType.PBKDF2, KdfParameters(Pbkdf2Hash.MAX_ITERATIONS + 1)),
+                                      (HashType.SCRYPT, KdfParameters(2 ** 24, 8, 1)),
+                                      (HashType.SCRYPT, KdfParameters(2 ** 10, 8, ScryptHash.MAX_PARALLELIZATION + 1))):
+        with pytest.raises(ValueError, match="trusted"):
+            HashProvider.get_hash(hash_type, salt=salt, kdf_parameters=kdf_parameters)
+
+        # Nothing is derived when creating the hash, so allowing the parameters is cheap
+        hash_algo = HashProvider.get_hash(hash_type, salt=salt, kdf_parameters=kdf_parameters, allow_expensive_kdf=True)
+        assert hash_algo.kdf_parameters == kdf_parameters
+
+
+def test_kdf_calibration():
+    # A target time below the fastest derivation gives the minimum parameters
+    assert KdfCalibration.calibrate(HashType.PBKDF2, 0) == KdfParameters(KdfCalibration.PBKDF2_MIN_ITERATIONS)
+    scrypt_parameters = KdfCalibration.calibrate(HashType.SCRYPT, 0)
+    assert scrypt_parameters == KdfParameters(KdfCalibration.SCRYPT_MIN_COST, ScryptHash.BLOCK_SIZE, 1)
+
+    # A longer target time gives more expensive parameters
+    target_time = 4 * KdfCalibration.measure(HashType.PBKDF2, KdfParameters(KdfCalibration.PBKDF2_MIN_ITERATIONS))
+    assert KdfCalibration.calibrate(HashType.PBKDF2, target_time).work_factor > KdfCalibration.PBKDF2_MIN_ITERATIONS
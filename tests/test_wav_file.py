@@ -1,18 +1,27 @@
 import hashlib
 import random
 import string
+import struct
+import wave
 from pathlib import Path
 
+import numpy as np
 import pytest
 
+from error_correction.batch_reed_solomon_error_correction import BatchReedSolomonErrorCorrection
 from error_correction.hamming_error_correction import HammingErrorCorrection
 from error_correction.none_error_correction import NoneErrorCorrection
-from error_correction.reed_solomon_error_correction import ReedSolomonErrorCorrection
+from error_correction.reed_solomon_error_correction import ReedSolomonError, ReedSolomonErrorCorrection
+from security.credentials.callback_credential_provider import CallbackCredentialProvider
 from security.encryption_provider import EncryptionProvider
 from security.encryptors.none_encryptor import NoneEncryptor
 from security.encryptors.rsa_encryptor import RsaEncryptor
 from security.enums.encryption_type import EncryptionType
 from security.enums.hash_type import HashType
+from security.hashing.kdf_parameters import KdfParameters
+from wav_steganography.data_chunk import DataChunk
+from wav_steganography.message import Message
+from wav_steganography.verification_type import VerificationType
 from wav_steganography.wav_file import WAVFile
 
 audio_path = Path("audio")
@@ -113,9 +122,11 @@ def test_multiple_encoding_with_error_correction_and_encryption():
     aes_pbkdf2_encryptor = EncryptionProvider.get_encryptor(EncryptionType.AES, HashType.PBKDF2, is_test=True)
     aes_scrypt_encryptor = EncryptionProvider.get_encryptor(EncryptionType.AES, HashType.SCRYPT, is_test=True)
     rsa_encryptor = EncryptionProvider.get_encryptor(EncryptionType.RSA, is_test=True)
+    rsa_hybrid_encryptor = EncryptionProvider.get_encryptor(EncryptionType.RSA_HYBRID, is_test=True)
+    aead_encryptor = EncryptionProvider.get_encryptor(EncryptionType.AEAD, HashType.PBKDF2, is_test=True)
 
-    encryptors = [fernet_pbkdf2_encryptor, fernet_scrypt_encryptor,
-                  aes_pbkdf2_encryptor, aes_scrypt_encryptor, rsa_encryptor]
+    encryptors = [fernet_pbkdf2_encryptor, fernet_scrypt_encryptor, aes_pbkdf2_encryptor, aes_scrypt_encryptor,
+                  rsa_encryptor, rsa_hybrid_encryptor, aead_encryptor]
 
     for encryptor in encryptors:
 
@@ -169,3 +180,356 @@ def test_repeating_data():
         wav_file = WAVFile(audio_path / "voice_hello.wav")
         wav_file.encode(data, least_significant_bits=lsb, every_nth_byte=every_nth_byte, redundant_bits=redundant_bits,
                         repeat_data=True)
+
+
+def test_data_loaded_with_native_sample_width():
+    for audio_file in audio_path.glob("*.wav"):
+        file = WAVFile(audio_file)
+        assert file.data.dtype.itemsize == file.header["BitsPerSample"] // 8
+        assert file.get_channel_data(1).dtype == file.data.dtype
+        file.encode(b"native dtype", least_significant_bits=file.header["BitsPerSample"])
+        assert file.data.dtype.itemsize == file.header["BitsPerSample"] // 8
+
+
+def test_writing_wav_file_through_memory_map():
+    for audio_file in audio_path.glob("*.wav"):
+        file = WAVFile(audio_file)
+        written_path = audio_path / 'copied'
+        written_path.mkdir(exist_ok=True)
+        copied_file_path = written_path / f"mmap_{audio_file.name}"
+        file.write(copied_file_path, overwrite=True, mmap=True)
+        assert open(audio_file, 'rb').read() == open(copied_file_path, 'rb').read(), "Files mismatch!"
+
+
+def test_encoding_decoding_memory_mapped():
+    audio_file = audio_path / "voice_hello.wav"
+    data = get_random_string(1000).encode("UTF-8")
+    original_bytes = open(audio_file, 'rb').read()
+
+    copy_on_write_file = WAVFile(audio_file, mmap=True)
+    copy_on_write_file.encode(data)
+    assert open(audio_file, 'rb').read() == original_bytes, "Copy-on-write mapping changed the file!"
+
+    encoded_file_path = get_file_path(f"mmap_{audio_file.name}")
+    encoded_file_path.write_bytes(original_bytes)
+    writable_file = WAVFile(encoded_file_path, mmap=True, writable=True)
+    writable_file.encode(data)
+    writable_file.flush()
+    del writable_file
+
+    assert WAVFile(encoded_file_path, mmap=True).decode() == data
+    assert WAVFile(encoded_file_path).decode() == data
+
+
+def test_encoding_in_place():
+    audio_file = audio_path / "voice_hello.wav"
+    data = get_random_string(100).encode("UTF-8")
+    original_bytes = open(audio_file, 'rb').read()
+
+    for mmap, lazy in [(False, False), (True, False), (False, True)]:
+        encoded_file_path = get_file_path(f"in_place_{audio_file.name}")
+        encoded_file_path.write_bytes(original_bytes)
+
+        file = WAVFile(encoded_file_path, mmap=mmap, lazy=lazy)
+        file.encode(data, in_place=True)
+        # A lazily opened file is memory mapped instead of read entirely
+        assert isinstance(file.data, np.memmap) == (mmap or lazy)
+        del file
+
+        encoded_bytes = open(encoded_file_path, 'rb').read()
+        assert len(encoded_bytes) == len(original_bytes)
+        # Only the beginning of the samples is touched by such a short message
+        assert encoded_bytes[-len(original_bytes) // 2:] == original_bytes[-len(original_bytes) // 2:]
+        assert WAVFile(encoded_file_path).decode() == data
+
+
+def test_lazy_loading_and_capacity():
+    for audio_file in audio_path.glob("*.wav"):
+        file = WAVFile(audio_file, lazy=True)
+        assert file._data is None, "Data should only be loaded on first access!"
+        assert file.num_samples == len(WAVFile(audio_file).data)
+
+        configurations = [(1, 1), (2, 1), (3, 2), (16, 5)]
+        capacities = [file.capacity(lsb, every_nth_byte) for lsb, every_nth_byte in configurations]
+        assert file._data is None, "Capacity should not load the data!"
+
+        for (lsb, every_nth_byte), capacity in zip(configurations, capacities):
+            file.encode(b"a" * capacity, lsb, every_nth_byte)
+            with pytest.raises(ValueError):
+                file.encode(b"a" * (capacity + 1), lsb, every_nth_byte)
+
+
+def test_capacity_with_encryption_and_error_correction():
+    encryptors = [
+        NoneEncryptor(),
+        EncryptionProvider.get_encryptor(EncryptionType.FERNET, HashType.PBKDF2, is_test=True),
+        EncryptionProvider.get_encryptor(EncryptionType.AES, HashType.PBKDF2, is_test=True),
+    ]
+    error_corrections = [NoneErrorCorrection(), HammingErrorCorrection(), ReedSolomonErrorCorrection()]
+
+    file = WAVFile(audio_path / "sine_mono_110hz.wav")
+    for encryptor in encryptors:
+        for error_correction in error_corrections:
+            lsb, every_nth_byte, redundant_bits = random.randint(1, 4), random.randint(1, 3), random.randint(0, 50)
+            parameters = (lsb, every_nth_byte, redundant_bits, encryptor, error_correction)
+            capacity = file.capacity(*parameters)
+
+            file.encode(b"a" * capacity, *parameters)
+            with pytest.raises(ValueError):
+                file.encode(b"a" * (capacity + 1), *parameters)
+
+
+def test_splitting_and_joining_bit_groups():
+    for group_size in range(1, 33):
+        for data_length in [0, 1, 3, 7, 40]:
+            data = bytes(random.randrange(256) for _ in range(data_length))
+            bits = ''.join(f"{b:08b}" for b in data)
+            expected = [int(bits[i:i + group_size], 2) for i in range(0, len(bits), group_size)]
+            groups = WAVFile._split_into_bit_groups(data, group_size, np.dtype(">u4"))
+            assert groups.tolist() == expected
+
+            # Bits above the group size must be ignored when joining
+            groups |= np.uint32(1 << group_size) if group_size < 32 else 0
+            assert WAVFile._join_bit_groups(groups, len(bits), group_size) == data
+
+
+def test_encoding_with_verification_types():
+    data = get_random_string(1000).encode("UTF-8")
+    for verification_type in VerificationType:
+        file = WAVFile(audio_path / "voice_hello.wav")
+        file.encode(data, redundant_bits=8, verify=verification_type)
+        assert file.decode() == data
+
+
+def test_checksum_verification_reads_all_copies():
+    data = get_random_string(100).encode("UTF-8")
+    file = WAVFile(audio_path / "voice_hello.wav")
+    file.encode(data, least_significant_bits=3, redundant_bits=8, repeat_data=True, verify=VerificationType.CHECKSUM)
+
+    to_byte, header_bytes, header = file._get_header(ReedSolomonErrorCorrection())
+    header_chunk = DataChunk(header_bytes, Message.HEADER_LSB_COUNT, Message.HEADER_EVERY_NTH_BYTE)
+    data_chunk = DataChunk(file._get_data_bytes(to_byte, header), 3, 1, header.copy_count)
+
+    # Only the last copy is written wrongly
+    file.data = file.data.copy()
+    file.data[to_byte + data_chunk.amplitudes_required - 1] ^= 0b111
+    with pytest.raises(AssertionError, match="Checksum"):
+        file._verify_encoding(VerificationType.CHECKSUM, header_chunk, data_chunk, data, NoneEncryptor(),
+                              ReedSolomonErrorCorrection())
+
+
+def test_repeating_data_writes_copies_of_encoded_data():
+    data = get_random_string(100).encode("UTF-8")
+    file = WAVFile(audio_path / "voice_hello.wav")
+    file.encode(data, least_significant_bits=3, redundant_bits=8, repeat_data=True)
+
+    header_bytes, data_bytes = file._get_message(ReedSolomonErrorCorrection())
+    header = Message.decode_header(header_bytes)
+    copy_bits = header.data_size * 8
+    assert header.copy_count == (file.num_samples - len(header_bytes) * 8) * 3 // copy_bits
+
+    # Every copy can be read on its own, the decoded message is only a single copy
+    _, all_copies = file._get_bytes(len(header_bytes) * 8, copy_bits * header.copy_count, 3, 1)
+    assert all_copies == data_bytes * header.copy_count
+    assert file.decode() == data
+
+
+def test_majority_vote_over_repeated_data():
+    data = get_random_string(100).encode("UTF-8")
+    file = WAVFile(audio_path / "voice_hello.wav")
+    file.encode(data, least_significant_bits=1, repeat_data=True, error_correction=NoneErrorCorrection())
+
+    # Flip the least significant bit of 5% of the amplitudes after the header
+    header_amplitudes = Message.header_byte_size(NoneErrorCorrection()) * 8
+    flipped_amplitudes = np.random.default_rng(0).choice(
+        np.arange(header_amplitudes, file.num_samples), size=file.num_samples // 20, replace=False)
+    file.data = file.data.copy()
+    file.data[flipped_amplitudes] ^= 1
+
+    assert file.decode(error_correction=NoneErrorCorrection()) != data
+    assert file.decode(error_correction=NoneErrorCorrection(), majority_vote=True) == data
+
+
+def test_encoding_decoding_with_hamming_codes():
+    file = WAVFile(audio_path / "sine_mono_110hz.wav")
+    data = get_random_string(500).encode("UTF-8")
+    for redundant_bits in [0, 1, 4, 8]:
+        file.encode(data, redundant_bits=redundant_bits, error_correction=HammingErrorCorrection())
+        assert file.decode(error_correction=HammingErrorCorrection()) == data
+
+
+def test_encoding_with_batch_reed_solomon_decoding_with_reed_solomon():
+    file = WAVFile(audio_path / "sine_mono_110hz.wav")
+    data = get_random_string(300).encode("UTF-8")
+    file.encode(data, redundant_bits=16, error_correction=BatchReedSolomonErrorCorrection())
+    assert file.decode(error_correction=ReedSolomonErrorCorrection()) == data
+
+
+def test_interleaving_spreads_burst_errors():
+    data = get_random_string(1270).encode("UTF-8")
+    header_amplitudes = Message.header_byte_size(ReedSolomonErrorCorrection()) * 8
+    for interleave_depth in [1, 255]:
+        file = WAVFile(audio_path / "sine_mono_110hz.wav")
+        file.encode(data, redundant_bits=8, interleave_depth=interleave_depth)
+
+        # Flip both least significant bits of 4 * 200 consecutive amplitudes, i.e. of 200 consecutive bytes
+        file.data = file.data.copy()
+        file.data[header_amplitudes + 4 * 1000:header_amplitudes + 4 * 1200] ^= 0b11
+
+        if interleave_depth == 1:
+            with pytest.raises(ReedSolomonError):
+                file.decode()
+        else:
+            assert file.decode() == data
+
+
+def test_clipped_amplitudes_are_decoded_as_erasures():
+    data = get_random_string(1000).encode("UTF-8")
+    file = WAVFile(audio_path / "sine_mono_110hz.wav")
+    file.encode(data, redundant_bits=8)
+
+    # Clip the amplitudes of 100 bytes of the first codeword, too many errors but not too many erasures to correct
+    header_amplitudes = Message.header_byte_size(ReedSolomonErrorCorrection()) * 8
+    file.data = file.data.copy()
+    file.data[header_amplitudes + 4 * 20:header_amplitudes + 4 * 120] = np.iinfo(file.data.dtype).max
+
+    assert file._get_erasures(file._get_message(ReedSolomonErrorCorrection())[0], ReedSolomonErrorCorrection()) \
+        == list(range(20, 120))
+    with pytest.raises(ReedSolomonError):
+        file.decode(use_erasures=False)
+    assert file.decode() == data
+
+
+def test_clipped_amplitudes_of_8_bit_file_are_decoded_as_erasures(tmp_path):
+    # 8 bit samples are unsigned, silence (128) is the minimum of the signed view, but not clipped
+    with wave.open(str(tmp_path / "silence.wav"), "wb") as silence:
+        silence.setnchannels(1)
+        silence.setsampwidth(1)
+        silence.setframerate(8000)
+        silence.writeframes(bytes([128]) * 50_000)
+    data = get_random_string(1000).encode("UTF-8")
+    file = WAVFile(tmp_path / "silence.wav")
+    file.encode(data, redundant_bits=8)
+    header_bytes = file._get_message(ReedSolomonErrorCorrection())[0]
+    assert file._get_erasures(header_bytes, ReedSolomonErrorCorrection()) == []
+
+    header_amplitudes = Message.header_byte_size(ReedSolomonErrorCorrection()) * 8
+    file.data = file.data.copy()
+    file._get_unsigned_data()[header_amplitudes + 4 * 20:header_amplitudes + 4 * 70] = 255
+    file._get_unsigned_data()[header_amplitudes + 4 * 70:header_amplitudes + 4 * 120] = 0
+    assert file._get_erasures(header_bytes, ReedSolomonErrorCorrection()) == list(range(20, 120))
+    with pytest.raises(ReedSolomonError):
+        file.decode(use_erasures=False)
+    assert file.decode() == data
+
+
+def test_encoding_decoding_with_larger_reed_solomon_symbols():
+    file = WAVFile(audio_path / "sine_mono_110hz.wav")
+    data = get_random_string(500).encode("UTF-8")
+    capacity = file.capacity(redundant_bits=8, symbol_bits=12)
+    assert capacity > file.capacity(redundant_bits=8)
+
+    file.encode(data, redundant_bits=8, symbol_bits=12)
+    header_bytes, _ = file._get_message(ReedSolomonErrorCorrection())
+    assert Message.decode_header(header_bytes).symbol_bits == 12
+    assert file.decode() == data
+
+
+def test_decoding_encrypted_data_with_credential_provider():
+    credential_provider = CallbackCredentialProvider(lambda prompt: "password")
+    data = get_random_string(1000).encode("UTF-8")
+
+    for encryption_type in (EncryptionType.FERNET, EncryptionType.AES, EncryptionType.AEAD):
+        file = WAVFile(audio_path / "voice_hello.wav")
+        encryptor = EncryptionProvider.get_encryptor(
+            encryption_type, HashType.SCRYPT, credential_provider=credential_provider)
+        file.encode(data, encryptor=encryptor)
+
+        # The encryptor is created from the header, only the password comes from the provider
+        assert file.decode(credential_provider=credential_provider) == data
+
+
+def test_kdf_parameters_are_read_from_header():
+    credential_provider = CallbackCredentialProvider(lambda prompt: "password")
+    data = get_random_string(1000).encode("UTF-8")
+
+    for hash_type, kdf_parameters in ((HashType.PBKDF2, KdfParameters(12_000)),
+                                      (HashType.SCRYPT, KdfParameters(2 ** 11, 4, 2))):
+        file = WAVFile(audio_path / "voice_hello.wav")
+        encryptor = EncryptionProvider.get_encryptor(
+            EncryptionType.AEAD, hash_type, credential_provider=credential_provider, kdf_parameters=kdf_parameters)
+        file.encode(data, encryptor=encryptor)
+
+        header_bytes, _ = file._get_message(ReedSolomonErrorCorrection(), False)
+        header = Message.decode_header(header_bytes)
+        assert (header.kdf_work_factor, header.kdf_block_size, header.kdf_parallelization) == kdf_parameters
+
+        assert file.decode(credential_provider=credential_provider) == data
+
+
+def test_decoding_legacy_headers(capsys):
+    data = get_random_string(100).encode("UTF-8")
+    hamming_redundant_bits = Message.LEGACY_HAMMING_REDUNDANT_BITS
+    for error_correction, redundant_bits, data_redundant_bits, header_redundant_bits in (
+            (ReedSolomonErrorCorrection(), 8, 8, Message.HEADER_REDUNDANT_BITS),
+            (HammingErrorCorrection(), 8, hamming_redundant_bits, hamming_redundant_bits)):
+        file = WAVFile(audio_path / "voice_hello.wav")
+
+        # Written like versions before the header version was added, the data directly follows the header
+        encoded_data = error_correction.encode(data, data_redundant_bits)
+        header_data = struct.pack(Message.LEGACY_HEADER_FORMAT, 2, 1, redundant_bits, EncryptionType.NONE.value,
+                                  HashType.PBKDF2.value, b"0" * 16, b"0" * 16, len(encoded_data))
+        header_data = error_correction.encode(header_data, header_redundant_bits)
+        assert len(header_data) == Message.legacy_header_byte_size(error_correction)
+        file._write_chunks([DataChunk(header_data, 1, 1), DataChunk(encoded_data, 2, 1)])
+
+        assert file.decode(error_correction=error_correction) == data
+        # Probing the current header on the legacy header reports no (nonexistent) errors
+        assert "detected" not in capsys.readouterr().out
+
+
+def test_decoding_file_without_message_raises_error(capsys):
+    file = WAVFile(audio_path / "voice_hello.wav")
+    for error_correction in (ReedSolomonErrorCorrection(), HammingErrorCorrection()):
+        with pytest.raises(ValueError, match="message header"):
+            file.decode(error_correction=error_correction)
+    assert capsys.readouterr().out == ""
+
+
+def test_decoding_falls_through_to_next_copy():
+    # With lsb=3, the copies of 101 bytes (with error correction) do not start at an amplitude
+    data = get_random_string(101).encode("UTF-8")
+    file = WAVFile(audio_path / "voice_hello.wav")
+    file.encode(data, least_significant_bits=3, redundant_bits=8, repeat_data=True)
+
+    to_byte, header_bytes, header = file._get_header(ReedSolomonErrorCorrection())
+    first_copy = file._get_data_bytes(to_byte, header)
+    for copy_index in (1, 2, header.copy_count - 1):
+        assert file._get_data_bytes(to_byte, header, copy_index=copy_index) == first_copy
+
+    # Flip all bits of the first two copies, the third one is decoded instead
+    file.data = file.data.copy()
+    file.data[to_byte:to_byte + header.data_size * 8 * 2 // 3] ^= 0b111
+    with pytest.raises(ReedSolomonError):
+        Message.decode_message(header_bytes, file._get_data_bytes(to_byte, header, copy_index=1))
+    assert file.decode() == data
+
+
+def test_decoding_does_not_retry_copies_with_wrong_password(monkeypatch):
+    data = get_random_string(101).encode("UTF-8")
+    file = WAVFile(audio_path / "voice_hello.wav")
+    encryptor = EncryptionProvider.get_encryptor(
+        EncryptionType.AEAD, HashType.SCRYPT, credential_provider=CallbackCredentialProvider(lambda prompt: "password"))
+    file.encode(data, encryptor=encryptor, redundant_bits=8, repeat_data=True)
+
+    decoded_copies = []
+    decode_message = Message.decode_message
+
+    def counting_decode_message(*args, **kwargs):
+        decoded_copies.append(args)
+        return decode_message(*args, **kwargs)
+
+    monkeypatch.setattr(Message, "decode_message", counting_decode_message)
+    with pytest.raises(ValueError):
+        file.decode(credential_provider=CallbackCredentialProvider(lambda prompt: "wrong password"))
+    assert len(decoded_copies) == 1
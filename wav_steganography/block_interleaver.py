@@ -0,0 +1,46 @@
+import math
+from typing import List
+
+import numpy as np
+
+
+class BlockInterleaver:
+    """Spreads consecutive bytes over the data, so that a burst of errors does not hit a single codeword
+
+    The bytes are written row by row into a matrix with depth columns and read back column by column
+    (without padding, an incomplete last row is skipped in the columns it does not reach).
+    Two bytes which were next to each other are then about len(data) / depth bytes apart.
+    With depth set to the codeword size of the error correction (e.g. 255 for reed solomon), a burst of up to
+    len(data) / depth bytes hits every codeword at most once.
+    A depth of 0 or 1 leaves the data unchanged.
+    """
+
+    @staticmethod
+    def interleave(data: bytes, depth: int) -> bytes:
+        if depth <= 1:
+            return data
+
+        return np.frombuffer(data, dtype=np.uint8)[BlockInterleaver.__permutation(len(data), depth)].tobytes()
+
+    @staticmethod
+    def deinterleave(data: bytes, depth: int) -> bytes:
+        if depth <= 1:
+            return data
+
+        deinterleaved = np.empty(len(data), dtype=np.uint8)
+        deinterleaved[BlockInterleaver.__permutation(len(data), depth)] = np.frombuffer(data, dtype=np.uint8)
+        return deinterleaved.tobytes()
+
+    @staticmethod
+    def deinterleave_positions(positions: List[int], size: int, depth: int) -> List[int]:
+        """Returns the positions in the deinterleaved data of the given positions in the interleaved data"""
+        if depth <= 1:
+            return positions
+
+        return BlockInterleaver.__permutation(size, depth)[positions].tolist()
+
+    @staticmethod
+    def __permutation(size: int, depth: int) -> np.ndarray:
+        """Returns for each position in the interleaved data, the position in the original data"""
+        indices = np.arange(math.ceil(size / depth) * depth).reshape(-1, depth).T.ravel()
+        return indices[indices < size]
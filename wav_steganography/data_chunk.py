@@ -1,3 +1,4 @@
+import math
 from dataclasses import dataclass
 
 
@@ -6,8 +7,16 @@ class DataChunk:
     data: bytes
     least_significant_bits: int
     every_nth_byte: int
+    copy_count: int = 1  # number of times data is written one after another
 
     @property
     def amplitudes_required(self):
-        """e.g. saving b'AB' requires 16 bits, with lsb=2 this means it can be encoded within 8 amplitudes"""
-        return len(self.data) * 8 * self.every_nth_byte // self.least_significant_bits
\ No newline at end of file
+        """e.g. saving b'AB' requires 16 bits, with lsb=2 this means it can be encoded within 8 amplitudes
+        A partially used last amplitude (e.g. 16 bits with lsb=3) still counts as an entire amplitude.
+        """
+        return math.ceil(len(self.data) * self.copy_count * 8 / self.least_significant_bits) * self.every_nth_byte
+
+    @staticmethod
+    def max_bytes(amplitudes: int, least_significant_bits: int, every_nth_byte: int) -> int:
+        """The inverse of amplitudes_required, the number of bytes which can be saved within the given amplitudes"""
+        return amplitudes // every_nth_byte * least_significant_bits // 8
@@ -1,42 +1,124 @@
 import struct
-from typing import Union, Optional, Tuple
+from functools import lru_cache
+from typing import Union, Optional, Tuple, List
 
 
+from error_correction.error_correction_provider import ErrorCorrectionProvider
+from error_correction.error_correction_type import ErrorCorrectionType
 from error_correction.generic_error_correction import GenericErrorCorrection
 from error_correction.reed_solomon_error_correction import ReedSolomonErrorCorrection
+from security.credentials.generic_credential_provider import GenericCredentialProvider
 from security.encryption_provider import EncryptionProvider
 from security.encryptors.aes_encryptor import AesEncryptor
 from security.encryptors.generic_encryptor import GenericEncryptor
 from security.encryptors.none_encryptor import NoneEncryptor
 from security.enums.encryption_type import EncryptionType
 from security.enums.hash_type import HashType
+from security.hashing.kdf_parameters import KdfParameters
 from security.hashing.salted_hash import SaltedHash
+from wav_steganography.block_interleaver import BlockInterleaver
 from wav_steganography.data_chunk import DataChunk
+from wav_steganography.message_header import MessageHeader
 
 
 class Message:
     """ A message class implementing an Encoder and an Decoder
     This header is used to encode the meta information for the message before the actual data part.
-    Currently, this consists of 8 values:
+    It starts with HEADER_MAGIC and the header version, followed by 14 values:
         * The least significant bits used in the data
         * The nth bits used in the data
         * The number of redundant bits per byte used in the data (4 means a byte becomes 12 bits in size)
-        * The encryption type (0 to 3, as defined in EncryptionType)
+        * The encryption type (0 to 5, as defined in EncryptionType)
         * The hash type (0 to 2, as defined in HashType)
         * The password hash salt (hardcoded as 16 bytes, only used if encryption is used)
-        * The nonce (hardcoded as 16 bytes, only used if encryption is AES)
-        * The length of the data in bytes (excluding the header)
+        * The nonce (hardcoded as 16 bytes, only used if encryption is AES or AEAD)
+        * The length of the data in bytes (excluding the header), for repeated data the length of a single copy
+        * The number of copies of the data written one after another (1 if the data is not repeated)
+        * The depth of the block interleaver applied after the error correction (0 or 1 if not interleaved)
+        * The size of the error correction symbols in bits (8 unless reed solomon over a larger field is used)
+        * The cost parameters of the password hash (work factor, block size and parallelization, see KdfParameters),
+          all 0 if no salted hash is used
     For the header, the values are defined below.
+
+    Headers written before the header version was added (LEGACY_HEADER_FORMAT) only consist of the first 8 values,
+    they are still decoded, the remaining values are then set to what these versions always used.
     """
-    HEADER_FORMAT = f"<BHHBB{SaltedHash.SALT_LENGTH}s{AesEncryptor.NONCE_LENGTH}sI"
+    HEADER_MAGIC = b"SW"
+    HEADER_VERSION = 1
+    HEADER_FORMAT = f"<2sBBHHBB{SaltedHash.SALT_LENGTH}s{AesEncryptor.NONCE_LENGTH}sIIHBIBB"
     HEADER_LSB_COUNT = 1
     HEADER_EVERY_NTH_BYTE = 1
     HEADER_REDUNDANT_BITS = 8
 
+    LEGACY_HEADER_FORMAT = f"<BHHBB{SaltedHash.SALT_LENGTH}s{AesEncryptor.NONCE_LENGTH}sI"
+    # Legacy versions always used Hamming(12,8), which is chosen by 0 redundant bits now
+    LEGACY_HAMMING_REDUNDANT_BITS = 0
+
+    @staticmethod
+    def header_byte_size(error_correction: GenericErrorCorrection) -> int:
+        return Message.__header_byte_size(error_correction.error_correction_type, legacy=False)
+
     @staticmethod
-    def header_byte_size(error_correction) -> int:
-        return len(error_correction.encode(b'a' * struct.calcsize(Message.HEADER_FORMAT),
-                                                     Message.HEADER_REDUNDANT_BITS))
+    def legacy_header_byte_size(error_correction: GenericErrorCorrection) -> int:
+        return Message.__header_byte_size(error_correction.error_correction_type, legacy=True)
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def __header_byte_size(error_correction_type: ErrorCorrectionType, legacy: bool) -> int:
+        """The encoded header size only depends on the error correction, so it is calculated once for each type"""
+        error_correction = ErrorCorrectionProvider.get_error_correction(error_correction_type)
+        if legacy:
+            return error_correction.encoded_size(
+                struct.calcsize(Message.LEGACY_HEADER_FORMAT),
+                Message.__legacy_redundant_bits(error_correction, Message.HEADER_REDUNDANT_BITS),
+            )
+        return error_correction.encoded_size(struct.calcsize(Message.HEADER_FORMAT), Message.HEADER_REDUNDANT_BITS)
+
+    @staticmethod
+    def __legacy_redundant_bits(error_correction: GenericErrorCorrection, redundant_bits: int) -> int:
+        """The redundant bits choosing the code legacy versions used for the given redundant bits"""
+        if error_correction.error_correction_type == ErrorCorrectionType.HAMMING:
+            return Message.LEGACY_HAMMING_REDUNDANT_BITS
+        return redundant_bits
+
+    @staticmethod
+    def encoded_data_size(
+            data_size: int,
+            redundant_bits: int,
+            encryptor: GenericEncryptor = NoneEncryptor(),
+            error_correction: GenericErrorCorrection = ReedSolomonErrorCorrection(),
+            symbol_bits: int = 8,
+    ) -> int:
+        """ Returns the size in bytes of data_size bytes after encryption and error correction (of a single copy) """
+        return error_correction.encoded_size(encryptor.encrypted_size(data_size), redundant_bits, symbol_bits)
+
+    @staticmethod
+    def max_data_size(
+            available_bytes: int,
+            redundant_bits: int,
+            encryptor: GenericEncryptor = NoneEncryptor(),
+            error_correction: GenericErrorCorrection = ReedSolomonErrorCorrection(),
+            symbol_bits: int = 8,
+    ) -> int:
+        """ Returns the largest data size in bytes, which fits into available_bytes after encryption and error
+        correction. Only the sizes are calculated, nothing is encrypted or encoded. The overhead of all encryptors
+        and error corrections never decreases with larger data, therefore a binary search over the exact sizes is used.
+        """
+        def encoded_size(data_size: int) -> int:
+            return Message.encoded_data_size(data_size, redundant_bits, encryptor, error_correction, symbol_bits)
+
+        lower, upper = 0, available_bytes
+        if encryptor.max_data_size is not None:
+            upper = min(upper, encryptor.max_data_size)
+
+        while lower < upper:
+            middle = (lower + upper + 1) // 2
+            if encoded_size(middle) <= available_bytes:
+                lower = middle
+            else:
+                upper = middle - 1
+
+        return lower
 
     @staticmethod
     def encode_message(
@@ -45,23 +127,40 @@ class Message:
             every_nth_byte: int,
             redundant_bits: int,
             encryptor: GenericEncryptor = NoneEncryptor(),
-            error_correction: GenericErrorCorrection = ReedSolomonErrorCorrection()
+            error_correction: GenericErrorCorrection = ReedSolomonErrorCorrection(),
+            fill_bytes: Optional[int] = None,
+            interleave_depth: int = 1,
+            symbol_bits: int = 8,
     ) -> Tuple[DataChunk, DataChunk]:
+        """ Encrypt and error correct data, returns the header and data chunks to be written
+        If fill_bytes is given, the data chunk will contain as many copies of the encoded data as fit into fill_bytes.
+        The data is only encrypted and error corrected once, the copies are only created when writing the chunk.
+        If interleave_depth is larger than 1, the error corrected data is interleaved (see BlockInterleaver).
+        symbol_bits is the symbol size of the error correction, the header itself always uses 8 bit symbols.
+        """
 
         data: bytes = Message.__message_as_bytes(data)
 
         # Encrypt first, then add error correction in this order
         data = encryptor.encrypt(data)
-        data = error_correction.encode(data, redundant_bits)
+        data = error_correction.encode(data, redundant_bits, symbol_bits)
+        data = BlockInterleaver.interleave(data, interleave_depth)
+
+        copy_count = 1
+        if fill_bytes is not None and len(data) > 0:
+            copy_count = max(1, fill_bytes // len(data))
 
         # Get salt/nonce values if the given encryptor has these values, otherwise use all 0 default salt/nonce
         salt = getattr(encryptor, "salt", b"0" * SaltedHash.SALT_LENGTH)
         nonce = getattr(encryptor, "nonce", b"0" * AesEncryptor.NONCE_LENGTH)
         hash_type = getattr(encryptor, "hash_type", HashType.PBKDF2)
+        kdf_parameters = getattr(encryptor, "kdf_parameters", None) or KdfParameters(0)
 
         # Pack header data according to structure described in message
         header_data = struct.pack(
             Message.HEADER_FORMAT,
+            Message.HEADER_MAGIC,
+            Message.HEADER_VERSION,
             least_significant_bits,
             every_nth_byte,
             redundant_bits,
@@ -70,17 +169,93 @@ class Message:
             salt,
             nonce,
             len(data),
+            copy_count,
+            interleave_depth,
+            symbol_bits,
+            *kdf_parameters,
         )
 
         header_data = error_correction.encode(header_data, Message.HEADER_REDUNDANT_BITS)
         header_chunk = DataChunk(header_data, Message.HEADER_LSB_COUNT, Message.HEADER_EVERY_NTH_BYTE)
-        data_chunk = DataChunk(data, least_significant_bits, every_nth_byte)
+        data_chunk = DataChunk(data, least_significant_bits, every_nth_byte, copy_count)
         return header_chunk, data_chunk
 
     @staticmethod
-    def decode_header(header_bytes, error_correction: GenericErrorCorrection = ReedSolomonErrorCorrection()):
+    def decode_header(
+            header_bytes,
+            error_correction: GenericErrorCorrection = ReedSolomonErrorCorrection(),
+    ) -> MessageHeader:
+        """ Decode a header of header_byte_size or legacy_header_byte_size bytes
+        Raises a ValueError if the bytes are not a header (of a supported version) """
+        if len(header_bytes) == Message.legacy_header_byte_size(error_correction):
+            return Message.__decode_legacy_header(header_bytes, error_correction)
+
         header_bytes = error_correction.decode(header_bytes, Message.HEADER_REDUNDANT_BITS)
-        return struct.unpack(Message.HEADER_FORMAT, header_bytes)
+        magic, version, *values = struct.unpack(Message.HEADER_FORMAT, header_bytes)
+        if magic != Message.HEADER_MAGIC:
+            raise ValueError('No message header found, the file contains no message or another error correction '
+                             'was used')
+        if version != Message.HEADER_VERSION:
+            raise ValueError(f'Unsupported header version {version}, only version {Message.HEADER_VERSION} and '
+                             f'legacy headers can be decoded')
+
+        return MessageHeader(*values)
+
+    @staticmethod
+    def __decode_legacy_header(header_bytes, error_correction: GenericErrorCorrection) -> MessageHeader:
+        """ Legacy headers have no magic, so their values are checked to tell them apart from random bytes """
+        header_bytes = error_correction.decode(
+            header_bytes, Message.__legacy_redundant_bits(error_correction, Message.HEADER_REDUNDANT_BITS))
+        (least_significant_bits, every_nth_byte, redundant_bits, encryption_type, hash_type, salt, nonce,
+         data_size) = struct.unpack(Message.LEGACY_HEADER_FORMAT, header_bytes)
+
+        if not (1 <= least_significant_bits <= 32 and every_nth_byte >= 1 and data_size > 0
+                and encryption_type in {encryption.value for encryption in EncryptionType}
+                and hash_type in {hash_algo.value for hash_algo in HashType}):
+            raise ValueError('No message header found, the file contains no message or another error correction '
+                             'was used')
+
+        # Legacy versions repeated the data before encryption, never interleaved and only used 8 bit symbols
+        return MessageHeader(
+            least_significant_bits,
+            every_nth_byte,
+            Message.__legacy_redundant_bits(error_correction, redundant_bits),
+            encryption_type,
+            hash_type,
+            salt,
+            nonce,
+            data_size,
+            copy_count=1,
+            interleave_depth=1,
+            symbol_bits=8,
+            kdf_work_factor=0,
+            kdf_block_size=0,
+            kdf_parallelization=0,
+        )
+
+    @staticmethod
+    def get_decryptor(
+            header: MessageHeader,
+            credential_provider: Optional[GenericCredentialProvider] = None,
+            allow_expensive_kdf: bool = False,
+    ) -> GenericEncryptor:
+        """ Create the encryptor to decrypt the message of the given header, passwords are asked from the
+        credential provider. Key derivation parameters above the limits of the hash raise a ValueError, unless
+        allow_expensive_kdf is set """
+        kdf_parameters = None
+        if header.kdf_work_factor:
+            kdf_parameters = KdfParameters(header.kdf_work_factor, header.kdf_block_size, header.kdf_parallelization)
+
+        return EncryptionProvider.get_encryptor(
+            EncryptionType(header.encryption_type),
+            HashType(header.hash_type),
+            decryption=True,
+            salt=header.salt,
+            nonce=header.nonce,
+            credential_provider=credential_provider,
+            kdf_parameters=kdf_parameters,
+            allow_expensive_kdf=allow_expensive_kdf,
+        )
 
     @staticmethod
     def decode_message(
@@ -88,20 +263,20 @@ class Message:
             data_bytes: bytes,
             encryptor: Optional[GenericEncryptor] = None,
             error_correction: GenericErrorCorrection = ReedSolomonErrorCorrection(),
+            erasures: Optional[List[int]] = None,
+            credential_provider: Optional[GenericCredentialProvider] = None,
     ):
-        *_, redundant_bits, encryption_type, hash_type, salt, nonce, data_size = \
-            Message.decode_header(header_bytes, error_correction)
+        """ Decode the data, erasures are the positions of bytes in data_bytes which are likely wrong (if any)
+        If no encryptor is given, it is created from the header and asks the credential provider for passwords """
+        header = Message.decode_header(header_bytes, error_correction)
 
         if encryptor is None:
-            encryptor = EncryptionProvider.get_encryptor(
-                EncryptionType(encryption_type),
-                HashType(hash_type),
-                decryption=True,
-                salt=salt,
-                nonce=nonce,
-            )
+            encryptor = Message.get_decryptor(header, credential_provider)
 
-        data = error_correction.decode(data_bytes, redundant_bits)
+        data = BlockInterleaver.deinterleave(data_bytes, header.interleave_depth)
+        if erasures:
+            erasures = BlockInterleaver.deinterleave_positions(erasures, len(data_bytes), header.interleave_depth)
+        data = error_correction.decode(data, header.redundant_bits, erasures, header.symbol_bits)
         data = encryptor.decrypt(data)
 
         return data
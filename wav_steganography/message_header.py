@@ -0,0 +1,19 @@
+from typing import NamedTuple
+
+
+class MessageHeader(NamedTuple):
+    """The decoded values of a message header, in the order of Message.HEADER_FORMAT (after the magic and version)"""
+    least_significant_bits: int
+    every_nth_byte: int
+    redundant_bits: int
+    encryption_type: int
+    hash_type: int
+    salt: bytes
+    nonce: bytes
+    data_size: int
+    copy_count: int
+    interleave_depth: int
+    symbol_bits: int
+    kdf_work_factor: int
+    kdf_block_size: int
+    kdf_parallelization: int
@@ -0,0 +1,9 @@
+from enum import Enum
+
+
+class VerificationType(Enum):
+
+    NONE = 0
+    HEADER = 1
+    CHECKSUM = 2
+    FULL = 3
@@ -1,4 +1,6 @@
-import textwrap
+import contextlib
+import hashlib
+import io
 from collections import OrderedDict
 from pathlib import Path
 import struct
@@ -9,11 +11,14 @@ import numpy as np
 import pandas as pd
 
 from error_correction.generic_error_correction import GenericErrorCorrection
-from error_correction.reed_solomon_error_correction import ReedSolomonErrorCorrection
+from error_correction.reed_solomon_error_correction import ReedSolomonError, ReedSolomonErrorCorrection
+from security.credentials.generic_credential_provider import GenericCredentialProvider
 from security.encryptors.generic_encryptor import GenericEncryptor
 from security.encryptors.none_encryptor import NoneEncryptor
 from wav_steganography.data_chunk import DataChunk
 from wav_steganography.message import Message
+from wav_steganography.message_header import MessageHeader
+from wav_steganography.verification_type import VerificationType
 
 
 class WAVFile:
@@ -29,6 +34,9 @@ class WAVFile:
     * `[allowed_values]` is a list of allowed values for this entry, if None, no check is made
     """
 
+    # Copies of repeated data which are tried at most by decode, as each one is error corrected entirely
+    MAX_DECODE_COPIES = 16
+
     _wav_header_specification: List[Tuple[str, str, int, Optional[List]]] = [
         # === RIFF Chunk ===
         ("ChunkID", '>4s', 4, [b"RIFF", b"RIFX"]),
@@ -50,9 +58,18 @@ class WAVFile:
         ("Subchunk2Size", '<i', 4, None),
     ]
 
-    def __init__(self, filename: Union[Path, str]):
-        """ Parse WAV file given a path to audio file """
+    def __init__(self, filename: Union[Path, str], *, mmap: bool = False, writable: bool = False, lazy: bool = False):
+        """ Parse WAV file given a path to audio file
+        If mmap is set, the data is not read into memory, instead it is a np.memmap over the data subchunk, so only
+        the samples which are actually accessed are read from disk. By default changes to the memory mapped data are
+        kept in memory only (copy-on-write), if writable is set they are written back to the file (see flush).
+        If lazy is set, only the header is parsed, the data is loaded on first access of WAVFile.data.
+        """
         self._created_from_filename = filename
+        self._mmap = mmap
+        self._writable = writable
+        # Range of samples [from, to) changed by encoding, used to only write back what was modified
+        self._modified_range: Optional[Tuple[int, int]] = None
         self.header = h = OrderedDict()
         with open(filename, 'rb') as wav_file:
 
@@ -72,8 +89,63 @@ class WAVFile:
             assert h["BlockAlign"] == h['NumChannels'] * h['BitsPerSample'] // 8
             assert h["ByteRate"] == h['SampleRate'] * h['NumChannels'] * h['BitsPerSample'] // 8
 
-            # Parse the actual data
-            self.data = np.array(struct.unpack(self._get_data_format(), wav_file.read(h['Subchunk2Size'])))
+            # Remember where the samples start, to be able to load, map or patch them later on
+            self._data_offset = wav_file.tell()
+
+        self._data: Optional[np.ndarray] = None if lazy else self._load_data()
+
+    @property
+    def data(self) -> np.ndarray:
+        """ The samples of all channels interleaved, loaded on first access if the file was opened lazily """
+        if self._data is None:
+            self._data = self._load_data()
+        return self._data
+
+    @data.setter
+    def data(self, data: np.ndarray):
+        self._data = data
+
+    def _load_data(self) -> np.ndarray:
+        """ Returns the samples of the data subchunk, either read into memory or memory mapped """
+        data_size = self.header['Subchunk2Size']
+        if self._mmap:
+            return np.memmap(
+                self._created_from_filename,
+                dtype=self._get_data_dtype(),
+                mode="r+" if self._writable else "c",
+                offset=self._data_offset,
+                shape=(data_size // self._get_data_dtype().itemsize,),
+            )
+
+        with open(self._created_from_filename, 'rb') as wav_file:
+            wav_file.seek(self._data_offset)
+            # Read the actual data into a buffer and view it as samples of the native sample width
+            data_buffer = bytearray(data_size)
+            bytes_read = wav_file.readinto(data_buffer)
+            assert bytes_read == data_size, f"Data subchunk truncated: {bytes_read} < {data_size}!"
+            return np.frombuffer(data_buffer, dtype=self._get_data_dtype())
+
+    def flush(self):
+        """ Write changes to the data of a writable memory mapped WAVFile back to disk """
+        assert self._mmap and self._writable, "Only writable memory mapped files can be flushed!"
+        self.data.flush()
+
+    def patch(self, filename: Optional[Union[Path, str]] = None):
+        """ Write only the samples modified by encoding to an existing file, by default the file this was parsed from
+        The file has to have the same layout as the one this WAVFile was parsed from (e.g. the original or a copy),
+        as the samples are written at the same byte offset. The I/O is proportional to the message, not the file.
+        """
+        if filename is None:
+            filename = self._created_from_filename
+        if self._modified_range is None:
+            return
+
+        from_sample, to_sample = self._modified_range
+        modified_data = np.ascontiguousarray(self.data[from_sample:to_sample], dtype=self._get_data_dtype())
+        with open(filename, 'r+b') as file:
+            file.seek(self._data_offset + from_sample * modified_data.itemsize)
+            file.write(memoryview(modified_data).cast("B"))
+        self._modified_range = None
 
     def _data_as_channel_data_frame(self, data_arr: np.ndarray) -> pd.DataFrame:
         return pd.DataFrame(data={
@@ -81,22 +153,49 @@ class WAVFile:
             for i in range(0, self.header['NumChannels'])
         })
 
-    def _get_data_format(self) -> str:
-        """ Returns the data format string required for struct (e.g. "<88200h") """
+    def _get_data_dtype(self, unsigned: bool = False) -> np.dtype:
+        """ Returns the numpy dtype of a single sample (e.g. "<i2"), unsigned is used for bit manipulation """
         endianness = ('<' if self.header["ChunkID"] == b"RIFF" else ">")
-        integer_count = self.header['Subchunk2Size'] * 8 // self.header['BitsPerSample']
-        integer_size = {8: 'b', 16: 'h', 32: 'i'}[self.header['BitsPerSample']]
-        return f"{endianness}{integer_count}{integer_size}"
-
-    def write(self, filename: Union[Path, str], overwrite: bool = False):
-        """ Create a WAVFile with given filename """
+        integer_kind = 'u' if unsigned else 'i'
+        return np.dtype(f"{endianness}{integer_kind}{self.header['BitsPerSample'] // 8}")
+
+    def _get_unsigned_data(self) -> np.ndarray:
+        """ Returns an unsigned view on the data (no copy), so that all sample bits can be set without overflow """
+        return self.data.view(self._get_data_dtype(unsigned=True))
+
+    def _get_header_bytes(self) -> bytes:
+        """ Returns the packed header, according to the header specification """
+        header_bytes = b""
+        for name, formatting, byte_count, allowed_values in self._wav_header_specification:
+            assert name in self.header, f"Parameter {name} not found in header!"
+            header_bytes += struct.pack(formatting, self.header[name])
+        return header_bytes
+
+    def write(self, filename: Union[Path, str], overwrite: bool = False, mmap: bool = False):
+        """ Create a WAVFile with given filename
+        The header is written once, then the samples are written as a single contiguous buffer in the byte order
+        of the file. If mmap is set, the samples are copied into a memory map of the output file instead.
+        """
+        filename = Path(filename)
         if not overwrite and filename.exists():
             raise FileExistsError
+
+        header_bytes = self._get_header_bytes()
+        # Convert to the byte order of the file, this does not copy if the data already has the correct dtype
+        data = np.ascontiguousarray(self.data, dtype=self._get_data_dtype())
+
         with open(filename, 'wb') as file:
-            for name, formatting, byte_count, allowed_values in self._wav_header_specification:
-                assert name in self.header, f"Parameter {name} not found in header!"
-                file.write(struct.pack(formatting, self.header[name]))
-            file.write(struct.pack(self._get_data_format(), *list(self.data)))
+            file.write(header_bytes)
+            if mmap:
+                file.truncate(len(header_bytes) + data.nbytes)
+            else:
+                file.write(memoryview(data).cast("B"))
+
+        if mmap and data.nbytes > 0:
+            mapped_data = np.memmap(filename, dtype=data.dtype, mode="r+", offset=len(header_bytes), shape=data.shape)
+            mapped_data[:] = data
+            mapped_data.flush()
+            del mapped_data
 
     def time_to_index(self, at_time_s: float) -> int:
         """ Returns index of data, given as second, if None then returns len """
@@ -153,6 +252,42 @@ class WAVFile:
     def num_channels(self):
         return self.header["NumChannels"]
 
+    @property
+    def num_samples(self) -> int:
+        """ Number of samples (of all channels) in the data subchunk, available without loading the data """
+        return self.header["Subchunk2Size"] // (self.header["BitsPerSample"] // 8)
+
+    def capacity(
+            self,
+            least_significant_bits: int = 2,
+            every_nth_byte: int = 1,
+            redundant_bits: int = 0,
+            encryptor: GenericEncryptor = NoneEncryptor(),
+            error_correction: GenericErrorCorrection = ReedSolomonErrorCorrection(),
+            symbol_bits: int = 8,
+    ) -> int:
+        """ Number of message bytes which can be encoded with the given parameters (same as for encode)
+        The header, encryption and error correction overhead is accounted for, by calculating the exact sizes.
+        Only the header of the WAVFile is required, so this is cheap for files opened with lazy=True.
+        """
+        available_bytes = self._available_bytes(least_significant_bits, every_nth_byte, error_correction)
+        return Message.max_data_size(available_bytes, redundant_bits, encryptor, error_correction, symbol_bits)
+
+    def _available_bytes(
+            self,
+            least_significant_bits: int,
+            every_nth_byte: int,
+            error_correction: GenericErrorCorrection,
+    ) -> int:
+        """ Number of bytes (after encryption and error correction) which fit after the header """
+        header_chunk = DataChunk(
+            bytes(Message.header_byte_size(error_correction)),
+            Message.HEADER_LSB_COUNT,
+            Message.HEADER_EVERY_NTH_BYTE,
+        )
+        amplitudes_available = max(0, self.num_samples - header_chunk.amplitudes_required)
+        return DataChunk.max_bytes(amplitudes_available, least_significant_bits, every_nth_byte)
+
     def play(self):
         from pydub import AudioSegment, playback
         from tempfile import TemporaryDirectory
@@ -171,32 +306,49 @@ class WAVFile:
             encryptor: GenericEncryptor = NoneEncryptor(),
             error_correction: GenericErrorCorrection = ReedSolomonErrorCorrection(),
             repeat_data: bool = False,
+            in_place: bool = False,
+            verify: VerificationType = VerificationType.FULL,
+            interleave_depth: int = 1,
+            symbol_bits: int = 8,
     ):
         """ Encode a message in the given WAVFile
         This is done by writing to every nth bytes some number of least significant bits.
-        A short header is written first, then the message.
+        A short header is written first, then the message. If repeat_data is set, the message is encrypted and error
+        corrected once, then written repeatedly until the file is full.
+        If interleave_depth is larger than 1, the error corrected bytes are interleaved, so that bursts of errors are
+        spread over multiple codewords (e.g. use 255 with reed solomon).
+        With symbol_bits of 12 or 16, reed solomon uses larger symbols and therefore fewer, longer codewords.
+        If in_place is set, the modified samples are written back to the file this WAVFile was parsed from. If the
+        samples were not loaded yet (lazy), the file is memory mapped, so only the samples which are encoded and
+        verified are read from disk.
+        Afterwards the encoding is verified, how thoroughly is defined by verify:
+            * NONE: No verification
+            * HEADER: Only the header is read back and decoded
+            * CHECKSUM: The embedded bytes (all copies of repeated data) are read back, their hash is compared to the
+              hash of the written bytes
+            * FULL: The message is decoded (error correction and decryption) and compared to the given data
         """
         assert least_significant_bits <= self.header["BitsPerSample"]
 
-        # The loop will run once if repeat_data = False, and twice if it is True. The loop is used
-        # to avoid code duplication. Calculating the needed data size in advance when repeating is hard,
-        # (would have to account for redundancy, encryption, etc.), therefore the first iteration is
-        # used as an estimate for the needed size in the second run.
-        while True:
-            header_chunk, data_chunk = Message.encode_message(
-                data,
-                least_significant_bits,
-                every_nth_byte,
-                redundant_bits,
-                encryptor,
-                error_correction,
-            )
-            amplitudes_available = len(self.data) - header_chunk.amplitudes_required
-            if repeat_data:
-                data *= amplitudes_available // data_chunk.amplitudes_required
-                repeat_data = False
-            else:
-                break
+        if in_place and self._data is None:
+            self._mmap = True
+
+        fill_bytes = None
+        if repeat_data:
+            fill_bytes = self._available_bytes(least_significant_bits, every_nth_byte, error_correction)
+
+        header_chunk, data_chunk = Message.encode_message(
+            data,
+            least_significant_bits,
+            every_nth_byte,
+            redundant_bits,
+            encryptor,
+            error_correction,
+            fill_bytes,
+            interleave_depth,
+            symbol_bits,
+        )
+        amplitudes_available = len(self.data) - header_chunk.amplitudes_required
 
         if amplitudes_available < data_chunk.amplitudes_required:
             raise ValueError(
@@ -209,102 +361,361 @@ class WAVFile:
 
         self._write_chunks([header_chunk, data_chunk])
 
-        decoded_message = self.decode(encryptor=encryptor, error_correction=error_correction)
+        self._verify_encoding(verify, header_chunk, data_chunk, data, encryptor, error_correction)
 
-        assert decoded_message == data,\
-            f'Cannot decode encrypted message: "{decoded_message}" != "{data}"'
+        if in_place:
+            if self._mmap and self._writable:
+                self.flush()
+            else:
+                self.patch()
+
+    def _verify_encoding(
+            self,
+            verify: VerificationType,
+            header_chunk: DataChunk,
+            data_chunk: DataChunk,
+            data: bytes,
+            encryptor: GenericEncryptor,
+            error_correction: GenericErrorCorrection,
+    ):
+        """ Verify the chunks written by encode, see encode for the different verification types """
+        if verify == VerificationType.HEADER:
+            _, header_bytes = self._get_bytes(
+                0, len(header_chunk.data) * 8, Message.HEADER_LSB_COUNT, Message.HEADER_EVERY_NTH_BYTE)
+            decoded_header = Message.decode_header(header_bytes, error_correction)
+            expected_header = Message.decode_header(header_chunk.data, error_correction)
+            assert decoded_header == expected_header, f'Cannot decode header: {decoded_header} != {expected_header}'
+
+        elif verify == VerificationType.CHECKSUM:
+            # All copies of repeated data are read, as each of them could be written wrongly
+            to_byte, header_bytes = self._get_bytes(
+                0, len(header_chunk.data) * 8, Message.HEADER_LSB_COUNT, Message.HEADER_EVERY_NTH_BYTE)
+            _, data_bytes = self._get_bytes(
+                to_byte, len(data_chunk.data) * data_chunk.copy_count * 8, data_chunk.least_significant_bits,
+                data_chunk.every_nth_byte)
+            embedded_checksum = hashlib.sha256(header_bytes + data_bytes).hexdigest()
+            expected_hash = hashlib.sha256(header_chunk.data)
+            for _ in range(data_chunk.copy_count):
+                expected_hash.update(data_chunk.data)
+            expected_checksum = expected_hash.hexdigest()
+            assert embedded_checksum == expected_checksum, \
+                f'Checksum of embedded bytes mismatch: {embedded_checksum} != {expected_checksum}'
+
+        elif verify == VerificationType.FULL:
+            decoded_message = self.decode(encryptor=encryptor, error_correction=error_correction)
+            assert decoded_message == data,\
+                f'Cannot decode encrypted message: "{decoded_message}" != "{data}"'
 
     def _write_chunks(self, chunks: List[DataChunk], at_byte: int = 0):
         """ Encode the given chunks on after another, starting at at_byte """
+        from_byte = at_byte
         for chunk in chunks:
             at_byte = self._write_chunk(chunk, at_byte)
 
+        if self._modified_range is not None:
+            from_byte = min(from_byte, self._modified_range[0])
+            at_byte = max(at_byte, self._modified_range[1])
+        self._modified_range = (from_byte, at_byte)
+
     def _write_chunk(self, chunk: DataChunk, at_byte: int) -> int:
         """ Encode a given chunk at the specified byte index """
         nth = chunk.every_nth_byte
+        samples = self._get_unsigned_data()
 
-        binary_data = ''.join(map(lambda b: f"{b:08b}", chunk.data))  # e.g. "0010101011101100"
-        lsb_bits = textwrap.wrap(binary_data, chunk.least_significant_bits)  # e.g. ["00", "10", ...]
-        binary_data_split_up = list(map(lambda b: int(b, 2), lsb_bits))  # e.g. [0, 2, ...]
+        # e.g. b"\xAC" with lsb=3 -> [0b101, 0b011, 0b00] = [5, 3, 0]
+        binary_data_split_up = self._split_copies_into_bit_groups(chunk, samples.dtype)
         end_byte_index = len(binary_data_split_up) * nth + at_byte  # e.g. 32 on first iteration
 
-        self.data[at_byte:end_byte_index:nth] = self._set_last_n_bits_in_array(
-            self.data[at_byte:end_byte_index:nth],
+        # Basic slicing returns a view, so the bits are set directly in the samples
+        self._set_last_n_bits_in_array(
+            samples[at_byte:end_byte_index:nth],
             binary_data_split_up,
             chunk.least_significant_bits,
         )
         return end_byte_index
 
     @staticmethod
-    def _set_last_n_bits_in_array(data_slice: np.ndarray, binary_data_split_up, n_bits_to_set: int):
-        """ Set n bits in data_bits to 0, then set them equal to message_bits
+    def _split_copies_into_bit_groups(chunk: DataChunk, dtype: np.dtype) -> np.ndarray:
+        """ Split all copies of the chunk data into groups of least significant bits
+        The bits of a few copies together are divisible by the number of least significant bits (e.g. 3 copies of
+        one byte with lsb=3), these copies are split once and the result is tiled, the remaining copies are appended.
+        """
+        lsb = chunk.least_significant_bits
+        copies_per_tile = lsb // math.gcd(len(chunk.data) * 8, lsb)
+        tile_count, remaining_copies = divmod(chunk.copy_count, copies_per_tile)
+
+        tile = WAVFile._split_into_bit_groups(chunk.data * copies_per_tile, lsb, dtype)
+        remainder = WAVFile._split_into_bit_groups(chunk.data * remaining_copies, lsb, dtype)
+        if tile_count == 1 and remaining_copies == 0:
+            return tile
+        return np.concatenate([np.tile(tile, tile_count), remainder])
+
+    @staticmethod
+    def _split_into_bit_groups(data: bytes, group_size: int, dtype: np.dtype) -> np.ndarray:
+        """ Split the bits of data into consecutive groups of group_size bits, returned as integers of dtype
+        If the number of bits is not divisible by group_size, the last group contains only the remaining bits.
+        After lcm(group_size, 8) bits the group boundaries line up with byte boundaries again, so the data is
+        reshaped into such periods (e.g. 3 bytes for 8 groups of 3 bits), then each group is computed for all periods
+        at once by combining the (at most 5) bytes it spans and shifting/masking the result.
+        """
+        data_bytes = np.frombuffer(data, dtype=np.uint8)
+        common_divisor = math.gcd(group_size, 8)
+        period_bytes, groups_per_period = group_size // common_divisor, 8 // common_divisor
+
+        period_count = len(data_bytes) // period_bytes
+        periods = data_bytes[:period_count * period_bytes].reshape(period_count, period_bytes)
+        tail_bits = np.unpackbits(data_bytes[period_count * period_bytes:])
+        tail_group_count = math.ceil(len(tail_bits) / group_size)
+
+        groups = np.empty(period_count * groups_per_period + tail_group_count, dtype=dtype)
+        period_groups = groups[:period_count * groups_per_period].reshape(period_count, groups_per_period)
+        for group_index in range(groups_per_period):
+            first_byte = group_index * group_size // 8
+            last_byte = ((group_index + 1) * group_size - 1) // 8
+            # Smallest unsigned integer able to hold all bytes spanned by this group
+            window_dtype = np.dtype(f"u{2 ** math.ceil(math.log2(last_byte - first_byte + 1))}")
+            window = periods[:, first_byte].astype(window_dtype)
+            for byte_index in range(first_byte + 1, last_byte + 1):
+                window <<= 8
+                window |= periods[:, byte_index]
+            window >>= (last_byte + 1) * 8 - (group_index + 1) * group_size
+            window &= 2**group_size - 1
+            period_groups[:, group_index] = window
+
+        # Remaining bytes which do not make up an entire period, the last group may contain fewer bits
+        for tail_group_index in range(tail_group_count):
+            group_bits = tail_bits[tail_group_index * group_size:(tail_group_index + 1) * group_size]
+            groups[period_count * groups_per_period + tail_group_index] = \
+                np.dot(group_bits, 2 ** np.arange(len(group_bits) - 1, -1, -1))
+        return groups
+
+    @staticmethod
+    def _set_last_n_bits_in_array(data_slice: np.ndarray, binary_data_split_up: np.ndarray, n_bits_to_set: int):
+        """ Set n bits in data_slice to 0, then set them equal to message_bits (in place)
         Say LSBs = 2, data_bits = 0b10111001, message_bits = 0b10, then:
         ones   =   (2**n_bits_to_set - 1)   =   0b100 - 1   =   0b11
-        Now get the LSBs bits from data_bits:
-        lsb_data_bits  =  data_bits & ones  =  0b10111001 & 0b11  =  0b01
-        Using lsb_data_bits set LSBs bits in data_bits to zero:
-        data_bits_with_zeros  =  data_bits ^ lsb_data_bits  =  0b10111001 ^ 0b01  =  0b10111000
-        Now that the LSBs bits are zero, just flip them to whatever is in message_bits:
-        data_bits_with_zeros ^ message_bits  =  0b10111000 ^ 0b10 = 0b10111010
+        Using the inverted ones set LSBs bits in data_bits to zero:
+        data_bits_with_zeros  =  data_bits & ~ones  =  0b10111001 & 0b11111100  =  0b10111000
+        Now that the LSBs bits are zero, just set them to whatever is in message_bits:
+        data_bits_with_zeros | message_bits  =  0b10111000 | 0b10 = 0b10111010
         The LSBs bits have been set to message_bits after this operation.
         """
-        below_power_of_two = np.full_like(data_slice, 2**n_bits_to_set - 1)
-        flipped_last_n_bits = data_slice & below_power_of_two
-        data_slice_with_zeroed_n_last_bits = data_slice ^ flipped_last_n_bits
-        data_slice_with_message_bits_set = data_slice_with_zeroed_n_last_bits ^ binary_data_split_up
-        return data_slice_with_message_bits_set
+        ones = data_slice.dtype.type(2**n_bits_to_set - 1)
+        data_slice &= ~ones
+        data_slice |= binary_data_split_up
 
-    def _get_bytes(self, from_amplitude: int, bits: int, lsb_count: int, nth_byte: int) -> Tuple[int, bytes]:
-        """ Return bytes by reading every lsb_count bits from every nth_byte from from_amplitude """
+    def _get_bytes(
+            self,
+            from_amplitude: int,
+            bits: int,
+            lsb_count: int,
+            nth_byte: int,
+            written_bits: Optional[int] = None,
+    ) -> Tuple[int, bytes]:
+        """ Return bytes by reading every lsb_count bits from every nth_byte from from_amplitude
+        written_bits is the number of bits written starting at from_amplitude, if only a prefix of them should be
+        read (e.g. the first copy of repeated data). Only the last amplitude of all written bits holds fewer than
+        lsb_count bits, so the amplitude the prefix ends in has to be read entirely.
+        """
+        if written_bits is None:
+            written_bits = bits
+        read_bits = min(written_bits, math.ceil(bits / lsb_count) * lsb_count)
 
         # Calculate number of amplitudes required for entire message (account for possible remainder)
-        divisor, remainder = divmod(bits, lsb_count)
+        divisor, remainder = divmod(read_bits, lsb_count)
         amplitudes_required = divisor + (remainder != 0)
 
-        # Get an array of size amplitudes_required, such that each number is 1 below a power of 2, e.g. 0b111
-        ones = np.full(amplitudes_required, 2**lsb_count - 1)
-        if remainder > 0:
-            ones[-1] = 2**remainder - 1
-
         # Calculate last byte position with the given message account for nth_byte as well
-        to_amplitude = from_amplitude + len(ones) * nth_byte
+        to_amplitude = from_amplitude + amplitudes_required * nth_byte
 
-        # &-ing with ones will get only the relevant bits required for saving the message
-        relevant_bits = self.data[from_amplitude:to_amplitude:nth_byte] & ones
+        samples = self._get_unsigned_data()[from_amplitude:to_amplitude:nth_byte]
+        if len(samples) < amplitudes_required:
+            raise ValueError(f"ERROR: Cannot read {bits} bits from the file, not enough amplitudes left: "
+                             f"{len(samples)} < {amplitudes_required}.")
 
-        # Convert relevant_bits to a large string of bits by formatting the relevant number of bits as a string
-        bits_to_format = (np.log2(ones + 1)).astype(int)
-        bits_as_str = ''.join(f"{data:0{format_bits}b}" for data, format_bits in zip(relevant_bits, bits_to_format))
+        return to_amplitude, self._join_bit_groups(samples, read_bits, lsb_count)[:bits // 8]
 
-        # Wrap the string every 8 bits and cast each to an integer, which is then converted to bytes
-        message_wrapped_as_bytes = bytes(map(lambda b: int(b, 2), textwrap.wrap(bits_as_str, 8)))
-        return to_amplitude, message_wrapped_as_bytes
+    @staticmethod
+    def _join_bit_groups(samples: np.ndarray, bit_count: int, group_size: int) -> bytes:
+        """ The inverse of _split_into_bit_groups, join the last group_size bits of each sample to bytes
+        If bit_count is not divisible by group_size, only the remaining bits are taken from the last sample.
+        Same as when splitting, the groups are reshaped into periods of lcm(group_size, 8) bits, then each byte of a
+        period is computed for all periods at once from the (parts of the) groups it overlaps with.
+        """
+        full_group_count, remainder = divmod(bit_count, group_size)
+        common_divisor = math.gcd(group_size, 8)
+        period_bytes, groups_per_period = group_size // common_divisor, 8 // common_divisor
+
+        period_count = full_group_count // groups_per_period
+        periods = samples[:period_count * groups_per_period].reshape(period_count, groups_per_period)
+        period_data = np.zeros((period_count, period_bytes), dtype=np.uint8)
+        for group_index in range(groups_per_period):
+            group_start, group_end = group_index * group_size, (group_index + 1) * group_size
+            for byte_index in range(group_start // 8, (group_end - 1) // 8 + 1):
+                # Bits of this group which are part of this byte, as [from, to) bit positions within the period
+                overlap_start = max(group_start, byte_index * 8)
+                overlap_end = min(group_end, (byte_index + 1) * 8)
+                overlapping_bits = (periods[:, group_index] >> (group_end - overlap_end)) \
+                    & (2**(overlap_end - overlap_start) - 1)
+                shift = (byte_index + 1) * 8 - overlap_end
+                period_data[:, byte_index] |= (overlapping_bits << shift).astype(np.uint8)
+
+        # Remaining samples which do not make up an entire period, expanded to single bits which are then packed
+        tail = samples[period_count * groups_per_period:full_group_count + (remainder != 0)]
+        shifts = np.arange(group_size - 1, -1, -1, dtype=samples.dtype)
+        tail_bits = ((tail[:, np.newaxis] >> shifts) & 1).astype(np.uint8)
+        if remainder > 0:
+            tail_bits = np.concatenate([tail_bits[:-1].ravel(), tail_bits[-1, -remainder:]])
 
-    def _get_message(self, error_correction):
-        """ Decode message from this WAVFile """
-        header_bits = Message.header_byte_size(error_correction) * 8
-        to_byte, header_bytes = self._get_bytes(0, header_bits, Message.HEADER_LSB_COUNT, Message.HEADER_EVERY_NTH_BYTE)
+        return period_data.tobytes() + np.packbits(tail_bits).tobytes()
 
-        least_significant_bits, every_nth_byte, *_, data_size = Message.decode_header(header_bytes, error_correction)
+    def _get_message(self, error_correction, majority_vote: bool = False, copy_index: int = 0):
+        """ Decode message from this WAVFile, see decode for majority_vote, otherwise only the copy_index-th copy of
+        repeated data is read """
+        to_byte, header_bytes, header = self._get_header(error_correction)
+        return header_bytes, self._get_data_bytes(to_byte, header, majority_vote, copy_index)
 
-        message_bits = data_size * 8
-        _, message_bytes = self._get_bytes(to_byte, message_bits, least_significant_bits, every_nth_byte)
+    def _get_data_bytes(
+            self,
+            from_amplitude: int,
+            header: MessageHeader,
+            majority_vote: bool = False,
+            copy_index: int = 0,
+    ) -> bytes:
+        """ Read the data written from from_amplitude, see _get_message """
+        message_bits = header.data_size * 8
+        lsb_count, nth_byte = header.least_significant_bits, header.every_nth_byte
+        if majority_vote and header.copy_count > 1:
+            _, all_copies_bytes = self._get_bytes(from_amplitude, message_bits * header.copy_count, lsb_count, nth_byte)
+            return self._majority_vote(all_copies_bytes, header.copy_count)
+
+        # The copies do not necessarily start at an amplitude (e.g. one byte copies with lsb=3), so the amplitudes
+        # the copy spans are read and the bits before it are dropped
+        first_amplitude, bit_offset = divmod(copy_index * message_bits, lsb_count)
+        _, message_bytes = self._get_bytes(
+            from_amplitude + first_amplitude * nth_byte,
+            math.ceil((bit_offset + message_bits) / 8) * 8,
+            lsb_count,
+            nth_byte,
+            written_bits=message_bits * header.copy_count - first_amplitude * lsb_count,
+        )
+        if bit_offset == 0:
+            return message_bytes[:header.data_size]
+
+        message_bits_array = np.unpackbits(np.frombuffer(message_bytes, dtype=np.uint8))
+        return np.packbits(message_bits_array[bit_offset:bit_offset + message_bits]).tobytes()
+
+    def _get_header(self, error_correction) -> Tuple[int, bytes, MessageHeader]:
+        """ Read and decode the header, returns the amplitude after it, its bytes and its values
+        If no header is found, a header written by a legacy version (see Message) is read instead.
+        """
+        try:
+            header_bits = Message.header_byte_size(error_correction) * 8
+            to_byte, header_bytes = self._get_bytes(
+                0, header_bits, Message.HEADER_LSB_COUNT, Message.HEADER_EVERY_NTH_BYTE)
+            return to_byte, header_bytes, WAVFile._probe_header(header_bytes, error_correction)
+        except (ValueError, ReedSolomonError) as error:
+            header_error = error
+
+        try:
+            legacy_header_bits = Message.legacy_header_byte_size(error_correction) * 8
+            to_byte, header_bytes = self._get_bytes(
+                0, legacy_header_bits, Message.HEADER_LSB_COUNT, Message.HEADER_EVERY_NTH_BYTE)
+            return to_byte, header_bytes, WAVFile._probe_header(header_bytes, error_correction)
+        except (ValueError, ReedSolomonError):
+            if isinstance(header_error, ValueError):
+                raise header_error from None
+            raise ValueError('Cannot decode the message header, the file contains no message or another error '
+                             'correction was used') from header_error
+
+    @staticmethod
+    def _probe_header(header_bytes: bytes, error_correction) -> MessageHeader:
+        """ Decode the header, the report of the error correction (e.g. detected errors of hamming codes) is only
+        printed if the bytes are a header, as probing other bytes (e.g. a legacy header or a carrier without a
+        message) reports errors which do not exist.
+        """
+        report = io.StringIO()
+        with contextlib.redirect_stdout(report):
+            header = Message.decode_header(header_bytes, error_correction)
+        print(report.getvalue(), end="")
+        return header
+
+    def _get_erasures(self, header_bytes: bytes, error_correction, copy_index: int = 0) -> List[int]:
+        """ Returns the positions of the message bytes (of the copy_index-th copy) which were read from clipped
+        amplitudes. Amplitudes at the minimum or maximum value were most likely clipped, e.g. by a lossy conversion
+        or by amplifying the file, so their least significant bits are likely wrong.
+        """
+        header = Message.decode_header(header_bytes, error_correction)
+        lsb_count, nth_byte = header.least_significant_bits, header.every_nth_byte
+        message_bits = header.data_size * 8
+
+        header_amplitudes = len(header_bytes) * 8 // Message.HEADER_LSB_COUNT * Message.HEADER_EVERY_NTH_BYTE
+        first_amplitude, bit_offset = divmod(copy_index * message_bits, lsb_count)
+        from_amplitude = header_amplitudes + first_amplitude * nth_byte
+        to_amplitude = from_amplitude + math.ceil((bit_offset + message_bits) / lsb_count) * nth_byte
+        # 8 bit samples are unsigned (silence is 128), so they are clipped at 0 and 255
+        data = self._get_unsigned_data() if self.header["BitsPerSample"] == 8 else self.data
+        samples = data[from_amplitude:to_amplitude:nth_byte]
+
+        limits = np.iinfo(samples.dtype)
+        clipped = (samples == limits.min) | (samples == limits.max)
+        clipped_bits = np.repeat(clipped, lsb_count)[bit_offset:bit_offset + message_bits]
+        return np.flatnonzero(clipped_bits.reshape(-1, 8).any(axis=1)).tolist()
 
-        return header_bytes, message_bytes
+    @staticmethod
+    def _majority_vote(all_copies_bytes: bytes, copy_count: int) -> bytes:
+        """ Returns a single copy, where each bit is set to the value the majority of the copies has for this bit
+        The bits are reshaped into a copies x bits matrix and the ones are counted per column.
+        If there is a tie (only possible for an even number of copies), the bit of the first copy is used.
+        """
+        bits = np.unpackbits(np.frombuffer(all_copies_bytes, dtype=np.uint8)).reshape(copy_count, -1)
+        ones_count = np.count_nonzero(bits, axis=0)
+        majority_bits = (2 * ones_count > copy_count) | ((2 * ones_count == copy_count) & (bits[0] == 1))
+        return np.packbits(majority_bits).tobytes()
 
     def decode(
             self,
             encryptor: Optional[GenericEncryptor] = None,
-            error_correction: GenericErrorCorrection = ReedSolomonErrorCorrection()
+            error_correction: GenericErrorCorrection = ReedSolomonErrorCorrection(),
+            majority_vote: bool = False,
+            use_erasures: bool = True,
+            credential_provider: Optional[GenericCredentialProvider] = None,
+            allow_expensive_kdf: bool = False,
     ) -> bytes:
 
         """Decode message, getting all parameters from internal header
         Encryptor is optional, can be supplied to avoid asking for password twice when verifying.
-        If Encryptor is not supplied, then it will extract the used encryptor from the header in the message.
+        If Encryptor is not supplied, then it will extract the used encryptor from the header in the message,
+        passwords are then asked from the credential_provider (or the user if there is none). The key derivation
+        parameters in the header are limited (see SaltedHash), unless allow_expensive_kdf is set for trusted files.
+        If majority_vote is set and the data was repeated, all copies are read and each bit is decided by majority
+        vote before the error correction. Otherwise, if the error correction of a copy fails (a ReedSolomonError),
+        the next copy is decoded, up to MAX_DECODE_COPIES copies, if all fail the error of the first copy is raised.
+        Any other error (e.g. a wrong password or a failed authentication) is raised immediately, as it would occur
+        for every copy.
+        If use_erasures is set, bytes read from clipped amplitudes are passed to the error correction as erasures
+        (not when using majority_vote, as the copies are combined already).
         """
 
-        header_bytes, data_bytes = self._get_message(error_correction)
+        to_byte, header_bytes, header = self._get_header(error_correction)
+
+        # Created once, so the password is only asked once for all copies
+        if encryptor is None:
+            encryptor = Message.get_decryptor(header, credential_provider, allow_expensive_kdf)
+
+        copy_count = 1 if majority_vote else min(header.copy_count, WAVFile.MAX_DECODE_COPIES)
+        first_error = None
+        for copy_index in range(copy_count):
+            data_bytes = self._get_data_bytes(to_byte, header, majority_vote, copy_index)
+
+            erasures = None
+            if use_erasures and not majority_vote:
+                erasures = self._get_erasures(header_bytes, error_correction, copy_index)
 
-        decoded_message = Message.decode_message(header_bytes, data_bytes, encryptor, error_correction)
+            try:
+                return Message.decode_message(header_bytes, data_bytes, encryptor, error_correction, erasures)
+            except ReedSolomonError as error:
+                if first_error is None:
+                    first_error = error
 
-        return decoded_message
+        raise first_error
@@ -49,7 +49,7 @@ def comparison_pre_and_after_mp3_conversion(file_path, bitrate=None, print_=Fals
     if len(pre_data) != len(after_data):
         print(f"Shape mismatch pre-conversion: {len(pre_data)} with post-conversion: {len(after_data)}, skipping!")
         return None
-    print(f"Average difference (bitrate={bitrate}): {np.average(np.abs(pre_data - after_data)):.1f}")
+    print(f"Average difference (bitrate={bitrate}): {np.average(np.abs(pre_data.astype(np.int32) - after_data)):.1f}")
     for bit in range(16):
         power = 1 << bit
 